@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.sub_functions.archive_dependences import archive_realisation  # noqa: E402
+
+"""
+Замер создания архива каталога из множества файлов средних размеров без распараллеливания и с ним (zip/tar -j N).
+Запуск: python benchmarks/archive_parallel.py [zip|tar] [число_файлов] [размер_файла_КБ]
+"""
+
+
+def make_source(path: str, files: int, size_kb: int) -> None:
+    """Создает каталог из files файлов по size_kb КБ (сжимаемый текст)"""
+    os.makedirs(path)
+    line = b"".join(f"{i:08d} lorem ipsum dolor sit amet\n".encode() for i in range(64))
+    for i in range(files):
+        with open(os.path.join(path, f"file{i}.txt"), 'wb') as f:
+            f.write(line * (size_kb * 1024 // len(line) + 1))
+
+
+def main() -> None:
+    command = sys.argv[1] if len(sys.argv) > 1 else "zip"
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    size_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 512
+    extension = ".zip" if command == "zip" else ".tar.gz"
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work_dir, "source")
+        make_source(source, files, size_kb)
+        print(f"Каталог: {files} файлов по {size_kb}K")
+
+        for jobs in sorted({1, 2, 4, os.cpu_count() or 1}):
+            archive = os.path.join(work_dir, f"bench{jobs}{extension}")
+            start = time.perf_counter()
+            archive_realisation([command, "-j", str(jobs), source, archive])
+            print(f"-j {jobs}: {time.perf_counter() - start:.3f}s, {os.path.getsize(archive) / 1024 ** 2:.1f}M")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
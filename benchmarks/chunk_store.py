@@ -0,0 +1,80 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.sub_functions.chunk_store_dependences import store_snapshot, restore_snapshot, repo_size  # noqa: E402
+from src.sub_functions.compression_dependences import create_tar  # noqa: E402
+
+"""
+Замер хранилища фрагментов: несколько «ночных» снимков почти не меняющегося каталога (tar --repo)
+против отдельного tar.gz на каждую ночь. Между снимками в часть файлов вставляются байты: остальные файлы повторный снимок не читает.
+Запуск: python benchmarks/chunk_store.py [число_файлов] [размер_файла_КБ] [число_снимков]
+"""
+
+
+def make_source(path: str, files: int, size_kb: int) -> None:
+    """Создает каталог из files файлов по size_kb КБ (наполовину сжимаемые данные)"""
+    os.makedirs(path)
+    for i in range(files):
+        size = size_kb * 1024
+        with open(os.path.join(path, f"file{i}.bin"), 'wb') as f:
+            f.write(os.urandom(size // 2) + bytes(size // 2))
+
+
+def mutate(path: str, files: int, night: int) -> None:
+    """Вставляет байты в середину каждого десятого файла (сдвигает все данные после вставки)"""
+    for i in range(night % 10, files, 10):
+        file_path = os.path.join(path, f"file{i}.bin")
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        with open(file_path, 'wb') as f:
+            f.write(data[:len(data) // 2] + f"night {night}".encode() + data[len(data) // 2:])
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    nights = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work_dir, "source")
+        repo = Path(work_dir) / "repo"
+        make_source(source, files, size_kb)
+
+        tar_total = 0
+        for night in range(nights):
+            if night:
+                mutate(source, files, night)
+            start = time.perf_counter()
+            stats = store_snapshot(Path(source), repo, f"night{night}")
+            elapsed = time.perf_counter() - start
+
+            archive = Path(work_dir) / f"night{night}.tar.gz"
+            create_tar(Path(source), archive, "gz")
+            tar_total += archive.stat().st_size
+            archive.unlink()
+
+            print(f"Снимок {night}: прочитано {stats['bytes'] / 1024 ** 2:.1f}M за {elapsed:.2f}s "
+                  f"({stats['bytes'] / 1024 ** 2 / elapsed:.1f}M/s), новых фрагментов "
+                  f"{stats['new_chunks']} из {stats['chunks']}")
+
+        print(f"Хранилище: {repo_size(repo) / 1024 ** 2:.1f}M, tar.gz на каждый снимок: {tar_total / 1024 ** 2:.1f}M")
+
+        start = time.perf_counter()
+        restore_snapshot(repo, f"night{nights - 1}", Path(work_dir) / "restored")
+        elapsed = time.perf_counter() - start
+        restored = sum(path.stat().st_size for path in (Path(work_dir) / "restored").iterdir())
+        print(f"Восстановление: {restored / 1024 ** 2 / elapsed:.1f}M/s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.sub_functions.grep_dependences import grep_args_parse, grep_realisation  # noqa: E402
+from src.sub_functions.pipeline_dependences import run_redirected  # noqa: E402
+
+"""
+Замер перенаправления вывода: grep -r с большим числом совпадений в файл через print (как раньше - перехват
+stdout и построчная запись) против grep -r > файл (строки пишутся в файл с большим буфером).
+Запуск: python benchmarks/redirect.py [число_файлов] [строк_в_файле]
+"""
+
+
+def make_source(path: str, files: int, lines: int) -> None:
+    """Создает каталог из files файлов по lines строк, каждая строка подходит под шаблон"""
+    os.makedirs(path)
+    for i in range(files):
+        with open(os.path.join(path, f"file{i}.log"), 'w', encoding='utf-8') as f:
+            f.writelines(f"{n} ERROR something happened in module {n % 97}\n" for n in range(lines))
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work_dir, "source")
+        make_source(source, files, lines)
+        # Аргументы разбираются тем же парсером, что и у команды grep -r ERROR source
+        args = grep_args_parse(["-r", "ERROR", source])
+
+        out_path = os.path.join(work_dir, "print.txt")
+        start = time.perf_counter()
+        with open(out_path, 'w', encoding='utf-8') as out, contextlib.redirect_stdout(out):
+            grep_realisation(args)
+        print_time = time.perf_counter() - start
+        size = os.path.getsize(out_path)
+
+        out_path = os.path.join(work_dir, "redirect.txt")
+        start = time.perf_counter()
+        run_redirected([["grep", "-r", "ERROR", source]], out_path)
+        redirect_time = time.perf_counter() - start
+
+        megabytes = size / 1024 ** 2
+        print(f"Результат: {megabytes:.1f}M, {files * lines} строк")
+        print(f"print в файл: {print_time:.2f}s ({megabytes / print_time:.1f}M/s)")
+        print(f"grep -r > файл: {redirect_time:.2f}s ({megabytes / redirect_time:.1f}M/s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(project_root, "src", "main.py")
+
+"""
+Замер запуска оболочки в пакетном режиме: время короткой команды целиком и разбор python -X importtime
+(какие модули импортируются при запуске и сколько это стоит).
+Запуск: python benchmarks/startup.py [число_запусков] ["команды"]
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, str]]:
+    """(накопленное время импорта в мкс, модуль) из вывода -X importtime"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.rstrip()))
+    return modules
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    commands = sys.argv[2] if len(sys.argv) > 2 else "cd ."
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, MAIN, "-c", commands], cwd=work_dir, check=True)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{commands!r}: медиана {timings[len(timings) // 2] * 1000:.1f}ms, минимум {timings[0] * 1000:.1f}ms")
+
+        result = subprocess.run([sys.executable, "-X", "importtime", MAIN, "-c", commands], cwd=work_dir,
+                                capture_output=True, text=True, check=True)
+        modules = parse_importtime(result.stderr)
+        # Модули верхнего уровня (без отступа) - их накопленное время и есть стоимость импорта при запуске
+        top_level = [(cumulative, name) for cumulative, name in modules if not name.startswith("  ")]
+        print(f"Импорт при запуске: {sum(cumulative for cumulative, _ in top_level) / 1000:.1f}ms, "
+              f"модулей {len(modules)}")
+        for cumulative, name in sorted(top_level, reverse=True)[:10]:
+            print(f"{cumulative / 1000:>8.1f}ms  {name.strip()}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.sub_functions.unarchive_dependences import unarchive_realisation  # noqa: E402
+
+"""
+Замер распаковки zip архива из множества файлов последовательно и в несколько потоков (unzip -j N).
+Запуск: python benchmarks/unzip_parallel.py [число_файлов] [размер_файла_КБ]
+"""
+
+
+def make_archive(path: str, members: int, size_kb: int) -> None:
+    """Создает архив из members файлов по size_kb КБ (наполовину сжимаемые данные)"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for i in range(members):
+            # Размеры различаются, чтобы было что распределять между потоками
+            size = size_kb * 1024 * (1 + i % 4)
+            data = os.urandom(size // 2) + bytes(size // 2)
+            zipf.writestr(f"dir{i % 10}/file{i}.bin", data)
+
+
+def main() -> None:
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    work_dir = tempfile.mkdtemp()
+    original_cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        make_archive("bench.zip", members, size_kb)
+        print(f"Архив: {members} файлов, {os.path.getsize('bench.zip') / 1024 ** 2:.1f}M")
+
+        for jobs in sorted({1, 2, 4, os.cpu_count() or 1}):
+            shutil.rmtree("bench", ignore_errors=True)
+            start = time.perf_counter()
+            unarchive_realisation(["unzip", "bench.zip", "zip", "bench"], {"jobs": jobs})
+            print(f"-j {jobs}: {time.perf_counter() - start:.3f}s")
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
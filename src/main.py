@@ -1,105 +1,164 @@
 import os
-import shlex
 import sys
 import logging
+from functools import partial
 
 # Добавляем путь для корректных импортов
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-# Теперь импортируем модули
-from src.sub_functions.undo_dependences import (undo_args_parse, undo_realisation, init_trash, cp_with_history,
-                                            mv_with_history, rm_with_history)
-from src.sub_functions.history_dependences import history_args_parse, history_realisation, history_mkdir, add_to_history
-from src.sub_functions.help_func import help_realisation
-from src.sub_functions.grep_dependences import grep_args_parse, grep_realisation
-from src.sub_functions.unarchive_dependences import unarchive_args_parse, unarchive_realisation
-from src.sub_functions.archive_dependences import archive_args_parse, archive_realisation
-from src.sub_functions.rm_dependences import rm_args_parse
-from src.sub_functions.cat_dependences import cat_realisation, cat_args_parse
-from src.sub_functions.cd_dependences import cd_realisation, cd_args_parse
-from src.sub_functions.cp_dependences import cp_args_parse
-from src.sub_functions.mv_dependences import mv_args_parse
-from src.sub_functions.ls_dependences import ls_args_parse, ls_realisation
-from src.sub_functions.logging_func import logging_command, logger, unhandled_exception
+# Теперь импортируем модули (модули команд загружаются реестром при первом вызове, модуль фоновых задач - при первой
+# команде с &, jobs, wait или kill)
+from src.sub_functions.history_dependences import history_mkdir, add_to_history
+from src.sub_functions.registry_dependences import init_registry, get_command, ensure_trash
+from src.sub_functions.pipeline_dependences import (split_commands, split_on, split_redirect, run_pipeline,
+                                                    run_redirected, is_operator)
+from src.sub_functions.metrics_dependences import metrics_init, run_measured
+from src.sub_functions.logging_func import setup_logging, logging_command, logger, unhandled_exception
 
+JOBS_MODULE = "src.sub_functions.jobs_dependences"
 
-history_mkdir()
-init_trash()
+
+def start_shell() -> None:
+    """Настройка при запуске оболочки, а не при импорте модуля (тесты не создают shell.log и .history)"""
+    setup_logging()
+    history_mkdir()
+    metrics_init()
+    init_registry()
+    logger.info("Запуск приложения")
+
+
+def execute_command(args: list[str]) -> bool:
+    """
+    Выполняет одну команду (уже разбитую на аргументы). Возвращает False, если введена команда exit.
+    Команда, которая заканчивается оператором &, запускается в фоне.
+    """
+    background = is_operator(args[-1], "&")
+    if background:
+        args = args[:-1]
+        if not args:
+            raise ValueError("Нет команды перед &")
+        from src.sub_functions.jobs_dependences import FOREGROUND_ONLY
+        if args[0] in FOREGROUND_ONLY:
+            raise ValueError(f"Команда {args[0]} не выполняется в фоне")
+    command = args[0]
+    logging_command(command, args[1:])
+
+    # Добавляем команду в историю (кроме самих history, undo, redo и команд, которые записываются в историю при реализации)
+    if command not in ["history", "undo", "redo", "cp", "mv", "rm"]:
+        add_to_history(command, args[1:], None)
+    if command == "exit":
+        return False
+    command_args, target = split_redirect(args)
+    # profile получает конвейер целиком и сам передает его диспетчеру
+    stages = [command_args] if command == "profile" else split_on(command_args, "|")
+    if target is not None:
+        run = partial(run_redirected, stages, *target)
+    elif len(stages) > 1:
+        run = partial(run_pipeline, stages)
+    else:
+        try:
+            handler = get_command(command)
+        except Exception as e:
+            logging.error(str(e))
+            raise e
+        run = partial(handler, args)
+    # Время и ресурсы каждой команды записываются в метрики (для фоновой - в ее потоке)
+    run = partial(run_measured, args, run, background)
+    if background:
+        from src.sub_functions.jobs_dependences import start_job
+        start_job(args, run)
+    else:
+        run()
+    return True
 
 
 def input_shell() -> None:
+    from src.sub_functions.jobs_dependences import has_jobs, report_finished, wait_realisation
+    # Интерактивная сессия долгая - фоновая очистка корзины запускается сразу, а не при первом rm
+    ensure_trash()
     while True:
         try:
+            # Результаты фоновых задач, завершившихся с прошлой команды, выводятся перед приглашением
+            report_finished()
             user_input = input(f"{os.getcwd()}> ").strip()
             if not user_input:
                 continue
-            args = shlex.split(user_input)
-            command = args[0]
-            logging_command(command, args[1:])
-
-            # Добавляем команду в историю (кроме самих history и undo и команд, которые записываются в историю при реализации)
-            if command not in ["history", "undo", "cp", "mv", "rm"]:
-                add_to_history(command, args[1:], None)
-            # Смотрим какая команда введена
-            match command:
-                case "ls":
-                    args_value = ls_args_parse(args[1:])
-                    ls_realisation(path=str(args_value.path), long=bool(args_value.long))
-                case "cd":
-                    arg_value = cd_args_parse(args[1:])
-                    cd_realisation(str(arg_value))
-                case "cat":
-                    arg_value = cat_args_parse(args[1:])
-                    cat_realisation(str(arg_value))
-                case "cp":
-                    cp_args = cp_args_parse(args[1:])
-                    # Используем версию с историей для поддержки undo
-                    cp_with_history(cp_args[0], str(cp_args[1]))
-                case "mv":
-                    mv_args = mv_args_parse(args[1:])
-                    path_from, path_to = mv_args
-                    mv_with_history(path_from, path_to)
-                case "rm":
-                    rm_args = rm_args_parse(args[1:])
-                    # Используем версию с историей для поддержки undo
-                    rm_with_history(str(rm_args['path']))
-                case "zip":
-                    archive_realisation(args)
-                case "tar":
-                    tar_args = archive_args_parse(args)
-                    archive_realisation(tar_args)
-                case "unzip":
-                    unzip_args = unarchive_args_parse(args)
-                    unarchive_realisation(unzip_args)
-                case "untar":
-                    untar_args = unarchive_args_parse(args)
-                    unarchive_realisation(untar_args)
-                case "grep":
-                    grep_args = grep_args_parse(args[1:])
-                    grep_realisation(grep_args)
-                case "history":
-                    history_args = history_args_parse(args[1:])
-                    history_realisation(history_args)
-                case "undo":
-                    undo_args = undo_args_parse(args[1:])
-                    undo_realisation(undo_args)
-                case "help":
-                    help_realisation()
-                case "exit":
-                    break
-                case _:
-                    error_msg = f"Неизвестная команда: {command}"
-                    logging.error(error_msg)
-                    raise Exception(error_msg)
+            if not all(execute_command(args) for args in split_commands(user_input)):
+                break
         except Exception as e:
             error_msg = f"Ошибка: {e}"
             logging.error(error_msg)
             print(error_msg)  # Выводим ошибку пользователю, но не прерываем работу
+    if has_jobs():
+        print("Ожидание фоновых задач...")
+        wait_realisation([])
+
+
+def parse_script(text: str) -> list[tuple[int, list[str]]]:
+    """
+    Разбирает сценарий целиком до выполнения: (номер строки, аргументы) для каждой команды.
+    Пустые строки и комментарии пропускаются; ошибка разбора любой строки - ошибка всего сценария.
+    """
+    commands: list[tuple[int, list[str]]] = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        try:
+            commands.extend((line_number, args) for args in split_commands(line))
+        except ValueError as e:
+            raise ValueError(f"Строка {line_number}: {e}")
+    return commands
+
+
+def run_batch(commands: list[tuple[int, list[str]]]) -> int:
+    """
+    Выполняет команды подряд, без приглашения ввода. Ошибка команды выводится в stderr и не прерывает сценарий.
+    Возвращает код завершения: 0 - все команды выполнены, 1 - были ошибки.
+    """
+    status = 0
+    for line_number, args in commands:
+        try:
+            if not execute_command(args):
+                break
+        except Exception as e:
+            error_msg = f"Ошибка: {e}"
+            logging.error(f"Строка {line_number}: {error_msg}")
+            print(f"Строка {line_number}: {error_msg}", file=sys.stderr)
+            status = 1
+    # Сценарий завершается только после фоновых задач; их ошибки - тоже ошибки сценария.
+    # Задачи могли появиться, только если модуль задач загружен
+    if JOBS_MODULE in sys.modules:
+        from src.sub_functions.jobs_dependences import has_jobs, wait_realisation
+        if has_jobs() and wait_realisation([]):
+            status = 1
+    return status
+
+
+def main(argv: list[str]) -> int:
+    """
+    Точка входа: без аргументов - интерактивная оболочка, -c "команды" - выполнение строки,
+    путь к файлу - выполнение сценария. Возвращает код завершения.
+    """
+    start_shell()
+    if not argv:
+        input_shell()
+        return 0
+    try:
+        if argv[0] == "-c":
+            if len(argv) != 2:
+                raise ValueError("Используйте: main.py -c \"команды\"")
+            text = argv[1]
+        elif len(argv) == 1:
+            with open(argv[0], 'r', encoding='utf-8') as f:
+                text = f.read()
+        else:
+            raise ValueError("Используйте: main.py [-c \"команды\" | сценарий]")
+        commands = parse_script(text)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    return run_batch(commands)
 
 
 sys.excepthook = unhandled_exception
 
 if __name__ == "__main__":
-    logger.info("Запуск приложения")
-    if len(sys.argv) == 1:
-        input_shell()
+    sys.exit(main(sys.argv[1:]))
@@ -1,13 +1,76 @@
+import argparse
+import json
 import shutil
+import sys
+from functools import cache
 from pathlib import Path
 
+from src.sub_functions.compression_dependences import (create_zip, create_zip_parallel, create_tar_gz_parallel,
+                                                       create_tar, index_path_for, stream_zip, stream_tar)
+from src.sub_functions.chunk_store_dependences import store_snapshot, check_snapshot_name
+from src.sub_functions.jobs_dependences import JobCancelled
+from src.sub_functions.incremental_dependences import plan_snapshot, save_manifest, INCREMENTAL_MEMBER
+
 # Здесь собраны функции, необходимые функции архивирования, чтобы не загрязнять и так грязный main
 
+# Расширение tar архива -> сжатие tarfile ("" - без сжатия) и допустимые уровни сжатия
+TAR_COMPRESSIONS = {".tar.gz": "gz", ".tar.bz2": "bz2", ".tar.xz": "xz", ".tar": ""}
+COMPRESSION_LEVELS = {"zip": range(0, 10), "gz": range(0, 10), "bz2": range(1, 10), "xz": range(0, 10), "": range(0)}
+# Имя архива "-" - архив пишется в stdout; формат tar тогда задается --format
+STDOUT_ARCHIVE = "-"
+STREAM_FORMATS = {"tar": "", "gz": "gz", "bz2": "bz2", "xz": "xz"}
+TAR_NAME_ERROR = "Для tar архива имя должно заканчиваться на .tar, .tar.gz, .tar.bz2 или .tar.xz"
+
+
+def tar_compression(archive_name: str) -> str | None:
+    """Сжатие tar архива по расширению имени (None - это не tar архив)"""
+    for extension, compression in TAR_COMPRESSIONS.items():
+        if archive_name.endswith(extension):
+            return compression
+    return None
+
+
+@cache
+def _archive_parser(cmd: str) -> argparse.ArgumentParser:
+    """Парсер опций команды архивации (строится один раз для каждой команды, при первом вызове)"""
+    parser = argparse.ArgumentParser(prog=cmd, exit_on_error=False, add_help=False)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--level", type=int, default=None)
+    parser.add_argument("--store", action="store_true")
+    parser.add_argument("--manifest", action="store_true")
+    parser.add_argument("--since", type=Path, default=None)
+    parser.add_argument("--index", action="store_true")
+    parser.add_argument("--format", choices=list(STREAM_FORMATS), default=None)
+    parser.add_argument("--repo", type=Path, default=None)
+    return parser
+
+
+def archive_options_parse(cmd: str, args: list[str]) -> tuple[dict, list[str]]:
+    """Отделяет опции команды архивации от позиционных аргументов"""
+    try:
+        options, positional = _archive_parser(cmd).parse_known_args(args)
+    except argparse.ArgumentError as e:
+        raise ValueError(f"Ошибка парсинга команды {cmd}: {e}")
+
+    if options.jobs < 1:
+        raise ValueError("Число процессов -j должно быть положительным")
+    if options.jobs > 1 and cmd not in ("zip", "tar"):
+        raise ValueError("Параллельное сжатие (-j) поддерживается только для zip и tar")
+    if options.store and options.level is not None:
+        raise ValueError("--store и --level нельзя указывать вместе")
+    if (options.manifest or options.since is not None) and cmd != "tar":
+        raise ValueError("Инкрементальные архивы (--manifest, --since) поддерживаются только для tar")
+    if options.index and cmd != "tar":
+        raise ValueError("Индекс (--index) поддерживается только для tar")
+    return vars(options), positional
+
 
 def archive_args_parse(args: list[str]) -> list:
     """
     Парсит аргументы для команд архивации.
     """
+    options, positional = archive_options_parse(args[0].lower(), args[1:]) if args else ({}, [])
+    args = args[:1] + positional
     if len(args) != 3:
         raise ValueError("Неверное количество аргументов. Используйте: archive <zip|tar> <директория> <имя_архива>")
 
@@ -30,14 +93,50 @@ def archive_args_parse(args: list[str]) -> list:
     if not source_dir_path.is_dir():
         raise ValueError(f"{source_dir_path} не является директорией")
 
-    # Проверяем расширения архивов
-    if archive_type == 'zip' and not archive_name.endswith('.zip'):
-        raise ValueError("Для zip архива имя должно заканчиваться на .zip")
+    if options["repo"] is not None:
+        # Хранилище фрагментов: имя архива - имя снимка, фрагменты сжимаются zlib с уровнями как у zip
+        if (options["jobs"] > 1 or options["manifest"] or options["since"] is not None or options["index"]
+                or options["format"] is not None):
+            raise ValueError("С --repo из опций используются только --level и --store")
+        check_snapshot_name(archive_name)
+        compression = "zip"
+    elif archive_name == STDOUT_ARCHIVE:
+        # Архив в stdout: рядом с ним нечего положить манифест или индекс
+        if options["manifest"] or options["since"] is not None or options["index"]:
+            raise ValueError("--manifest, --since и --index нельзя использовать при записи архива в stdout")
+        compression = "zip" if archive_type == 'zip' else STREAM_FORMATS[options["format"] or "gz"]
+    elif options["format"] is not None:
+        raise ValueError("--format применяется только при записи архива в stdout (имя архива -)")
+    else:
+        # Проверяем расширения архивов
+        if archive_type == 'zip' and not archive_name.endswith('.zip'):
+            raise ValueError("Для zip архива имя должно заканчиваться на .zip")
+
+        detected = "zip" if archive_type == 'zip' else tar_compression(archive_name)
+        if detected is None:
+            raise ValueError(TAR_NAME_ERROR)
+        compression = detected
+
+    if archive_type == 'tar' and options["jobs"] > 1 and compression != "gz":
+        raise ValueError("Параллельное сжатие (-j) для tar поддерживается только для .tar.gz")
+    # Сжатие потока stdout запоминается, чтобы не определять его повторно
+    options["compression"] = compression
+
+    if archive_type == 'tar' and options["index"] and compression != "gz":
+        raise ValueError("Индекс (--index) поддерживается только для .tar.gz")
 
-    if archive_type == 'tar' and not (archive_name.endswith('.tar.gz') or archive_name.endswith('.tar')):
-        raise ValueError("Для tar архива имя должно заканчиваться на .tar или .tar.gz")
+    # --store - без сжатия: для zip и gzip это уровень 0, у bz2 и xz такого режима нет
+    if options["store"]:
+        if compression in ("bz2", "xz"):
+            raise ValueError(f"--store не поддерживается для .tar.{compression}, используйте .tar")
+        options["level"] = 0
+    elif options["level"] is not None and options["level"] not in COMPRESSION_LEVELS[compression]:
+        levels = COMPRESSION_LEVELS[compression]
+        if not levels:
+            raise ValueError("Для .tar без сжатия --level не применяется")
+        raise ValueError(f"Уровень сжатия для {archive_name} должен быть от {levels.start} до {levels.stop - 1}")
 
-    return [archive_type, source_dir_path, archive_name]
+    return [archive_type, source_dir_path, archive_name, options]
 
 
 def archive_realisation(args: list) -> None:
@@ -45,19 +144,49 @@ def archive_realisation(args: list) -> None:
     Создает архив указанного типа.
     """
     try:
-        archive_type, source_dir, archive_name = archive_args_parse(args)
-
-        if archive_type == 'zip':
-            _create_zip_archive(source_dir, archive_name)
+        archive_type, source_dir, archive_name, options = archive_args_parse(args)
+
+        if options["repo"] is not None:
+            stats = store_snapshot(source_dir, options["repo"], archive_name, options["level"])
+            print(f"Снимок {archive_name}: файлов {stats['files']}, прочитано {stats['bytes']} байт, "
+                  f"новых фрагментов {stats['new_chunks']} из {stats['chunks']}, записано {stats['written']} байт")
+        elif archive_name == STDOUT_ARCHIVE:
+            _stream_archive(archive_type, source_dir, options)
+        elif archive_type == 'zip':
+            _create_zip_archive(source_dir, archive_name, options["jobs"], options["level"])
         else:  # tar
-            _create_tar_archive(source_dir, archive_name)
+            _create_tar_archive(source_dir, archive_name, options["jobs"], options["level"],
+                                options["manifest"], options["since"], options["index"])
 
     except Exception as e:
         raise e
 
 
-def _create_zip_archive(source_dir: Path, archive_name: str) -> None:
-    """Создает ZIP архив с использованием shutil.make_archive."""
+def _stream_archive(archive_type: str, source_dir: Path, options: dict) -> None:
+    """
+    Пишет архив в stdout без временных файлов: его можно передать по каналу другому процессу.
+    Как и tar, отказывается писать двоичные данные в терминал.
+    """
+    if sys.stdout.isatty():
+        raise ValueError("Архив не записывается в терминал: перенаправьте вывод в файл или канал")
+    # Вывод фоновой задачи и команды в конвейере перехватывается в текст - двоичному архиву там не место
+    out = getattr(sys.stdout, "buffer", None)
+    if out is None:
+        raise ValueError("Архив в stdout (-) не пишется в фоновой задаче и конвейере: "
+                         "перенаправьте вывод в файл (> файл)")
+    if archive_type == 'zip':
+        stream_zip(source_dir, out, options["jobs"], options["level"])
+    else:
+        stream_tar(source_dir, out, options["compression"], options["jobs"], options["level"])
+    out.flush()
+
+
+def _create_zip_archive(source_dir: Path, archive_name: str, jobs: int = 1, level: int | None = None) -> None:
+    """
+    Создает ZIP архив с использованием shutil.make_archive.
+    При заданном уровне сжатия (0 - без сжатия) - через zipfile, при jobs > 1 - собственным писателем
+    с пулом процессов.
+    """
     # Создаем полный путь к архиву
     archive_path = Path(archive_name)
     if not archive_path.is_absolute():
@@ -69,31 +198,57 @@ def _create_zip_archive(source_dir: Path, archive_name: str) -> None:
     # Создаем родительские директории, если их нетa
     base_name.parent.mkdir(parents=True, exist_ok=True)
 
-    shutil.make_archive(str(base_name), 'zip', source_dir)
-
-
-def _create_tar_archive(source_dir: Path, archive_name: str) -> None:
-    """Создает TAR архив."""
-    # Определяем формат архива по расширению
-    if archive_name.endswith('.tar.gz'):
-        format_type = 'gztar'
-    else:
-        format_type = 'tar'
+    try:
+        if jobs > 1:
+            create_zip_parallel(source_dir, archive_path, jobs, level)
+        elif level is not None:
+            create_zip(source_dir, archive_path, level)
+        else:
+            shutil.make_archive(str(base_name), 'zip', source_dir)
+    except JobCancelled:
+        # Фоновую задачу прервали (kill) - недописанный архив не оставляем
+        archive_path.unlink(missing_ok=True)
+        raise
+
+
+def _create_tar_archive(source_dir: Path, archive_name: str, jobs: int = 1, level: int | None = None,
+                        manifest: bool = False, since: Path | None = None, index: bool = False) -> None:
+    """
+    Создает TAR архив (.tar, .tar.gz, .tar.bz2, .tar.xz; при jobs > 1 tar.gz сжимается блоками параллельно).
+    manifest - записать рядом манифест для следующих инкрементов, since - архив (или манифест),
+    относительно которого пишутся только измененные и новые файлы и список удаленных.
+    index - tar.gz из независимых блоков с индексом файлов, чтобы untar -m не распаковывал архив с начала.
+    """
+    compression = tar_compression(archive_name)
+    if compression is None:
+        raise ValueError(TAR_NAME_ERROR)
 
     # Создаем полный путь к архиву
     archive_path = Path(archive_name)
     if not archive_path.is_absolute():
         archive_path = source_dir / archive_path
 
-    # Создаем базовое имя без расширения
-    if format_type == 'gztar':
-        # Для .tar.gz удаляем расширение
-        base_name = archive_path.with_suffix('').with_suffix('')
-    else:
-        # Для .tar удаляем одно расширение
-        base_name = archive_path.with_suffix('')
-
     # Создаем родительские директории, если их нет
-    base_name.parent.mkdir(parents=True, exist_ok=True)
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+
+    members, metadata, snapshot = None, None, None
+    if manifest or since is not None:
+        snapshot, members, incremental = plan_snapshot(source_dir, archive_path, since)
+        metadata = (INCREMENTAL_MEMBER, json.dumps(incremental, ensure_ascii=False).encode("utf-8"))
 
-    shutil.make_archive(str(base_name), format_type, source_dir)
+    # Индекс от прежнего архива с тем же именем больше не соответствует содержимому
+    index_path_for(archive_path).unlink(missing_ok=True)
+    try:
+        if jobs > 1 or index:
+            create_tar_gz_parallel(source_dir, archive_path, jobs, level, members, metadata, index)
+        else:
+            create_tar(source_dir, archive_path, compression, level, members, metadata)
+    except JobCancelled:
+        # Фоновую задачу прервали (kill) - недописанный архив не оставляем
+        archive_path.unlink(missing_ok=True)
+        index_path_for(archive_path).unlink(missing_ok=True)
+        raise
+
+    # Манифест сохраняется только после успешной записи архива
+    if snapshot is not None:
+        save_manifest(archive_path, snapshot)
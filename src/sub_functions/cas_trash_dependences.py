@@ -0,0 +1,198 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+from pathlib import Path
+
+from src.sub_functions.history_dependences import history_lock
+
+# Здесь собраны функции дедуплицирующего хранилища корзины, чтобы не загрязнять и так грязный main
+#
+# Устройство хранилища внутри каталога корзины:
+#   .cas/objects/ab/abcdef...  - уникальное содержимое файла (имя - sha256)
+#   .cas/entries/<имя>         - элемент корзины, жесткая ссылка на объект
+#   .cas/manifest.jsonl        - элемент -> объект и исходные метаданные (права, время)
+#   .cas/enabled               - признак включенного хранилища (проверяется в основной корзине)
+
+
+# Константы
+CAS_DIR = ".cas"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def cas_root(trash_dir: Path) -> Path:
+    """Каталог хранилища внутри корзины"""
+    return trash_dir / CAS_DIR
+
+
+def cas_entries_dir(trash_dir: Path) -> Path:
+    """Каталог элементов хранилища"""
+    return cas_root(trash_dir) / "entries"
+
+
+def cas_enabled(trash_dir: Path) -> bool:
+    """Включено ли дедуплицирующее хранилище"""
+    return (cas_root(trash_dir) / "enabled").exists()
+
+
+def set_cas_enabled(trash_dir: Path, enabled: bool) -> None:
+    """Включает или выключает хранилище. Уже сохраненные элементы остаются восстанавливаемыми"""
+    marker = cas_root(trash_dir) / "enabled"
+    if enabled:
+        marker.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        marker.touch()
+    elif marker.exists():
+        marker.unlink()
+
+
+def is_cas_entry(path: Path) -> bool:
+    """Является ли путь элементом хранилища"""
+    return path.parent.name == "entries" and path.parent.parent.name == CAS_DIR
+
+
+def _object_path(root: Path, digest: str) -> Path:
+    """Путь объекта по хешу содержимого"""
+    return root / "objects" / digest[:2] / digest
+
+
+def hash_file(path: Path) -> str:
+    """sha256 содержимого файла (читается блоками, без загрузки в память целиком)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_append(root: Path, record: dict) -> None:
+    """Дописывает запись в манифест (манифест только дополняется, удаление - отдельная запись)"""
+    with open(root / "manifest.jsonl", 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def manifest_lookup(root: Path, entry_id: str) -> dict | None:
+    """Последняя запись манифеста об элементе (None - элемент удален или неизвестен)"""
+    manifest = root / "manifest.jsonl"
+    found = None
+    if manifest.exists():
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record["id"] == entry_id:
+                    found = None if record.get("removed") else record
+    return found
+
+
+def compact_manifest(root: Path) -> None:
+    """Убирает из манифеста записи удаленных элементов"""
+    manifest = root / "manifest.jsonl"
+    if not manifest.exists():
+        return
+    with history_lock():
+        live: dict[str, str] = {}
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("removed"):
+                    live.pop(record["id"], None)
+                else:
+                    live[record["id"]] = line
+        with open(manifest, 'w', encoding='utf-8') as f:
+            f.writelines(live.values())
+
+
+def cas_store(source: Path, entry: Path) -> None:
+    """
+    Кладет обычный файл в хранилище под именем entry. Новое содержимое переименовывается в объект,
+    повторяющееся - просто удаляется, а элемент становится жесткой ссылкой на уже сохраненный объект.
+    """
+    root = entry.parent.parent
+    source_stat = os.lstat(source)
+    if not stat.S_ISREG(source_stat.st_mode):
+        raise ValueError(f"{source} не является обычным файлом")
+
+    digest = hash_file(source)
+    object_path = _object_path(root, digest)
+
+    with history_lock():
+        object_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        entry.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        if object_path.exists():
+            # Такое содержимое уже есть - храним его один раз
+            os.unlink(source)
+        else:
+            try:
+                os.rename(source, object_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise e
+                shutil.move(str(source), str(object_path))
+
+        try:
+            os.link(object_path, entry)
+        except OSError:
+            # Файловая система без жестких ссылок - храним копию
+            shutil.copyfile(object_path, entry)
+
+        _manifest_append(root, {
+            "id": entry.name,
+            "blob": digest,
+            "size": source_stat.st_size,
+            "mode": source_stat.st_mode,
+            "atime_ns": source_stat.st_atime_ns,
+            "mtime_ns": source_stat.st_mtime_ns,
+        })
+
+
+def cas_restore(entry: Path, target: Path) -> None:
+    """Восстанавливает элемент хранилища в target с исходными правами и временем изменения"""
+    root = entry.parent.parent
+    with history_lock():
+        record = manifest_lookup(root, entry.name)
+        if record is None:
+            raise FileNotFoundError(f"Элемент {entry.name} отсутствует в манифесте корзины")
+        object_path = _object_path(root, record["blob"])
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if os.lstat(entry).st_nlink <= 2:
+            # Объект больше никому не нужен - восстанавливаем переименованием
+            os.rename(entry, target)
+            if object_path.exists():
+                os.unlink(object_path)
+        else:
+            # Объект разделяют другие элементы - восстанавливаем копией, чтобы не изменить их содержимое
+            shutil.copyfile(entry, target)
+            os.unlink(entry)
+
+        os.chmod(target, stat.S_IMODE(record["mode"]))
+        os.utime(target, ns=(record["atime_ns"], record["mtime_ns"]))
+        _manifest_append(root, {"id": entry.name, "removed": True})
+
+
+def cas_remove(entry: Path) -> int:
+    """Удаляет элемент хранилища навсегда. Возвращает число освобожденных байт (0, если объект еще используется)"""
+    root = entry.parent.parent
+    with history_lock():
+        record = manifest_lookup(root, entry.name)
+        os.unlink(entry)
+        freed = 0
+        if record is not None:
+            object_path = _object_path(root, record["blob"])
+            if object_path.exists() and os.lstat(object_path).st_nlink == 1:
+                freed = os.lstat(object_path).st_size
+                os.unlink(object_path)
+        _manifest_append(root, {"id": entry.name, "removed": True})
+    return freed
+
+
+def cas_stored_bytes(trash_dir: Path) -> int:
+    """Сколько байт реально занимают уникальные объекты хранилища"""
+    objects_dir = cas_root(trash_dir) / "objects"
+    total = 0
+    if objects_dir.exists():
+        for object_path in objects_dir.glob("*/*"):
+            total += object_path.lstat().st_size
+    return total
@@ -1,15 +1,23 @@
 import argparse
 from pathlib import Path
+from functools import cache
+from typing import Iterator
 
 # Здесь собраны функции, необходимые основной функции - cat, чтобы не загрязнять и так грязный main
 
 
-def cat_args_parse(args: list[str]) -> Path:
-    """Проверяет аргумент path функции cat. Возвращает этот путь класса Path или ошибку."""
+@cache
+def _cat_parser() -> argparse.ArgumentParser:
+    """Парсер команды cat (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(prog="cat", description="Просмотр содержимого файла", exit_on_error=False)
     parser.add_argument("file", help="Файл для просмотра")
+    return parser
+
+
+def cat_args_parse(args: list[str]) -> Path:
+    """Проверяет аргумент path функции cat. Возвращает этот путь класса Path или ошибку."""
     try:
-        parsed_args = parser.parse_args(args)
+        parsed_args = _cat_parser().parse_args(args)
         return Path(parsed_args.file)
     except argparse.ArgumentError as e:
         raise Exception(f"Ошибка парсинга команды cat: {e}")
@@ -21,3 +29,11 @@ def cat_realisation(path: str) -> None:
     file_path = Path(path)
     with file_path.open("r", encoding='utf-8') as file:
         print(file.read())
+
+
+def cat_lines(path: str) -> Iterator[str]:
+    """Лениво отдает строки файла (без перевода строки) - для конвейера, файл не читается целиком"""
+    file_path = Path(path)
+    with file_path.open("r", encoding='utf-8') as file:
+        for line in file:
+            yield line.rstrip("\n")
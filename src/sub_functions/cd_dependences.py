@@ -2,16 +2,23 @@ import argparse
 import logging
 import os
 from pathlib import Path
+from functools import cache
 
 # Здесь собраны функции, необходимые основной функции - cd, чтобы не загрязнять и так грязный main
 
 
-def cd_args_parse(args: list[str]) -> Path:
-    """Проверяет аргумент path функции cd. Возвращает этот путь класса Path или ошибку."""
+@cache
+def _cd_parser() -> argparse.ArgumentParser:
+    """Парсер команды cd (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(prog="cd", description="Смена текущей директории.", exit_on_error=False)
     parser.add_argument("path", help="Путь для смены каталога.")
+    return parser
+
+
+def cd_args_parse(args: list[str]) -> Path:
+    """Проверяет аргумент path функции cd. Возвращает этот путь класса Path или ошибку."""
     try:
-        parsed_args = parser.parse_args(args)
+        parsed_args = _cd_parser().parse_args(args)
         path_str = parsed_args.path
         if path_str == "~":
             path_str = os.path.expanduser("~")
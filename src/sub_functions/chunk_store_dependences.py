@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import stat
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+# Здесь собраны функции хранилища фрагментов для zip/tar --repo, чтобы не загрязнять и так грязный main
+#
+# Файлы режутся на фрагменты по содержимому (скользящий хеш Gear, как в FastCDC): граница фрагмента зависит
+# только от последних байт, поэтому вставка в начало файла меняет один-два фрагмента, а не все следующие.
+# Устройство хранилища:
+#   chunks/ab/abcdef...   - уникальный фрагмент (имя - sha256 несжатых данных), сжатый zlib
+#   snapshots/<имя>.json  - снимок каталога: пути, права, время изменения и список фрагментов каждого файла
+
+
+# Константы
+CHUNK_FORMAT = "chunks"
+# Первые MIN_CHUNK_SIZE байт фрагмента не хешируются (как в FastCDC) - это половина работы скользящего хеша
+MIN_CHUNK_SIZE = 32 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+# Граница - когда старшие 15 бит хеша нулевые: средний размер фрагмента ~32K сверх минимального
+CUT_THRESHOLD = 1 << 49
+READ_SIZE = 1024 * 1024
+DEFAULT_CHUNK_LEVEL = 6
+# Случайная, но постоянная таблица Gear: значение для каждого байта
+GEAR = tuple(int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "little") for i in range(256))
+# Для поиска границы пачками: k-й байт значения GEAR для каждого байта (таблицы для bytes.translate)
+GEAR_BYTES = tuple(bytes(value >> (8 * k) & 0xFF for value in GEAR) for k in range(8))
+GEAR_WINDOW = 64
+LANE_BYTES = 16
+SCAN_BATCH = 1024
+
+
+def _gear_hashes(data: bytes) -> bytes:
+    """
+    Хеши Gear всех позиций data (хеш начинается с нуля в начале data): 16 байт на позицию, младшие 8 - хеш.
+    Вместо цикла по байтам: таблица Gear раскладывается по 8 байтовым таблицам для translate, получаются
+    значения GEAR[byte] в дорожках по 16 байт одного большого числа. Хеш позиции - сумма GEAR[byte] << k
+    по последним байтам, ее дают шесть сложений со сдвигом (удвоение окна: 1, 2, 4, ..., 64 байт).
+    Дорожки не переполняются (сумма меньше 2^128), поэтому переносов между позициями нет.
+    """
+    lanes = bytearray(len(data) * LANE_BYTES)
+    for k, table in enumerate(GEAR_BYTES):
+        lanes[k::LANE_BYTES] = data.translate(table)
+    value = int.from_bytes(lanes, "little")
+    shift = LANE_BYTES * 8 + 1
+    for _ in range(6):
+        value += value << shift
+        shift *= 2
+    return value.to_bytes(max(len(lanes), (value.bit_length() + 7) // 8), "little")
+
+
+def find_cut(data: bytes) -> int:
+    """
+    Длина первого фрагмента в data: первая граница по скользящему хешу после минимального размера.
+    Хеши считаются пачками по SCAN_BATCH байт; пачка захватывает 63 байта перед собой, этого достаточно,
+    так как старшие биты хеша зависят только от последних 64 байт.
+    """
+    end = min(len(data), MAX_CHUNK_SIZE)
+    start = MIN_CHUNK_SIZE
+    while start < end:
+        stop = min(start + SCAN_BATCH, end)
+        context = max(start - GEAR_WINDOW + 1, MIN_CHUNK_SIZE)
+        hashes = _gear_hashes(data[context:stop])
+        # Хеш меньше CUT_THRESHOLD (< 2^56) возможен только при нулевом старшем байте - его ищет bytes.find
+        high = hashes[7:(stop - context) * LANE_BYTES:LANE_BYTES]
+        position = high.find(0, start - context)
+        while position != -1:
+            offset = position * LANE_BYTES
+            if int.from_bytes(hashes[offset:offset + 8], "little") < CUT_THRESHOLD:
+                return context + position + 1
+            position = high.find(0, position + 1)
+        start = stop
+    return end
+
+
+def iter_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    """Делит поток на фрагменты по содержимому, читая его блоками (в памяти не больше блока и фрагмента)"""
+    buffer = b""
+    eof = False
+    while True:
+        if not eof and len(buffer) < MAX_CHUNK_SIZE:
+            block = stream.read(READ_SIZE)
+            eof = not block
+            buffer += block
+            continue
+        if not buffer:
+            return
+        cut = find_cut(buffer)
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+
+
+def _chunk_path(repo: Path, digest: str) -> Path:
+    """Путь фрагмента по хешу содержимого"""
+    return repo / "chunks" / digest[:2] / digest
+
+
+def snapshot_path(repo: Path, name: str) -> Path:
+    """Путь описания снимка"""
+    return repo / "snapshots" / f"{name}.json"
+
+
+def check_snapshot_name(name: str) -> None:
+    """Имя снимка становится именем файла в хранилище и каталога при распаковке"""
+    if not name or name in (".", "..") or "/" in name or os.sep in name or name.startswith("-"):
+        raise ValueError(f"Недопустимое имя снимка: {name}")
+
+
+def _write_chunk(repo: Path, digest: str, data: bytes, level: int) -> int:
+    """Сохраняет фрагмент, если его еще нет. Возвращает число записанных байт (0 - фрагмент уже был)"""
+    path = _chunk_path(repo, digest)
+    if path.exists():
+        return 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    packed = zlib.compress(data, level)
+    # Сначала во временный файл: оборванная запись не оставит испорченный фрагмент под настоящим именем
+    temp_path = path.with_name(f".{digest}.{os.getpid()}.tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(packed)
+    os.replace(temp_path, path)
+    return len(packed)
+
+
+def _previous_files(repo: Path, source: str) -> dict[str, dict]:
+    """
+    Файлы последнего снимка того же каталога: путь -> запись. Файл с теми же размером и временем изменения
+    не читается заново - его список фрагментов берется из этого снимка.
+    """
+    manifests = sorted((repo / "snapshots").glob("*.json"), key=lambda path: path.stat().st_mtime_ns, reverse=True)
+    for manifest in manifests:
+        try:
+            with open(manifest, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if snapshot.get("source") == source:
+            return {entry["path"]: entry for entry in snapshot["entries"] if entry["type"] == "file"}
+    return {}
+
+
+def store_snapshot(source_dir: Path, repo: Path, name: str, level: int | None = None) -> dict:
+    """
+    Сохраняет каталог в хранилище как снимок name: записываются только фрагменты, которых там еще нет,
+    а файлы, не изменившиеся с прошлого снимка этого каталога, не читаются.
+    Возвращает статистику: файлы, прочитанные байты, новые фрагменты и записанные байты.
+    """
+    check_snapshot_name(name)
+    manifest = snapshot_path(repo, name)
+    if manifest.exists():
+        raise FileExistsError(f"Снимок {name} уже есть в хранилище {repo}")
+    level = DEFAULT_CHUNK_LEVEL if level is None else level
+    repo_root = os.path.abspath(repo)
+    source = os.path.abspath(source_dir)
+    previous = _previous_files(repo, source)
+
+    stats = {"files": 0, "bytes": 0, "chunks": 0, "new_chunks": 0, "written": 0}
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        # Хранилище внутри архивируемого каталога в снимок не попадает
+        dirnames[:] = sorted(dirname for dirname in dirnames
+                             if os.path.abspath(os.path.join(dirpath, dirname)) != repo_root)
+        for entry_name in dirnames + sorted(filenames):
+            path = os.path.join(dirpath, entry_name)
+            rel = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            path_stat = os.lstat(path)
+            entry = {"path": rel, "mode": stat.S_IMODE(path_stat.st_mode), "mtime_ns": path_stat.st_mtime_ns}
+
+            if stat.S_ISDIR(path_stat.st_mode):
+                entry["type"] = "dir"
+            elif stat.S_ISLNK(path_stat.st_mode):
+                entry["type"] = "link"
+                entry["target"] = os.readlink(path)
+            elif stat.S_ISREG(path_stat.st_mode):
+                unchanged = previous.get(rel)
+                if (unchanged is not None and unchanged["size"] == path_stat.st_size
+                        and unchanged["mtime_ns"] == path_stat.st_mtime_ns):
+                    chunks: list[str] = list(unchanged["chunks"])
+                else:
+                    chunks = []
+                    with open(path, 'rb') as f:
+                        for chunk in iter_chunks(f):
+                            digest = hashlib.sha256(chunk).hexdigest()
+                            written = _write_chunk(repo, digest, chunk, level)
+                            chunks.append(digest)
+                            stats["new_chunks"] += written > 0
+                            stats["written"] += written
+                    stats["bytes"] += path_stat.st_size
+                entry.update({"type": "file", "size": path_stat.st_size, "chunks": chunks})
+                stats["files"] += 1
+                stats["chunks"] += len(chunks)
+            else:
+                continue
+            entries.append(entry)
+
+    # Описание снимка пишется последним: снимок появляется только когда все его фрагменты на месте
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = manifest.with_name(f".{manifest.name}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({"name": name, "created": time.time(), "source": source, "entries": entries}, f, ensure_ascii=False)
+    os.replace(temp_path, manifest)
+    return stats
+
+
+def load_snapshot(repo: Path, name: str) -> dict:
+    """Читает описание снимка"""
+    check_snapshot_name(name)
+    manifest = snapshot_path(repo, name)
+    if not manifest.is_file():
+        raise FileNotFoundError(f"Снимок {name} не найден в хранилище {repo}")
+    with open(manifest, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_chunk(repo: Path, digest: str) -> bytes:
+    """Читает фрагмент и проверяет, что его содержимое соответствует хешу"""
+    path = _chunk_path(repo, digest)
+    try:
+        with open(path, 'rb') as f:
+            data = zlib.decompress(f.read())
+    except (OSError, zlib.error) as e:
+        raise ValueError(f"Фрагмент {digest} хранилища {repo} недоступен или поврежден: {e}")
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Фрагмент {digest} хранилища {repo} поврежден")
+    return data
+
+
+def _entry_target(extract_path: Path, rel: str) -> Path:
+    """Путь распаковки записи снимка; пути вне каталога распаковки не допускаются"""
+    parts = rel.split("/")
+    if rel.startswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"Недопустимый путь в снимке: {rel}")
+    return extract_path.joinpath(*parts)
+
+
+def list_snapshot(repo: Path, name: str, selector: Callable[[str], bool] | None = None) -> list[dict]:
+    """Содержимое снимка в формате списка архива (для unzip/untar -l)"""
+    entries = []
+    for entry in load_snapshot(repo, name)["entries"]:
+        if selector is None or selector(entry["path"]):
+            entries.append({"name": entry["path"], "size": entry.get("size", 0),
+                            "mtime": datetime.fromtimestamp(entry["mtime_ns"] / 1e9), "is_dir": entry["type"] == "dir"})
+    return entries
+
+
+def restore_snapshot(repo: Path, name: str, extract_path: Path,
+                     selector: Callable[[str], bool] | None = None) -> None:
+    """
+    Восстанавливает снимок в extract_path: файлы собираются из фрагментов (каждый проверяется по хешу),
+    затем восстанавливаются права и время изменения. selector - какие пути восстанавливать.
+    """
+    entries = [entry for entry in load_snapshot(repo, name)["entries"]
+               if selector is None or selector(entry["path"])]
+    for entry in entries:
+        target = _entry_target(extract_path, entry["path"])
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if entry["type"] == "dir":
+            target.mkdir(exist_ok=True)
+        elif entry["type"] == "link":
+            link_target = entry["target"]
+            # Как фильтр data у tarfile: ссылка не должна вести за пределы каталога распаковки
+            resolved = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(target)), link_target))
+            if os.path.isabs(link_target) or not Path(resolved).is_relative_to(extract_path.resolve()):
+                raise ValueError(f"Ссылка {entry['path']} ведет за пределы каталога распаковки")
+            target.symlink_to(link_target)
+        else:
+            with open(target, 'wb') as f:
+                for digest in entry["chunks"]:
+                    f.write(_read_chunk(repo, digest))
+            os.chmod(target, entry["mode"])
+            os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    # Каталогам права и время выставляются в конце: запись файлов внутрь меняет их время изменения
+    for entry in reversed(entries):
+        if entry["type"] == "dir":
+            target = _entry_target(extract_path, entry["path"])
+            os.chmod(target, entry["mode"])
+            os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+
+def repo_size(repo: Path) -> int:
+    """Сколько байт занимают фрагменты хранилища"""
+    return sum(path.stat().st_size for path in (repo / "chunks").glob("*/*")) if (repo / "chunks").exists() else 0
@@ -0,0 +1,520 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from src.sub_functions.jobs_dependences import check_cancelled
+
+# Здесь собраны функции параллельного сжатия для команд zip и tar, чтобы не загрязнять и так грязный main
+
+
+# Константы формата zip
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+ZIP_UTF8_FLAG = 0x800
+ZIP_DESCRIPTOR_FLAG = 0x08  # crc и размеры - в дескрипторе данных после данных файла
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+ZIP_UNIX_SYSTEM = 3
+DEFAULT_LEVEL = 6
+GZIP_BLOCK_SIZE = 1024 * 1024  # размер блока tar потока, сжимаемого одним потоком
+ZIP_CHUNK_SIZE = 1024 * 1024  # файлы zip читаются и сжимаются блоками этого размера
+INDEX_SUFFIX = ".index.json"
+
+
+def collect_zip_members(source_dir: Path, skip: Path | None = None) -> list[dict]:
+    """
+    Собирает каталоги и файлы source_dir в порядке os.walk (как shutil.make_archive).
+    skip - путь самого архива, если он создается внутри source_dir.
+    """
+    members = []
+    skip_path = os.path.abspath(skip) if skip is not None else None
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        arcdir = os.path.relpath(dirpath, source_dir)
+        for name in dirnames:
+            path = os.path.join(dirpath, name)
+            arcname = os.path.normpath(os.path.join(arcdir, name)).replace(os.sep, "/") + "/"
+            members.append({"path": path, "arcname": arcname, "is_dir": True, "stat": os.stat(path)})
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if not os.path.isfile(path) or os.path.abspath(path) == skip_path:
+                continue
+            arcname = os.path.normpath(os.path.join(arcdir, name)).replace(os.sep, "/")
+            members.append({"path": path, "arcname": arcname, "is_dir": False, "stat": os.stat(path)})
+    return members
+
+
+def deflate_file(path: str, level: int, tmp_dir: str) -> tuple[int, int, int, int, str]:
+    """
+    Сжимает файл в «сырой» deflate-поток (без заголовков zlib) - выполняется в отдельном процессе.
+    Файл читается блоками, сжатые данные пишутся во временный файл в tmp_dir, поэтому память не зависит
+    от размера файла. Возвращает (crc32, исходный размер, метод, размер данных, файл с данными).
+    Несжимаемые данные сохраняются как есть - тогда файл с данными это сам исходный файл.
+    """
+    crc = size = 0
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if level != 0 else None
+    with open(path, 'rb') as f, tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        while chunk := f.read(ZIP_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            if compressor is not None:
+                tmp.write(compressor.compress(chunk))
+        if compressor is not None:
+            tmp.write(compressor.flush())
+        compressed_size = tmp.tell()
+
+    if compressor is None or compressed_size >= size:
+        os.unlink(tmp.name)
+        return crc, size, ZIP_STORED, size, path
+    return crc, size, ZIP_DEFLATED, compressed_size, tmp.name
+
+
+def compress_members(members: list[dict], jobs: int, level: int, tmp_dir: str) -> Iterator[dict]:
+    """
+    Сжимает файлы в пуле из jobs процессов (jobs > 1) и отдает их в исходном порядке.
+    Вперед сжимается не больше 2*jobs файлов: на диске лежит не больше 2*jobs временных файлов.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: deque = deque()
+        for member in members:
+            future = None if member["is_dir"] else executor.submit(deflate_file, member["path"], level, tmp_dir)
+            pending.append((member, future))
+            if len(pending) > 2 * jobs:
+                yield _resolve_member(*pending.popleft())
+        while pending:
+            yield _resolve_member(*pending.popleft())
+
+
+def _resolve_member(member: dict, future: Future | None) -> dict:
+    """Дополняет описание файла результатом сжатия"""
+    if future is None:
+        return {**member, "crc": 0, "size": 0, "method": ZIP_STORED, "data": b""}
+    return _compressed_member(member, future.result())
+
+
+def _compressed_member(member: dict, result: tuple[int, int, int, int, str]) -> dict:
+    crc, size, method, compressed_size, data_path = result
+    return {**member, "crc": crc, "size": size, "method": method, "compressed_size": compressed_size,
+            "data_path": data_path, "temporary": data_path != member["path"]}
+
+
+def _copy_member_data(member: dict, out: BinaryIO) -> None:
+    """Копирует сжатые данные файла в архив блоками и удаляет временный файл"""
+    try:
+        with open(member["data_path"], 'rb') as f:
+            shutil.copyfileobj(f, out, ZIP_CHUNK_SIZE)
+    finally:
+        if member["temporary"]:
+            os.unlink(member["data_path"])
+
+
+def _dos_datetime(mtime: float) -> tuple[int, int]:
+    """Дата и время в формате MS-DOS, который используется в заголовках zip"""
+    moment = time.localtime(mtime)
+    if moment.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (moment.tm_hour << 11) | (moment.tm_min << 5) | (moment.tm_sec // 2)
+    dos_date = ((moment.tm_year - 1980) << 9) | (moment.tm_mon << 5) | moment.tm_mday
+    return dos_time, dos_date
+
+
+def write_zip(out: BinaryIO, members: Iterable[dict]) -> None:
+    """
+    Пишет zip архив. Архив пишется строго последовательно (без seek), поэтому out может быть и файлом,
+    и каналом. Файл, сжатый заранее (есть crc), пишется с размерами в локальном заголовке; файл с уровнем
+    сжатия level сжимается блоками прямо в out, а crc и размеры пишутся после данных (дескриптор данных).
+    При необходимости используются записи zip64.
+    """
+    offset = 0
+    central = []
+
+    for member in members:
+        name = member["arcname"].encode("utf-8")
+        flags = ZIP_UTF8_FLAG if not member["arcname"].isascii() else 0
+        dos_time, dos_date = _dos_datetime(member["stat"].st_mtime)
+        if "crc" in member:
+            method, crc, size, compressed_size, written, zip64 = _write_compressed_member(
+                out, member, name, flags, dos_time, dos_date)
+        else:
+            flags |= ZIP_DESCRIPTOR_FLAG
+            method, crc, size, compressed_size, written, zip64 = _write_streamed_member(
+                out, member, name, flags, dos_time, dos_date)
+
+        # Запись центрального каталога
+        zip64_fields = [value for value in (size, compressed_size, offset) if value >= ZIP64_LIMIT]
+        central_extra = struct.pack(f"<HH{len(zip64_fields)}Q", 1, 8 * len(zip64_fields), *zip64_fields) \
+            if zip64_fields else b""
+        version = ZIP64_VERSION if zip64_fields or zip64 else ZIP_VERSION
+        external_attr = (member["stat"].st_mode & 0xFFFF) << 16 | (0x10 if member["is_dir"] else 0)
+        central.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (ZIP_UNIX_SYSTEM << 8) | version, version, flags,
+            method, dos_time, dos_date, crc, min(compressed_size, ZIP64_LIMIT),
+            min(size, ZIP64_LIMIT), len(name), len(central_extra), 0, 0, 0, external_attr,
+            min(offset, ZIP64_LIMIT)) + name + central_extra)
+
+        offset += written
+
+    central_offset = offset
+    central_size = sum(len(record) for record in central)
+    for record in central:
+        out.write(record)
+
+    count = len(central)
+    if count >= ZIP_FILECOUNT_LIMIT or central_offset >= ZIP64_LIMIT or central_size >= ZIP64_LIMIT:
+        # Конец центрального каталога zip64 и указатель на него
+        zip64_end_offset = central_offset + central_size
+        out.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0,
+                              count, count, central_size, central_offset))
+        out.write(struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1))
+    out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, ZIP_FILECOUNT_LIMIT),
+                          min(count, ZIP_FILECOUNT_LIMIT), min(central_size, ZIP64_LIMIT),
+                          min(central_offset, ZIP64_LIMIT), 0))
+
+
+def _local_header(member_name: bytes, flags: int, method: int, dos_time: int, dos_date: int, crc: int,
+                  size: int, compressed_size: int, zip64: bool) -> bytes:
+    """Локальный заголовок файла (в zip64 размеры - в дополнительном поле)"""
+    extra = struct.pack("<HHQQ", 1, 16, size, compressed_size) if zip64 else b""
+    version = ZIP64_VERSION if zip64 else ZIP_VERSION
+    return struct.pack("<IHHHHHIIIHH", 0x04034B50, version, flags, method, dos_time, dos_date, crc,
+                       ZIP64_LIMIT if zip64 else compressed_size, ZIP64_LIMIT if zip64 else size,
+                       len(member_name), len(extra)) + member_name + extra
+
+
+def _write_compressed_member(out: BinaryIO, member: dict, name: bytes, flags: int, dos_time: int,
+                             dos_date: int) -> tuple[int, int, int, int, int, bool]:
+    """
+    Пишет файл, сжатый заранее: размеры известны, дескриптор данных не нужен.
+    Возвращает (метод, crc, размер, сжатый размер, записано байт, zip64 ли локальный заголовок).
+    """
+    # Данные каталога (и готовые данные) - в самом описании, данные файла - во временном файле
+    data = member.get("data")
+    size = member["size"]
+    compressed_size = len(data) if data is not None else member["compressed_size"]
+    zip64 = size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT
+    header = _local_header(name, flags, member["method"], dos_time, dos_date, member["crc"], size,
+                           compressed_size, zip64)
+    out.write(header)
+    if data is not None:
+        out.write(data)
+    else:
+        _copy_member_data(member, out)
+    return member["method"], member["crc"], size, compressed_size, len(header) + compressed_size, zip64
+
+
+def _write_streamed_member(out: BinaryIO, member: dict, name: bytes, flags: int, dos_time: int,
+                           dos_date: int) -> tuple[int, int, int, int, int, bool]:
+    """
+    Сжимает файл блоками прямо в архив: в памяти только текущий блок. crc и размеры становятся известны
+    после данных, поэтому в локальном заголовке они нулевые (флаг 3), а после данных пишется дескриптор.
+    Возвращает то же, что _write_compressed_member.
+    """
+    level = member["level"]
+    method = ZIP_STORED if level == 0 else ZIP_DEFLATED
+    # Формат дескриптора (zip64 или нет) выбирается до записи данных - по размеру файла с запасом, как в zipfile
+    zip64 = member["stat"].st_size * 1.05 > ZIP64_LIMIT
+    header = _local_header(name, flags, method, dos_time, dos_date, 0, 0, 0, zip64)
+    out.write(header)
+
+    crc = size = compressed_size = 0
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if method == ZIP_DEFLATED else None
+    with open(member["path"], 'rb') as f:
+        while chunk := f.read(ZIP_CHUNK_SIZE):
+            check_cancelled()
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data = compressor.compress(chunk) if compressor is not None else chunk
+            out.write(data)
+            compressed_size += len(data)
+    if compressor is not None:
+        data = compressor.flush()
+        out.write(data)
+        compressed_size += len(data)
+
+    if not zip64 and (size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT):
+        raise ValueError(f"Файл {member['path']} вырос во время архивации больше 4 ГБ")
+    descriptor = struct.pack("<IIQQ" if zip64 else "<IIII", 0x08074B50, crc, compressed_size, size)
+    out.write(descriptor)
+    return method, crc, size, compressed_size, len(header) + compressed_size + len(descriptor), zip64
+
+
+def create_zip_parallel(source_dir: Path, archive_path: Path, jobs: int, level: int | None = None) -> None:
+    """Создает zip архив каталога, сжимая файлы в jobs процессов (jobs > 1). При ошибке недописанный архив удаляется"""
+    try:
+        with open(archive_path, 'wb') as out:
+            stream_zip(source_dir, out, jobs, level, skip=archive_path)
+    except Exception as e:
+        archive_path.unlink(missing_ok=True)
+        raise e
+
+
+def stream_zip(source_dir: Path, out: BinaryIO, jobs: int = 1, level: int | None = None,
+               skip: Path | None = None) -> None:
+    """
+    Пишет zip архив каталога в поток out (файл, канал, stdout). Архив пишется последовательно,
+    файлы читаются и сжимаются блоками, поэтому память не зависит от размера файлов.
+    """
+    members = collect_zip_members(source_dir, skip=skip)
+    level = DEFAULT_LEVEL if level is None else level
+    if jobs == 1:
+        # Один процесс - файлы сжимаются прямо в out, без пула и временных файлов
+        write_zip(out, (_resolve_member(member, None) if member["is_dir"] else {**member, "level": level}
+                        for member in members))
+        return
+    # Пул процессов - каждый файл сжимается во временный файл, затем копируется в out
+    with tempfile.TemporaryDirectory(prefix="zip-") as tmp_dir:
+        write_zip(out, compress_members(members, jobs, level, tmp_dir))
+
+
+def create_zip(source_dir: Path, archive_path: Path, level: int) -> None:
+    """
+    Создает zip архив каталога через zipfile с уровнем сжатия level (0 - без сжатия).
+    zipfile сжимает файлы потоково, в памяти - только текущий блок. При ошибке недописанный архив удаляется.
+    """
+    method = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+    try:
+        with zipfile.ZipFile(archive_path, 'w', method, compresslevel=level if level != 0 else None) as zipf:
+            for member in collect_zip_members(source_dir, skip=archive_path):
+                check_cancelled()
+                zipf.write(member["path"], member["arcname"])
+    except Exception as e:
+        archive_path.unlink(missing_ok=True)
+        raise e
+
+
+def gzip_block(data: bytes, level: int) -> bytes:
+    """Сжимает блок в отдельный gzip-член (zlib отпускает GIL, поэтому блоки сжимаются параллельно)"""
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class ParallelGzipWriter:
+    """
+    Файлоподобный объект для tarfile: делит поток на блоки по block_size и сжимает их в jobs потоков,
+    как pigz. Результат - последовательность gzip-членов, ее читают gzip, tar и untar.
+    Объект только для записи: tarfile в потоковом режиме (w|) не вызывает read и seek.
+    """
+
+    def __init__(self, out: BinaryIO, jobs: int, level: int = DEFAULT_LEVEL, block_size: int = GZIP_BLOCK_SIZE):
+        self.out = out
+        self.jobs = jobs
+        self.level = level
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.pending: deque = deque()
+        self.blocks = 0
+        # Смещение каждого блока в сжатом файле - по ним индекс находит блок с нужным файлом
+        self.block_offsets: list[int] = []
+        self.written = 0
+        # Позиция в несжатом потоке
+        self.position = 0
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        raise io.UnsupportedOperation("ParallelGzipWriter только для записи")
+
+    def seek(self, pos: int) -> int:
+        raise io.UnsupportedOperation("ParallelGzipWriter не поддерживает seek")
+
+    def _submit(self, block: bytes) -> None:
+        """Отдает блок на сжатие и дописывает готовые блоки по порядку (в работе не больше 2*jobs блоков)"""
+        self.pending.append(self.executor.submit(gzip_block, block, self.level))
+        self.blocks += 1
+        while len(self.pending) > 2 * self.jobs:
+            self._write_block(self.pending.popleft().result())
+
+    def _write_block(self, data: bytes) -> None:
+        self.block_offsets.append(self.written)
+        self.out.write(data)
+        self.written += len(data)
+
+    def close(self) -> None:
+        try:
+            if self.buffer or self.blocks == 0:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self._write_block(self.pending.popleft().result())
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def _skip_archive_filter(source_dir: Path, archive_path: Path):
+    """Фильтр tarfile: архив, создаваемый внутри каталога, в сам себя не добавляется"""
+    skip_path = os.path.abspath(archive_path)
+
+    def skip_archive(tarinfo: tarfile.TarInfo) -> tarfile.TarInfo | None:
+        # Фильтр вызывается перед каждым файлом - здесь же точка прерывания фоновой задачи (kill)
+        check_cancelled()
+        return None if os.path.abspath(os.path.join(source_dir, tarinfo.name)) == skip_path else tarinfo
+
+    return skip_archive
+
+
+def _add_tree(tar: tarfile.TarFile, source_dir: Path, archive_path: Path, members: list[str] | None,
+              metadata: tuple[str, bytes] | None, offsets: dict[str, int | None] | None = None) -> None:
+    """
+    Добавляет в tar каталог целиком (members=None) или только перечисленные относительные пути.
+    metadata - (имя, данные) служебного файла, который пишется первым членом архива.
+    offsets - сюда записывается смещение заголовка каждого файла в несжатом tar потоке.
+    """
+    if metadata is not None:
+        name, data = metadata
+        info = tarfile.TarInfo(f"{os.curdir}/{name}")
+        info.size = len(data)
+        info.mtime = int(time.time())
+        if offsets is not None:
+            offsets[info.name] = tar.offset
+        tar.addfile(info, io.BytesIO(data))
+
+    skip_archive = _skip_archive_filter(source_dir, archive_path)
+    if offsets is not None:
+        skip_only = skip_archive
+
+        def skip_archive(tarinfo: tarfile.TarInfo) -> tarfile.TarInfo | None:
+            # Фильтр вызывается прямо перед записью заголовка, tar.offset - его будущая позиция
+            # Жесткая ссылка распаковывается только вместе со своей целью - у нее смещения нет
+            tarinfo = skip_only(tarinfo)
+            if tarinfo is not None:
+                offsets[tarinfo.name] = None if tarinfo.islnk() else tar.offset
+            return tarinfo
+
+    if members is None:
+        # Те же имена, что дает shutil.make_archive: ./file
+        tar.add(source_dir, arcname=os.curdir, filter=skip_archive)
+        return
+    for rel in members:
+        tar.add(os.path.join(source_dir, rel), arcname=f"{os.curdir}/{rel}", recursive=False, filter=skip_archive)
+
+
+def create_tar(source_dir: Path, archive_path: Path, compression: str, level: int | None = None,
+               members: list[str] | None = None, metadata: tuple[str, bytes] | None = None) -> None:
+    """
+    Создает tar архив каталога со сжатием compression ("" - без сжатия, gz, bz2, xz).
+    level - уровень сжатия (None - по умолчанию для формата). При ошибке недописанный архив удаляется.
+    """
+    try:
+        with _open_tar(archive_path, compression, level) as tar:
+            _add_tree(tar, source_dir, archive_path, members, metadata)
+    except Exception as e:
+        archive_path.unlink(missing_ok=True)
+        raise e
+
+
+def _open_tar(archive_path: Path, compression: str, level: int | None) -> tarfile.TarFile:
+    """Открывает tar архив на запись (то же, что tarfile.open с режимом w:<сжатие>)"""
+    if not compression:
+        return tarfile.TarFile.taropen(archive_path, "w")
+    if compression == "xz":
+        # У xz уровень называется preset
+        return tarfile.TarFile.xzopen(archive_path, "w", preset=level)
+    # Уровень по умолчанию - как у tarfile.open
+    if compression == "bz2":
+        return tarfile.TarFile.bz2open(archive_path, "w", compresslevel=9 if level is None else level)
+    return tarfile.TarFile.gzopen(archive_path, "w", compresslevel=9 if level is None else level)
+
+
+def stream_tar(source_dir: Path, out: BinaryIO, compression: str, jobs: int = 1, level: int | None = None) -> None:
+    """
+    Пишет tar архив каталога в поток out (файл, канал, stdout) потоковым режимом tarfile (w|):
+    seek не нужен, в памяти находится только текущий блок. При jobs > 1 tar.gz сжимается блоками параллельно.
+    """
+    if jobs > 1:
+        writer = ParallelGzipWriter(out, jobs, DEFAULT_LEVEL if level is None else level)
+        try:
+            with tarfile.open(fileobj=writer, mode='w|') as tar:
+                tar.add(source_dir, arcname=os.curdir)
+        finally:
+            writer.close()
+        return
+
+    if not compression:
+        with tarfile.open(fileobj=out, mode='w|') as tar:
+            tar.add(source_dir, arcname=os.curdir)
+        return
+
+    # Сжатие - отдельным потоковым объектом (у w|xz в tarfile нет уровня сжатия), уровни по умолчанию как у tarfile
+    compressor: io.BufferedIOBase
+    if compression == "xz":
+        compressor = lzma.LZMAFile(out, 'wb', preset=level)
+    elif compression == "bz2":
+        compressor = bz2.BZ2File(out, 'wb', compresslevel=9 if level is None else level)
+    else:
+        compressor = gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9 if level is None else level)
+    with compressor, tarfile.open(fileobj=compressor, mode='w|') as tar:
+        tar.add(source_dir, arcname=os.curdir)
+
+
+def create_tar_gz_parallel(source_dir: Path, archive_path: Path, jobs: int, level: int | None = None,
+                           members: list[str] | None = None, metadata: tuple[str, bytes] | None = None,
+                           index: bool = False) -> None:
+    """
+    Создает tar.gz архив каталога со сжатием блоков в jobs потоков. При ошибке недописанный архив удаляется.
+    index - записать рядом индекс <архив>.index.json: блоки сжимаются независимо, поэтому по индексу
+    untar может начать распаковку файла с нужного блока, не распаковывая архив с начала.
+    """
+    offsets: dict[str, int | None] | None = {} if index else None
+    try:
+        with open(archive_path, 'wb') as out:
+            writer = ParallelGzipWriter(out, jobs, DEFAULT_LEVEL if level is None else level)
+            try:
+                with tarfile.open(fileobj=writer, mode='w|') as tar:
+                    _add_tree(tar, source_dir, archive_path, members, metadata, offsets)
+            finally:
+                writer.close()
+    except Exception as e:
+        archive_path.unlink(missing_ok=True)
+        raise e
+
+    if offsets is not None:
+        save_index(archive_path, {"block_size": writer.block_size, "blocks": writer.block_offsets,
+                                  "archive_size": writer.written, "members": offsets})
+
+
+def index_path_for(archive_path: Path) -> Path:
+    """Путь индекса для архива"""
+    return archive_path.with_name(archive_path.name + INDEX_SUFFIX)
+
+
+def save_index(archive_path: Path, index: dict) -> None:
+    """Сохраняет индекс рядом с архивом"""
+    with open(index_path_for(archive_path), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+
+
+def load_index(archive_path: Path) -> dict | None:
+    """Читает индекс архива. None - индекса нет или он от другой версии архива (размер не совпадает)"""
+    index_path = index_path_for(archive_path)
+    if not index_path.is_file():
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get("archive_size") != archive_path.stat().st_size:
+        return None
+    return index
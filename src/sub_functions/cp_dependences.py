@@ -1,11 +1,13 @@
 import argparse
+from functools import cache
 
 
 # Здесь собраны функции, необходимые основной функции - cp, чтобы не загрязнять и так грязный main
 
 
-def cp_args_parse(args: list[str]) -> list[str]:
-    """Парсит аргументы команды cp"""
+@cache
+def _cp_parser() -> argparse.ArgumentParser:
+    """Парсер команды cp (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(
         prog="cp",
         description="Копирует файл из path_from в path_to",
@@ -13,9 +15,13 @@ def cp_args_parse(args: list[str]) -> list[str]:
     )
     parser.add_argument("path_from", help="Путь откуда копировать")
     parser.add_argument("path_to", help="Путь куда копировать")
+    return parser
+
 
+def cp_args_parse(args: list[str]) -> list[str]:
+    """Парсит аргументы команды cp"""
     try:
-        parsed_args = parser.parse_args(args)
+        parsed_args = _cp_parser().parse_args(args)
         return [parsed_args.path_from, parsed_args.path_to]
     except SystemExit:
         raise Exception("Ошибка парсинга команды cp: требуется 2 аргумента - путь_откуда и путь_куда")
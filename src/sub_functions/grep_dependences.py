@@ -1,23 +1,32 @@
 import argparse
 import re
 from pathlib import Path
+from functools import cache
+from typing import Iterable, Iterator
 
 
 # Здесь собраны функции, необходимые основной функции - grep, чтобы не загрязнять и так грязный main
 
 
-def grep_args_parse(args: list[str]):
+@cache
+def _grep_parser() -> argparse.ArgumentParser:
+    """Парсер команды grep (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(prog="grep", description="Поиск текста в файлах", exit_on_error=False)
     parser.add_argument("-r", "--recursive", action="store_true", help="Рекурсивный поиск в директории")
     parser.add_argument("-i", "--ignore-case", action="store_true", help="Игнорировать регистр")
     parser.add_argument("pattern", help="Шаблон для поиска")
     parser.add_argument("path", help="Файл или директория для поиска")
+    return parser
+
+
+def grep_args_parse(args: list[str]):
     try:
+        parsed_args = _grep_parser().parse_args(args)
         return {
-            "path": parser.parse_args(args).path,
-            "recursive": parser.parse_args(args).recursive,
-            "ignore_case": parser.parse_args(args).ignore_case,
-            "pattern": parser.parse_args(args).pattern,
+            "path": parsed_args.path,
+            "recursive": parsed_args.recursive,
+            "ignore_case": parsed_args.ignore_case,
+            "pattern": parsed_args.pattern,
         }
     except argparse.ArgumentError as e:
         raise Exception(f"Ошибка парсинга команды grep: {e}")
@@ -25,56 +34,82 @@ def grep_args_parse(args: list[str]):
 
 
 
-def grep_realisation(args: dict[str, str]) -> None:
-    pattern = str(args["pattern"])
-    path = str(args["path"])
-    recursive = args.get("recursive", False)
-    ignore_case = args.get("ignore_case", False)
-    flags = re.IGNORECASE if ignore_case else 0
+@cache
+def _grep_filter_parser() -> argparse.ArgumentParser:
+    """Парсер grep в конвейере: строки приходят из канала, путь не указывается"""
+    parser = argparse.ArgumentParser(prog="grep", description="Поиск текста во вводе из канала", exit_on_error=False)
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="Игнорировать регистр")
+    parser.add_argument("pattern", help="Шаблон для поиска")
+    return parser
+
 
+def grep_filter_args_parse(args: list[str]):
     try:
-        regex = re.compile(pattern, flags)
+        parsed_args = _grep_filter_parser().parse_args(args)
+        return {
+            "ignore_case": parsed_args.ignore_case,
+            "pattern": parsed_args.pattern,
+        }
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды grep: {e}")
+
+
+def _compile(args: dict[str, str]) -> re.Pattern:
+    flags = re.IGNORECASE if args.get("ignore_case", False) else 0
+    try:
+        return re.compile(str(args["pattern"]), flags)
     except re.error as e:
         raise ValueError(f"Ошибка в шаблоне: {e}")
 
-    def search_in_file(file_to_search: Path) -> list[tuple]:
-        result_of_search = []
+
+def grep_search(args: dict[str, str]) -> Iterator[str]:
+    """Лениво отдает найденные строки в виде файл:номер:строка (файлы читаются построчно)"""
+    regex = _compile(args)
+    path = str(args["path"])
+    recursive = args.get("recursive", False)
+
+    def search_in_file(file_to_search: Path) -> Iterator[str]:
         try:
             with open(file_to_search, 'r', encoding='utf-8', errors='ignore') as f:
                 for line_number, line in enumerate(f, 1):
                     if regex.search(line):
-                        cleaned_line = line.strip()
-                        result_of_search.append((str(file_to_search), line_number, cleaned_line))
+                        yield f"{file_to_search}:{line_number}:{line.strip()}"
         except (IOError, PermissionError) as err:
             print(f"Ошибка чтения файла {file_to_search}: {err}")
-        return result_of_search
 
-    def search_in_directory(dir_path: Path) -> list[tuple]:
-        results_of_search = []
+    def search_in_directory(dir_path: Path) -> Iterator[str]:
         try:
             for file in dir_path.iterdir():
                 if file.is_file():
-                    results_of_search.extend(search_in_file(file))
+                    yield from search_in_file(file)
                 elif file.is_dir() and recursive:
-                    results_of_search.extend(search_in_directory(file))
+                    yield from search_in_directory(file)
         except (IOError, PermissionError) as err:
             print(f"Ошибка доступа к директории {dir_path}: {err}")
-        return results_of_search
 
     path_obj = Path(path)
-    results = []
 
     if path_obj.is_file():
-        results = search_in_file(path_obj)
+        yield from search_in_file(path_obj)
     elif path_obj.is_dir():
         if recursive:
-            results = search_in_directory(path_obj)
+            yield from search_in_directory(path_obj)
         else:
             for item in path_obj.iterdir():
                 if item.is_file():
-                    results.extend(search_in_file(item))
+                    yield from search_in_file(item)
     else:
         raise FileNotFoundError(f"Путь '{path}' не существует")
 
-    for file_path, line_num, line_content in results:
-        print(f"{file_path}:{line_num}:{line_content}")
+
+def grep_filter(args: dict[str, str], lines: Iterable[str]) -> Iterator[str]:
+    """Лениво отдает строки ввода (из канала), подходящие под шаблон"""
+    regex = _compile(args)
+    for line in lines:
+        if regex.search(line):
+            yield line
+
+
+def grep_realisation(args: dict[str, str]) -> None:
+    for result in grep_search(args):
+        print(result)
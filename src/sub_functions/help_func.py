@@ -10,15 +10,37 @@ cat FILE                  - вывод содержимого файла
 cp SOURCE DEST            - копирование файлов/директорий
 mv SOURCE DEST            - перемещение/переименование файлов/директорий
 rm PATH                   - удаление файлов/директорий
-zip FOLDER ARCHIVE.zip    - создание ZIP архива
-tar FOLDER ARCHIVE.tar.gz - создание TAR.GZ архива
-unzip ARCHIVE.zip         - распаковка ZIP архива
-untar ARCHIVE.tar.gz      - распаковка TAR.GZ архива
+zip FOLDER ARCHIVE.zip    - создание ZIP архива (-j N - сжатие в N процессов)
+tar FOLDER ARCHIVE.tar.gz - создание TAR архива (-j N - сжатие в N потоков)
+zip/tar --level N/--store - уровень сжатия / без сжатия
+tar --manifest/--since A  - базовый архив с манифестом / инкремент от архива A
+tar --index DIR A.tar.gz  - tar.gz с индексом для быстрой распаковки отдельных файлов (untar -m)
+zip/tar DIR -             - архив в stdout (для tar --format tar|gz|bz2|xz)
+zip/tar --repo R DIR NAME - снимок в хранилище фрагментов R (без повторного хранения данных)
+unzip/untar --repo R NAME - восстановление снимка из хранилища R
+untar BASE INC1 INC2 ...  - распаковка цепочки инкрементов
+unzip/untar -l ARCHIVE    - содержимое архива без распаковки
+unzip/untar -m GLOB ARCH  - распаковка только выбранных файлов
+unzip ARCHIVE.zip         - распаковка ZIP архива (-j N - в N потоков)
+untar ARCHIVE.tar.gz      - распаковка TAR архива (.tar, .tar.gz, .tar.bz2, .tar.xz)
 grep PATTERN PATH         - поиск текста в файлах
 grep -r PATTERN PATH      - рекурсивный поиск
 grep -i PATTERN PATH      - поиск без учета регистра
+CMD | grep [-i] PATTERN   - конвейер: фильтр вывода команды (cat FILE | grep ... - построчно)
+CMD > FILE / CMD >> FILE  - вывод команды в файл (перезапись / дописывание)
+CMD &                     - выполнение команды в фоне
+jobs                      - фоновые задачи и результаты завершенных
+wait [N ...]              - ожидание фоновых задач (по умолчанию всех)
+kill N ...                - прерывание фоновых задач
 history                   - история команд
+stats [CMD] [--json]      - время и ресурсы команд (p50/p95/p99), --json - записи для выгрузки
+trash list|stats          - содержимое и статистика корзины
+trash purge [--all]       - очистка корзины (--max-bytes SIZE, --max-age AGE)
+trash policy              - политика фоновой очистки (--max-bytes SIZE, --max-age AGE, --off)
+trash backend [move|cas]  - способ хранения удаленных файлов (cas - без дубликатов)
 undo [N]                  - отмена последних N команд
+redo [N]                  - повтор последних N отмененных команд
+profile [-o F.pstats] CMD - профилирование команды (cProfile): самые дорогие функции
 help                      - эта справка
 
 Для получения подробной информации о команде используйте: help <command>
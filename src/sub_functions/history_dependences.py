@@ -1,19 +1,78 @@
-import argparse
 import logging
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
-from datetime import datetime
+from functools import cache
+from typing import TYPE_CHECKING
+
+# argparse, json и datetime импортируются в функциях, которым они нужны: запуск оболочки их не загружает
+if TYPE_CHECKING:
+    import argparse
+
+try:
+    import fcntl
+except ImportError:  # Windows - межпроцессная блокировка недоступна
+    fcntl = None  # type: ignore[assignment]
 
 # Здесь собраны функции, необходимые основной функции - history, чтобы не загрязнять и так грязный main
 
 
 # Константы
 HISTORY_FILE = ".history"
+HISTORY_LOCK_FILE = ".history.lock"
+UNDO_STACK_FILE = ".undo_stack"
+REDO_STACK_FILE = ".redo_stack"
 MAX_HISTORY_SIZE = 100
+UNDOABLE_COMMANDS = ("cp", "mv", "rm")
+# Идентификатор текущего экземпляра shell: undo отменяет только команды своей сессии
+SESSION_ID = os.urandom(6).hex()
+
+# Стек undo - индекс смещений отменяемых записей в .history. Запись фиксированной длины:
+# "<смещение, 12 цифр> <сессия, 12 символов>\n"; отмененная запись помечается сессией из дефисов
+UNDO_ENTRY_SIZE = 26
+DEAD_SESSION = "-" * 12
+# Отменяемая запись истории заканчивается флагом, который undo переписывает на месте
+UNDONE_FLAG = b"|undone=0"
+# Флаг записи rm, чей файл уже удален из корзины сборщиком мусора - отменить ее нельзя
+PURGED_FLAG = b"|undone=x"
+
+_thread_lock = threading.RLock()
+_lock_depth = 0
+
+
+@contextmanager
+def history_lock() -> Iterator[None]:
+    """
+    Эксклюзивная блокировка истории (и связанной с ней корзины) между процессами через fcntl.flock.
+    Повторный вход из того же потока не блокируется, поэтому функции истории можно вкладывать друг в друга.
+    """
+    global _lock_depth
+    with _thread_lock:
+        lock_fd = None
+        _lock_depth += 1
+        try:
+            if _lock_depth == 1 and fcntl is not None:
+                lock_fd = os.open(HISTORY_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            if lock_fd is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+            _lock_depth -= 1
 
 
 def history_mkdir() -> None:
     """Инициализирует файл истории"""
+    global HISTORY_FILE, HISTORY_LOCK_FILE, UNDO_STACK_FILE, REDO_STACK_FILE
     try:
+        # Закрепляем файлы истории за каталогом запуска: после cd и в фоновых потоках пути не меняются
+        HISTORY_FILE = os.path.abspath(HISTORY_FILE)
+        HISTORY_LOCK_FILE = os.path.abspath(HISTORY_LOCK_FILE)
+        UNDO_STACK_FILE = os.path.abspath(UNDO_STACK_FILE)
+        REDO_STACK_FILE = os.path.abspath(REDO_STACK_FILE)
         history_file = Path(HISTORY_FILE)
         if not history_file.exists():
             with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
@@ -23,31 +82,44 @@ def history_mkdir() -> None:
         raise e
 
 
+def format_record(timestamp: str, command: str, args: list, undo_data: dict | None = None) -> str:
+    """Собирает строку записи истории: timestamp|command|args|key1=value1|key2=value2"""
+    args_str = " ".join(args)
+    if undo_data:
+        undo_parts = []
+        for key, value in undo_data.items():
+            # Заменяем разделители в значениях, чтобы не ломать парсинг
+            safe_value = str(value).replace('|', '%%PIPE%%').replace('=', '%%EQUALS%%')
+            undo_parts.append(f"{key}={safe_value}")
+        undo_str = "|".join(undo_parts)
+        return f"{timestamp}|{command}|{args_str}|{undo_str}\n"
+    return f"{timestamp}|{command}|{args_str}|\n"
+
+
 def add_to_history(command: str, args: list, undo_data=None) -> None:
     """Добавляет команду в историю"""
+    from datetime import datetime
     try:
-        # Форматируем запись
         timestamp = datetime.now().isoformat()
-        args_str = " ".join(args)
-
         if undo_data:
-            # Собираем undo_data в формат: key1=value1|key2=value2
-            undo_parts = []
-            for key, value in undo_data.items():
-                # Заменяем разделители в значениях, чтобы не ломать парсинг
-                safe_value = str(value).replace('|', '%%PIPE%%').replace('=', '%%EQUALS%%')
-                undo_parts.append(f"{key}={safe_value}")
-            undo_str = "|".join(undo_parts)
-            record = f"{timestamp}|{command}|{args_str}|{undo_str}\n"
-        else:
-            record = f"{timestamp}|{command}|{args_str}|\n"
-
-        # Добавляем в конец файла
-        with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
-            f.write(record)
-
-        # Периодически чистим историю
-        clean_history_if_needed()
+            # Помечаем отменяемые команды сессией, чтобы undo не трогал чужие операции.
+            # Флаг undone должен быть последним - его позиция вычисляется от конца строки
+            undo_data = {**undo_data, "session": SESSION_ID, "undone": "0"}
+        record = format_record(timestamp, command, args, undo_data)
+
+        with history_lock():
+            # Добавляем в конец файла и запоминаем смещение записи для стека undo
+            with open(HISTORY_FILE, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(record.encode('utf-8'))
+
+            if undo_data:
+                push_undo_entry(offset)
+                # Новая отменяемая команда делает повтор отмененных команд бессмысленным
+                clear_redo_stack()
+
+            # Периодически чистим историю
+            clean_history_if_needed()
 
     except Exception as e:
         logging.error(f"Ошибка при добавлении в историю: {e}")
@@ -57,61 +129,73 @@ def add_to_history(command: str, args: list, undo_data=None) -> None:
 def clean_history_if_needed() -> None:
     """Очищает историю если она превысила максимальный размер"""
     try:
-        if not Path(HISTORY_FILE).exists():
-            return
+        with history_lock():
+            if not Path(HISTORY_FILE).exists():
+                return
 
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
 
-        if len(lines) > MAX_HISTORY_SIZE:
-            lines_to_keep = lines[-MAX_HISTORY_SIZE:]
+            if len(lines) > MAX_HISTORY_SIZE:
+                lines_to_keep = lines[-MAX_HISTORY_SIZE:]
 
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-                f.writelines(lines_to_keep)
+                with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
+                    f.writelines(lines_to_keep)
+
+                # Смещения записей сдвинулись - перестраиваем стек undo
+                rebuild_undo_stack()
 
     except Exception as e:
         logging.error(f"Ошибка при очистке истории: {e}")
         raise e
 
 
+def parse_record(line: str, record_id: int) -> dict | None:
+    """Разбирает строку истории в словарь записи. Возвращает None для пустых и битых строк"""
+    line = line.strip()
+    if not line:
+        return None
+
+    parts = line.split('|')
+    if len(parts) < 3:
+        return None
+
+    undo_data: dict[str, str] = {}
+    record = {
+        "id": record_id,
+        "timestamp": parts[0],
+        "command": parts[1],
+        "args": parts[2].split() if parts[2] else [],
+        "undo_data": undo_data
+    }
+
+    # Парсим undo_data если она есть
+    for item in parts[3:]:
+        if '=' in item:
+            key, value = item.split('=', 1)
+            # Восстанавливаем специальные символы в значениях
+            undo_data[key] = value.replace('%%PIPE%%', '|').replace('%%EQUALS%%', '=')
+
+    undone = undo_data.pop("undone", "0")
+    record["undone"] = undone == "1"
+    record["purged"] = undone == "x"
+    return record
+
+
 def read_history() -> list[dict]:
     """Читает историю команд"""
     history: list[dict] = []
     try:
-        if not Path(HISTORY_FILE).exists():
-            return history
-
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
+        with history_lock():
+            if not Path(HISTORY_FILE).exists():
+                return history
+            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
 
-                parts = line.split('|')
-                if len(parts) >= 3:
-                    record = {
-                        "id": line_num,
-                        "timestamp": parts[0],
-                        "command": parts[1],
-                        "args": parts[2].split() if parts[2] else [],
-                        "undo_data": {}
-                    }
-
-                    # Парсим undo_data если она есть
-                    if len(parts) > 3:
-                        # Создаем временную переменную для undo_data
-                        undo_data_dict = record["undo_data"]
-                        for i in range(3, len(parts)):
-                            item = parts[i]
-                            if '=' in item:
-                                key, value = item.split('=', 1)
-                                # Восстанавливаем специальные символы в значениях
-                                value = value.replace('%%PIPE%%', '|').replace('%%EQUALS%%', '=')
-                                # Явно приводим к dict и присваиваем
-                                if isinstance(undo_data_dict, dict):
-                                    undo_data_dict[key] = value
-
-                    history.append(record)
+        for line_num, line in enumerate(lines, 1):
+            record = parse_record(line, line_num)
+            if record is not None:
+                history.append(record)
 
     except Exception as e:
         logging.error(f"Ошибка при чтении истории: {e}")
@@ -120,48 +204,276 @@ def read_history() -> list[dict]:
     return history
 
 
+def history_is_empty() -> bool:
+    """Проверяет, есть ли в истории хоть одна запись (без чтения файла)"""
+    history_file = Path(HISTORY_FILE)
+    return not history_file.exists() or history_file.stat().st_size == 0
+
+
+def push_undo_entry(offset: int, session: str = SESSION_ID) -> None:
+    """Кладет в стек undo смещение отменяемой записи истории"""
+    with history_lock():
+        with open(UNDO_STACK_FILE, 'ab') as f:
+            f.write(f"{offset:012d} {session}\n".encode('ascii'))
+
+
+def rebuild_undo_stack() -> None:
+    """Перестраивает стек undo полным проходом по истории (после перезаписи файла истории)"""
+    entries = []
+    with history_lock():
+        if Path(HISTORY_FILE).exists():
+            offset = 0
+            with open(HISTORY_FILE, 'rb') as f:
+                for raw in f:
+                    if raw.rstrip(b"\r\n").endswith(UNDONE_FLAG):
+                        record = parse_record(raw.decode('utf-8', errors='replace'), offset)
+                        session = record["undo_data"].get("session", "") if record else ""
+                        if record and record["command"] in UNDOABLE_COMMANDS and len(session) == len(DEAD_SESSION):
+                            entries.append(f"{offset:012d} {session}\n")
+                    offset += len(raw)
+
+        with open(UNDO_STACK_FILE, 'w', encoding='ascii') as f:
+            f.writelines(entries)
+
+
+def _scan_undo_stack(steps: int, session: str) -> list[dict]:
+    """Идет по стеку undo с конца и читает по смещениям не более steps записей сессии"""
+    records: list[dict] = []
+    if not Path(UNDO_STACK_FILE).exists():
+        return records
+
+    with open(UNDO_STACK_FILE, 'rb') as stack, open(HISTORY_FILE, 'rb') as history:
+        position = stack.seek(0, os.SEEK_END) - UNDO_ENTRY_SIZE
+        while position >= 0 and len(records) < steps:
+            stack.seek(position)
+            offset_str, entry_session = stack.read(UNDO_ENTRY_SIZE).decode('ascii').split()
+            if entry_session == session:
+                offset = int(offset_str)
+                # Смещение должно указывать на начало строки
+                history.seek(max(offset - 1, 0))
+                line_start = offset == 0 or history.read(1) == b"\n"
+                history.seek(offset)
+                raw = history.readline().rstrip(b"\r\n")
+                record = parse_record(raw.decode('utf-8', errors='replace'), offset)
+                if not line_start or record is None or not raw.endswith((UNDONE_FLAG, PURGED_FLAG)):
+                    raise ValueError(f"Стек undo не соответствует истории (смещение {offset})")
+                record["offset"] = offset
+                record["length"] = len(raw)
+                record["stack_position"] = position
+                records.append(record)
+            position -= UNDO_ENTRY_SIZE
+
+    return records
+
+
+def read_undo_stack(steps: int, session: str = SESSION_ID) -> list[dict]:
+    """
+    Возвращает до steps последних неотмененных команд сессии (от новых к старым).
+    Читаются только нужные записи стека и истории, а не весь файл.
+    """
+    with history_lock():
+        try:
+            return _scan_undo_stack(steps, session)
+        except (ValueError, UnicodeDecodeError) as e:
+            # Историю изменили в обход стека (например, вручную) - индекс нужно построить заново
+            logging.warning(f"Перестраиваем стек undo: {e}")
+            rebuild_undo_stack()
+            return _scan_undo_stack(steps, session)
+
+
+def _write_flags(records: list[dict], flag: bytes) -> None:
+    """Переписывает на месте последний байт записей истории - значение флага undone"""
+    with open(HISTORY_FILE, 'r+b') as history:
+        for record in records:
+            history.seek(record["offset"] + record["length"] - 1)
+            history.write(flag)
+
+
+def drop_undo_entries(records: list[dict]) -> None:
+    """Снимает записи, полученные из read_undo_stack, со стека undo"""
+    with history_lock():
+        with open(UNDO_STACK_FILE, 'r+b') as stack:
+            for record in records:
+                stack.seek(record["stack_position"] + 13)
+                stack.write(DEAD_SESSION.encode('ascii'))
+
+            # Отрезаем хвост из отмененных записей, чтобы стек не рос
+            size = stack.seek(0, os.SEEK_END)
+            while size >= UNDO_ENTRY_SIZE:
+                stack.seek(size - UNDO_ENTRY_SIZE)
+                if not stack.read(UNDO_ENTRY_SIZE).endswith(f" {DEAD_SESSION}\n".encode('ascii')):
+                    break
+                size -= UNDO_ENTRY_SIZE
+            stack.truncate(size)
+
+
+def mark_undone(records: list[dict]) -> None:
+    """Помечает записи отмененными на месте (без перезаписи истории) и снимает их со стека undo"""
+    with history_lock():
+        _write_flags(records, b"1")
+        drop_undo_entries(records)
+
+
+def invalidate_trash_records(trash_paths: set[str]) -> int:
+    """
+    Помечает записи rm всех сессий, чьи файлы удалены из корзины, чтобы undo сразу сообщал об этом.
+    Проходит только по стеку undo, а не по всей истории. Возвращает число помеченных записей.
+    """
+    purged: list[dict] = []
+    with history_lock():
+        if not trash_paths or not Path(UNDO_STACK_FILE).exists():
+            return 0
+
+        with open(UNDO_STACK_FILE, 'rb') as stack, open(HISTORY_FILE, 'rb') as history:
+            for entry in iter(lambda: stack.read(UNDO_ENTRY_SIZE), b""):
+                offset_str, entry_session = entry.decode('ascii').split()
+                if entry_session == DEAD_SESSION:
+                    continue
+                history.seek(int(offset_str))
+                raw = history.readline().rstrip(b"\r\n")
+                record = parse_record(raw.decode('utf-8', errors='replace'), int(offset_str))
+                if (record and record["command"] == "rm" and raw.endswith(UNDONE_FLAG)
+                        and record["undo_data"].get("trash_path") in trash_paths):
+                    record["offset"] = int(offset_str)
+                    record["length"] = len(raw)
+                    purged.append(record)
+
+        _write_flags(purged, b"x")
+    return len(purged)
+
+
+def restore_undo_entry(offset: int, length: int, timestamp: str) -> bool:
+    """
+    Снимает пометку undone с записи и возвращает ее на стек undo (для redo).
+    Если история была обрезана и смещение устарело, запись ищется по времени. Возвращает False, если записи больше нет.
+    """
+    with history_lock():
+        with open(HISTORY_FILE, 'r+b') as history:
+            history.seek(offset)
+            raw = history.readline().rstrip(b"\r\n")
+            if not (raw.startswith(timestamp.encode('utf-8')) and raw.endswith(b"|undone=1")):
+                # Смещение устарело - ищем запись полным проходом
+                history.seek(0)
+                offset = 0
+                for line in history:
+                    if line.startswith(f"{timestamp}|".encode('utf-8')) and line.rstrip(b"\r\n").endswith(b"|undone=1"):
+                        raw = line.rstrip(b"\r\n")
+                        break
+                    offset += len(line)
+                else:
+                    return False
+            length = len(raw)
+
+            history.seek(offset + length - 1)
+            history.write(b"0")
+
+        push_undo_entry(offset)
+        return True
+
+
+def _read_redo_lines() -> list[str]:
+    """Читает строки файла стека redo"""
+    if not Path(REDO_STACK_FILE).exists():
+        return []
+    with open(REDO_STACK_FILE, 'r', encoding='utf-8') as f:
+        return f.readlines()
+
+
+def push_redo_entries(entries: list[dict]) -> None:
+    """Кладет на стек redo отмененные команды сессии (последняя в списке окажется на вершине)"""
+    import json
+    with history_lock():
+        with open(REDO_STACK_FILE, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps({**entry, "session": SESSION_ID}, ensure_ascii=False) + "\n")
+
+
+def read_redo_stack(steps: int, session: str = SESSION_ID) -> list[dict]:
+    """Возвращает до steps записей стека redo сессии, начиная с вершины"""
+    import json
+    entries: list[dict] = []
+    with history_lock():
+        lines = _read_redo_lines()
+        for line_num in range(len(lines) - 1, -1, -1):
+            if len(entries) >= steps:
+                break
+            entry = json.loads(lines[line_num])
+            if entry.get("session") == session:
+                entry["line"] = line_num
+                entries.append(entry)
+    return entries
+
+
+def drop_redo_entries(entries: list[dict]) -> None:
+    """Удаляет со стека redo записи, полученные из read_redo_stack"""
+    drop_lines = {entry["line"] for entry in entries}
+    with history_lock():
+        lines = _read_redo_lines()
+        with open(REDO_STACK_FILE, 'w', encoding='utf-8') as f:
+            f.writelines(line for line_num, line in enumerate(lines) if line_num not in drop_lines)
+
+
+def clear_redo_stack(session: str = SESSION_ID) -> None:
+    """Очищает стек redo сессии"""
+    import json
+    with history_lock():
+        lines = _read_redo_lines()
+        if not lines:
+            return
+        kept = [line for line in lines if json.loads(line).get("session") != session]
+        if len(kept) != len(lines):
+            with open(REDO_STACK_FILE, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+
+
 def save_history(history: list) -> None:
     """Сохраняет историю команд"""
     try:
         lines = []
         for record in history:
-            timestamp = record["timestamp"]
-            command = record["command"]
-            args_str = " ".join(record["args"])
+            undo_data = record.get("undo_data")
+            if undo_data and "undone" in record:
+                undo_data = {**undo_data, "undone": "1" if record["undone"] else "0"}
+            lines.append(format_record(record["timestamp"], record["command"], record["args"], undo_data))
 
-            undo_data = record.get("undo_data", {})
-            if undo_data:
-                undo_str = "|".join(f"{k}={v}" for k, v in undo_data.items())
-                line = f"{timestamp}|{command}|{args_str}|{undo_str}\n"
-            else:
-                line = f"{timestamp}|{command}|{args_str}|\n"
-
-            lines.append(line)
-
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
+        with history_lock():
+            with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            rebuild_undo_stack()
 
     except Exception as e:
         raise e
 
 
-def history_args_parse(args: list[str]) -> dict[str, int]:
+@cache
+def _history_parser() -> "argparse.ArgumentParser":
+    """Парсер команды history (строится один раз, при первом вызове)"""
+    import argparse
     parser = argparse.ArgumentParser(prog="history", description="Показывает count последних команд и очищает историю если нужно.", exit_on_error=False)
     parser.add_argument("count", nargs="?", default=10, help="Количество последних команд для вывода.")
     parser.add_argument("clear", nargs="?", default=0, help="Определяет очищать ли историю(0/1).")
-    return {"count": int(parser.parse_args(args).count), "clear": int(parser.parse_args(args).clear)}
+    return parser
+
+
+def history_args_parse(args: list[str]) -> dict[str, int]:
+    parsed_args = _history_parser().parse_args(args)
+    return {"count": int(parsed_args.count), "clear": int(parsed_args.clear)}
 
 
 def history_realisation(args: dict[str, int]) -> None:
     """Основная реализация функции history"""
+    from datetime import datetime
     try:
         count = args["count"]
         clear = bool(args["clear"])
 
         if clear:
-            Path(HISTORY_FILE).write_text("", encoding='utf-8')
+            with history_lock():
+                Path(HISTORY_FILE).write_text("", encoding='utf-8')
+                rebuild_undo_stack()
 
-        history = read_history()
+        # Отмененные через undo команды в истории не показываем
+        history = [record for record in read_history() if not record["undone"]]
 
         recent_commands = history[-count:] if count < len(history) else history
         for record in recent_commands:
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import uuid
+from pathlib import Path
+
+from src.sub_functions.compression_dependences import INDEX_SUFFIX, index_path_for
+
+# Здесь собраны функции инкрементальных архивов tar, чтобы не загрязнять и так грязный main
+#
+# Рядом с архивом пишется манифест <архив>.manifest.json - полное состояние каталога на момент архивации:
+#   {"id": ..., "entries": {"dir/file.txt": {"type": "file", "size": ..., "mtime_ns": ..., "hash": ...}}}
+# Первым членом архива пишется .incremental.json: {"id": ..., "base": id предыдущего архива, "deleted": [...]}
+
+
+# Константы
+MANIFEST_SUFFIX = ".manifest.json"
+INCREMENTAL_MEMBER = ".incremental.json"
+# Служебные файлы архива: архив цепочки узнается по лежащему рядом манифесту или индексу
+ARTIFACT_SUFFIXES = (MANIFEST_SUFFIX, INDEX_SUFFIX)
+
+
+def manifest_path_for(archive_path: Path) -> Path:
+    """Путь манифеста для архива"""
+    return archive_path.with_name(archive_path.name + MANIFEST_SUFFIX)
+
+
+def load_manifest(path: Path) -> dict:
+    """Читает манифест. path - сам манифест или архив, рядом с которым он лежит"""
+    manifest_path = path if path.name.endswith(MANIFEST_SUFFIX) else manifest_path_for(path)
+    if not manifest_path.is_file():
+        raise FileNotFoundError(f"Манифест {manifest_path} не найден")
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(archive_path: Path, manifest: dict) -> None:
+    """Сохраняет манифест рядом с архивом"""
+    with open(manifest_path_for(archive_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def _file_hash(path: str) -> str:
+    """sha256 содержимого файла"""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def chain_artifacts(filenames: list[str]) -> set[str]:
+    """
+    Файлы каталога, которые относятся к цепочке архивов: архивы, рядом с которыми лежит манифест или индекс,
+    и сами эти манифесты и индексы. Такие файлы не архивируются - иначе каждый инкремент, который по умолчанию
+    создается в самом каталоге, включал бы все предыдущие архивы цепочки. Остальные файлы (и *.tar) - данные.
+    """
+    names = set(filenames)
+    artifacts: set[str] = set()
+    for name in filenames:
+        for suffix in ARTIFACT_SUFFIXES:
+            if name.endswith(suffix) and name[:-len(suffix)] in names:
+                artifacts.update((name, name[:-len(suffix)]))
+    return artifacts
+
+
+def scan_tree(source_dir: Path, previous: dict | None = None, skip: set[str] | None = None) -> dict:
+    """
+    Строит записи манифеста для каталога. Хеш пересчитывается только для файлов,
+    у которых размер или время изменения отличаются от предыдущего манифеста.
+    skip - абсолютные пути, которые не попадают в манифест; архивы цепочки с их манифестами и индексами
+    не попадают всегда.
+    """
+    previous_entries = previous["entries"] if previous else {}
+    skip = skip or set()
+    entries: dict[str, dict] = {}
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        artifacts = chain_artifacts(filenames)
+        for name in dirnames + sorted(name for name in filenames if name not in artifacts):
+            path = os.path.join(dirpath, name)
+            if os.path.abspath(path) in skip:
+                continue
+            rel = os.path.relpath(path, source_dir).replace(os.sep, "/")
+            path_stat = os.lstat(path)
+
+            if stat.S_ISDIR(path_stat.st_mode):
+                entries[rel] = {"type": "dir"}
+            elif stat.S_ISLNK(path_stat.st_mode):
+                entries[rel] = {"type": "link", "target": os.readlink(path)}
+            elif stat.S_ISREG(path_stat.st_mode):
+                entry = {"type": "file", "size": path_stat.st_size, "mtime_ns": path_stat.st_mtime_ns}
+                old = previous_entries.get(rel)
+                if old and old.get("size") == entry["size"] and old.get("mtime_ns") == entry["mtime_ns"]:
+                    entry["hash"] = old["hash"]
+                else:
+                    entry["hash"] = _file_hash(path)
+                entries[rel] = entry
+    return entries
+
+
+def diff_entries(previous: dict, current: dict) -> tuple[list[str], list[str]]:
+    """Возвращает (измененные и новые пути, удаленные пути) между двумя наборами записей"""
+    changed = [rel for rel, entry in current.items() if previous.get(rel) != entry]
+    deleted = sorted(rel for rel in previous if rel not in current)
+    return changed, deleted
+
+
+def _archive_files(archive_path: Path) -> tuple[Path, Path, Path]:
+    """Архив, его манифест и индекс"""
+    return archive_path, manifest_path_for(archive_path), index_path_for(archive_path)
+
+
+def plan_snapshot(source_dir: Path, archive_path: Path, since: Path | None) -> tuple[dict, list[str], dict]:
+    """
+    Готовит архив с манифестом: (новый манифест, пути для архива, содержимое .incremental.json).
+    since - предыдущий архив или его манифест. В архив попадают только пути манифеста.
+    """
+    previous = load_manifest(since) if since is not None else None
+    # Записываемый архив и базовый архив цепочки - вместе с их манифестами и индексами
+    skip = {os.path.abspath(path) for path in _archive_files(archive_path)}
+    if since is not None:
+        base = since.with_name(since.name[:-len(MANIFEST_SUFFIX)]) if since.name.endswith(MANIFEST_SUFFIX) else since
+        skip.update(os.path.abspath(path) for path in _archive_files(base))
+    entries = scan_tree(source_dir, previous, skip)
+    manifest = {"id": uuid.uuid4().hex, "entries": entries}
+
+    if previous is None:
+        return manifest, sorted(entries), {"id": manifest["id"], "base": None, "deleted": []}
+
+    changed, deleted = diff_entries(previous["entries"], entries)
+    # Каталоги в архив пишутся всегда (это только заголовки), чтобы сохранялись и пустые каталоги
+    members = sorted(set(changed) | {rel for rel, entry in entries.items() if entry["type"] == "dir"})
+    return manifest, members, {"id": manifest["id"], "base": previous["id"], "deleted": deleted}
+
+
+def is_incremental_member(name: str) -> bool:
+    """Является ли член архива описанием инкремента"""
+    return os.path.normpath(name) == INCREMENTAL_MEMBER
+
+
+def apply_deletions(extract_path: Path, deleted: list[str]) -> None:
+    """Удаляет из распакованного каталога файлы, удаленные к моменту инкремента"""
+    root = extract_path.resolve()
+    for rel in deleted:
+        target = extract_path / rel
+        # Путь из архива не должен выводить за пределы каталога распаковки (сама ссылка при этом не разыменовывается)
+        if not target.parent.resolve().is_relative_to(root) or target.name in ("", ".", ".."):
+            raise ValueError(f"Недопустимый путь в списке удаленных: {rel}")
+        if target.is_dir() and not target.is_symlink():
+            shutil.rmtree(target)
+        elif target.is_symlink() or target.exists():
+            target.unlink()
@@ -0,0 +1,262 @@
+import io
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from functools import cache
+from typing import TYPE_CHECKING, Callable, Iterator, TextIO
+
+# argparse импортируется парсерами команд, при первом вызове
+if TYPE_CHECKING:
+    import argparse
+
+# Здесь собраны функции, необходимые фоновым задачам (cmd &, jobs, wait, kill), чтобы не загрязнять и так грязный main
+#
+# Фоновые команды выполняются в пуле потоков: команды оболочки - блокирующий ввод-вывод, поэтому потоки дают
+# одновременную работу нескольких cp/zip/grep -r без переписывания команд. Вывод задачи перехватывается отдельно
+# для ее потока и показывается, когда задача завершится. Поток нельзя остановить снаружи, поэтому kill прерывает
+# задачу в ближайшей точке прерывания: на строке вывода, следующем файле cp каталога или tar.
+
+
+# Число одновременно выполняемых фоновых задач (остальные ждут в очереди)
+JOB_WORKERS = 4
+# Команды, которые не выполняются в фоне: cd меняет общий для всех потоков текущий каталог,
+# rm спрашивает подтверждение, команды задач и exit управляют самой оболочкой
+FOREGROUND_ONLY = ("cd", "rm", "exit", "jobs", "wait", "kill")
+STATUS_NAMES = {
+    "queued": "В очереди",
+    "running": "Выполняется",
+    "killing": "Прерывается",
+    "done": "Завершена",
+    "failed": "Ошибка",
+    "killed": "Прервана",
+}
+FINISHED = ("done", "failed", "killed")
+
+
+class JobCancelled(BaseException):
+    """Прерывание задачи командой kill (BaseException - чтобы обработчики except Exception в командах его не глотали)"""
+
+
+_executor = None
+_jobs: dict[int, dict] = {}
+_jobs_lock = threading.Lock()
+_next_id = 1
+_local = threading.local()
+
+
+class _ThreadStdout:
+    """sys.stdout, который для потоков с перехваченным выводом пишет в их буфер, а для остальных - в исходный поток"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        buffer = getattr(self._local, "buffer", None)
+        return self._stream if buffer is None else buffer
+
+    def write(self, text: str) -> int:
+        check_cancelled()
+        return self._target().write(text)
+
+    def __getattr__(self, name: str):
+        return getattr(self._target(), name)
+
+
+_stdout_lock = threading.Lock()
+
+
+@contextmanager
+def capture_stdout(buffer: TextIO) -> Iterator[None]:
+    """Перехватывает вывод текущего потока в buffer (в отличие от redirect_stdout не трогает другие потоки)"""
+    with _stdout_lock:
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+        proxy = sys.stdout
+    previous = getattr(proxy._local, "buffer", None)
+    proxy._local.buffer = buffer
+    try:
+        yield
+    finally:
+        proxy._local.buffer = previous
+
+
+def check_cancelled() -> None:
+    """Точка прерывания: если задачу текущего потока прервали командой kill, выбрасывает JobCancelled"""
+    job = getattr(_local, "job", None)
+    if job is not None and job["cancel"].is_set():
+        raise JobCancelled()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+
+def start_job(args: list[str], run: Callable[[], None]) -> int:
+    """Запускает run в фоне, args - команда для jobs (FOREGROUND_ONLY проверяет вызывающий). Возвращает номер задачи"""
+    global _next_id
+    with _jobs_lock:
+        job_id = _next_id
+        _next_id += 1
+        job = {"id": job_id, "command": " ".join(args), "status": "queued", "error": None,
+               "output": io.StringIO(), "cancel": threading.Event(), "done": threading.Event()}
+        _jobs[job_id] = job
+    _get_executor().submit(_run_job, job, run)
+    print(f"[{job_id}] {job['command']}")
+    return job_id
+
+
+def _run_job(job: dict, run: Callable[[], None]) -> None:
+    """Выполняет задачу в потоке пула, перехватывая ее вывод"""
+    with _jobs_lock:
+        if job["status"] != "queued":
+            return
+        job["status"] = "running"
+    _local.job = job
+    try:
+        with capture_stdout(job["output"]):
+            check_cancelled()
+            run()
+        status = "done"
+    except JobCancelled:
+        status = "killed"
+    except Exception as e:
+        logging.error(f"Ошибка фоновой задачи [{job['id']}] {job['command']}: {e}")
+        job["error"] = str(e)
+        status = "failed"
+    finally:
+        _local.job = None
+    with _jobs_lock:
+        job["status"] = status
+    job["done"].set()
+
+
+def _get_job(job_id: int) -> dict:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        raise ValueError(f"Нет задачи {job_id}")
+    return job
+
+
+def has_jobs() -> bool:
+    """Есть ли незавершенные или еще не показанные задачи"""
+    with _jobs_lock:
+        return bool(_jobs)
+
+
+def running_jobs() -> list[dict]:
+    """Незавершенные задачи"""
+    with _jobs_lock:
+        return [job for job in _jobs.values() if job["status"] not in FINISHED]
+
+
+def report_finished(ids: list[int] | None = None) -> int:
+    """
+    Выводит завершенные задачи (только ids, если заданы) с их выводом и забывает их.
+    Возвращает число задач, завершившихся ошибкой
+    """
+    with _jobs_lock:
+        finished = [job for job in _jobs.values()
+                    if job["status"] in FINISHED and (ids is None or job["id"] in ids)]
+        for job in finished:
+            del _jobs[job["id"]]
+    failed = 0
+    for job in finished:
+        print(f"[{job['id']}] {STATUS_NAMES[job['status']]}  {job['command']}")
+        output = job["output"].getvalue()
+        if output:
+            print(output, end="" if output.endswith("\n") else "\n")
+        if job["error"] is not None:
+            print(f"Ошибка: {job['error']}")
+            failed += 1
+    return failed
+
+
+@cache
+def _jobs_parser() -> "argparse.ArgumentParser":
+    """Парсер команды jobs (строится один раз, при первом вызове)"""
+    import argparse
+    return argparse.ArgumentParser(prog="jobs", description="Список фоновых задач", exit_on_error=False)
+
+
+@cache
+def _wait_parser() -> "argparse.ArgumentParser":
+    """Парсер команды wait (строится один раз, при первом вызове)"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="wait", description="Ожидание фоновых задач", exit_on_error=False)
+    parser.add_argument("ids", nargs="*", type=int, help="Номера задач (по умолчанию - все)")
+    return parser
+
+
+@cache
+def _kill_parser() -> "argparse.ArgumentParser":
+    """Парсер команды kill (строится один раз, при первом вызове)"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="kill", description="Прерывание фоновых задач", exit_on_error=False)
+    parser.add_argument("ids", nargs="+", type=int, help="Номера задач")
+    return parser
+
+
+def jobs_args_parse(args: list[str]) -> None:
+    import argparse
+    try:
+        _jobs_parser().parse_args(args)
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды jobs: {e}")
+
+
+def wait_args_parse(args: list[str]) -> list[int]:
+    import argparse
+    try:
+        return _wait_parser().parse_args(args).ids
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды wait: {e}")
+
+
+def kill_args_parse(args: list[str]) -> list[int]:
+    import argparse
+    try:
+        return _kill_parser().parse_args(args).ids
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды kill: {e}")
+
+
+def jobs_realisation() -> None:
+    """Выводит выполняющиеся задачи и результаты завершенных"""
+    for job in running_jobs():
+        print(f"[{job['id']}] {STATUS_NAMES[job['status']]}  {job['command']}")
+    report_finished()
+
+
+def wait_realisation(ids: list[int]) -> int:
+    """
+    Ждет завершения задач (все, если ids пуст) и выводит их результаты. Возвращает число задач с ошибкой.
+    Другие завершившиеся задачи остаются для jobs и следующего приглашения
+    """
+    if ids:
+        jobs = [_get_job(job_id) for job_id in ids]
+    else:
+        with _jobs_lock:
+            jobs = list(_jobs.values())
+    for job in jobs:
+        job["done"].wait()
+    return report_finished(ids or None)
+
+
+def kill_realisation(ids: list[int]) -> None:
+    """Прерывает задачи: задача из очереди снимается сразу, выполняющаяся - в ближайшей точке прерывания"""
+    jobs = [_get_job(job_id) for job_id in ids]
+    for job in jobs:
+        job["cancel"].set()
+        with _jobs_lock:
+            if job["status"] == "queued":
+                job["status"] = "killed"
+                job["done"].set()
+            elif job["status"] == "running":
+                job["status"] = "killing"
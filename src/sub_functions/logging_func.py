@@ -1,24 +1,109 @@
 import logging
 import sys
-from typing import Any
+import threading
+from typing import TYPE_CHECKING, Any
+
+# logging.handlers импортируется при настройке логирования, а не при импорте модуля
+if TYPE_CHECKING:
+    import queue
+    from logging.handlers import QueueListener
 
 # Здесь собраны функции, необходимые функции логирования, чтобы не загрязнять и так грязный main
 
 
+LOG_FILE = 'shell.log'
+# Лог ротируется по размеру: shell.log и не более LOG_BACKUP_COUNT старых файлов shell.log.1, shell.log.2, ...
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_FORMAT = '[%(asctime)s] - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# Один поток записи на все настроенные логгеры (лог оболочки, метрики): очередь общая, а каждый файловый
+# обработчик берет из нее только записи своего логгера
+_queue: "queue.Queue | None" = None
+_listener: "QueueListener | None" = None
+_file_handlers: list[logging.Handler] = []
+_queue_handlers: list[tuple[logging.Logger, logging.Handler]] = []
+_atexit_registered = False
+# Метрики настраивают свой логгер при первой записи - это может случиться одновременно в нескольких задачах
+_setup_lock = threading.RLock()
+
+
 # Конфигурация логирования
-def setup_logging() -> None:
-    """Настройка системы логирования."""
-    logging.basicConfig(
-        filename='shell.log',
-        level=logging.INFO,
-        format='[%(asctime)s] - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        encoding='utf-8'
-    )
-
-
-# Инициализация логирования
-setup_logging()
+def setup_logging(log_file: str = LOG_FILE, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                  target: logging.Logger | None = None, log_format: str = LOG_FORMAT) -> bool:
+    """
+    Настройка системы логирования (target - по умолчанию корневой логгер; если у него уже есть обработчики,
+    настройка не меняется, как в basicConfig), log_format - формат строки файла.
+    Команды только кладут запись в очередь (QueueHandler), а в файл ее пишет отдельный поток (QueueListener),
+    поэтому логирование не добавляет задержку диска к выполнению команд. Поток записи один на все логгеры:
+    при настройке следующего логгера прежний поток дописывает очередь и заменяется новым.
+    Возвращает False, если логгер уже был настроен.
+    """
+    global _queue, _listener, _atexit_registered
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+    target = target or logging.getLogger()
+    with _setup_lock:
+        if target.handlers:
+            return False
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8',
+                                           delay=True)
+        file_handler.setFormatter(logging.Formatter(log_format, LOG_DATE_FORMAT))
+        # Запись помечается логгером, через который попала в очередь, и пишется только в его файл
+        target_name = target.name
+
+        def mark_target(record: logging.LogRecord) -> bool:
+            record.log_target = target_name
+            return True
+
+        file_handler.addFilter(lambda record: getattr(record, "log_target", None) == target_name)
+
+        if _queue is None:
+            # Очередь без ограничения размера: запись в нее никогда не блокирует команду.
+            # Queue, а не SimpleQueue - поток записи отмечает task_done, и flush_logging ждет через join
+            _queue = queue.Queue()
+        queue_handler = QueueHandler(_queue)
+        queue_handler.addFilter(mark_target)
+
+        if _listener is not None:
+            _listener.stop()
+        _file_handlers.append(file_handler)
+        _listener = QueueListener(_queue, *_file_handlers)
+        _listener.start()
+        target.addHandler(queue_handler)
+        target.setLevel(logging.INFO)
+        _queue_handlers.append((target, queue_handler))
+        if not _atexit_registered:
+            # При выходе дописываем в файлы все, что осталось в очереди
+            atexit.register(shutdown_logging)
+            _atexit_registered = True
+    return True
+
+
+def flush_logging() -> None:
+    """Дожидается, пока поток записи допишет в файлы все записи, уже поставленные в очередь"""
+    if _queue is not None and _listener is not None:
+        _queue.join()
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь в файлы, останавливает поток записи и снимает обработчики, добавленные setup_logging"""
+    global _listener
+    with _setup_lock:
+        for target, queue_handler in _queue_handlers:
+            target.removeHandler(queue_handler)
+        _queue_handlers.clear()
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for file_handler in _file_handlers:
+            file_handler.close()
+        _file_handlers.clear()
+
+
 logger = logging.getLogger(__name__)
 
 
@@ -5,6 +5,7 @@ from os import stat_result
 from pathlib import Path
 from datetime import datetime
 import stat
+from functools import cache
 
 # Здесь собраны функции, необходимые основной функции - ls, чтобы не загрязнять и так грязный main
 
@@ -106,9 +107,18 @@ def ls_realisation(path: str, long: bool = False) -> None:
         raise e
 
 
-def ls_args_parse(args: list[str]):
+@cache
+def _ls_parser() -> argparse.ArgumentParser:
+    """Парсер команды ls (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(prog="ls", description="Вывод содержимого каталога", exit_on_error=False)
     parser.add_argument("-l", "--long", action="store_true", help="Детальный вывод содержимого каталога")
-    parser.add_argument("path", nargs='?', default=os.getcwd(), help="Путь к директории или файлу")
-    parsed_args = parser.parse_args(args)
+    parser.add_argument("path", nargs='?', default=None, help="Путь к директории или файлу")
+    return parser
+
+
+def ls_args_parse(args: list[str]):
+    parsed_args = _ls_parser().parse_args(args)
+    # Текущий каталог подставляется при каждом вызове: парсер общий, а cd его меняет
+    if parsed_args.path is None:
+        parsed_args.path = os.getcwd()
     return parsed_args
@@ -0,0 +1,200 @@
+import logging
+import math
+import os
+import sys
+import time
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from src.sub_functions.logging_func import setup_logging, flush_logging
+
+# argparse, json и datetime импортируются в функциях, которым они нужны: запуск оболочки их не загружает
+if TYPE_CHECKING:
+    import argparse
+
+try:
+    import resource
+except ImportError:  # Windows - время CPU берется из time.process_time, пиковая память недоступна
+    resource = None  # type: ignore[assignment]
+
+# Здесь собраны функции метрик команд и команды stats, чтобы не загрязнять и так грязный main
+#
+# Для каждой команды записываются время выполнения, время CPU, прочитанные и записанные байты и пиковая память.
+# Счетчики общие для процесса: если одновременно работают фоновые задачи, их ресурсы попадают и в метрики
+# команды. Записи - строки JSON в .metrics.jsonl (пишутся через очередь, как лог, и ротируются по размеру).
+
+
+METRICS_FILE = ".metrics.jsonl"
+METRICS_MAX_BYTES = 4 * 1024 * 1024
+METRICS_BACKUP_COUNT = 3
+PERCENTILES = (50, 95, 99)
+# ru_maxrss в Linux - в КБ, в macOS - в байтах
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def metrics_init() -> None:
+    """Закрепляет файл метрик за каталогом запуска (вызывается при запуске, как history_mkdir)"""
+    global METRICS_FILE
+    METRICS_FILE = os.path.abspath(METRICS_FILE)
+
+
+def _metrics_logger() -> logging.Logger:
+    """Логгер метрик: при первой записи подключается к потоку записи логов со своим файлом"""
+    metrics_logger = logging.getLogger("shell.metrics")
+    if not metrics_logger.handlers:
+        metrics_logger.propagate = False
+        setup_logging(METRICS_FILE, METRICS_MAX_BYTES, METRICS_BACKUP_COUNT, metrics_logger, "%(message)s")
+    return metrics_logger
+
+
+def _cpu_time() -> float:
+    """Время CPU процесса и завершившихся дочерних процессов (пулы zip -j и unzip -j)"""
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _io_counters() -> tuple[int, int] | None:
+    """(прочитано, записано) байт через системные вызовы - только Linux"""
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            counters = dict(line.split(":") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak_rss() -> None:
+    """Сбрасывает пиковую память процесса (Linux), чтобы измерить пик одной команды"""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss() -> int | None:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+def run_measured(args: list[str], run: Callable[[], None], background: bool = False) -> None:
+    """Выполняет команду, записывая ее метрики (и при ошибке - со статусом error)"""
+    import json
+    from datetime import datetime
+    _reset_peak_rss()
+    io_before = _io_counters()
+    cpu_before = _cpu_time()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        run()
+        status = "ok"
+    finally:
+        wall = time.perf_counter() - start
+        cpu = _cpu_time() - cpu_before
+        io_after = _io_counters()
+        read_bytes, write_bytes = (None, None) if io_before is None or io_after is None else (
+            io_after[0] - io_before[0], io_after[1] - io_before[1])
+        record = {
+            "time": datetime.now().isoformat(),
+            "command": args[0],
+            "args": args[1:],
+            "status": status,
+            "background": background,
+            "wall": round(wall, 6),
+            "cpu": round(cpu, 6),
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "peak_rss": _peak_rss(),
+        }
+        _metrics_logger().info(json.dumps(record, ensure_ascii=False))
+
+
+def read_metrics() -> Iterator[dict]:
+    """Записи метрик от старых к новым (включая ротированные файлы)"""
+    import json
+    # Записи метрик, еще стоящие в очереди, должны попасть в файл до чтения
+    flush_logging()
+    paths = [Path(f"{METRICS_FILE}.{i}") for i in range(METRICS_BACKUP_COUNT, 0, -1)] + [Path(METRICS_FILE)]
+    for path in paths:
+        if not path.exists():
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга (values отсортированы)"""
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(records: Iterator[dict]) -> dict[str, dict]:
+    """Сводка по типам команд: число запусков, ошибок, перцентили времени, среднее CPU, байты, пик памяти"""
+    groups: dict[str, list[dict]] = {}
+    for record in records:
+        groups.setdefault(record["command"], []).append(record)
+
+    summary = {}
+    for command, group in groups.items():
+        walls = sorted(record["wall"] for record in group)
+        peaks = [record["peak_rss"] for record in group if record["peak_rss"] is not None]
+        summary[command] = {
+            "count": len(group),
+            "errors": sum(record["status"] != "ok" for record in group),
+            **{f"p{p}": percentile(walls, p) for p in PERCENTILES},
+            "cpu": sum(record["cpu"] for record in group) / len(group),
+            "read_bytes": sum(record["read_bytes"] or 0 for record in group),
+            "write_bytes": sum(record["write_bytes"] or 0 for record in group),
+            "peak_rss": max(peaks) if peaks else None,
+        }
+    return summary
+
+
+@cache
+def _stats_parser() -> "argparse.ArgumentParser":
+    """Парсер команды stats (строится один раз, при первом вызове)"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="stats", description="Время и ресурсы команд", exit_on_error=False)
+    parser.add_argument("command", nargs="?", default=None, help="Только эта команда")
+    parser.add_argument("--json", action="store_true", help="Вывести записи метрик строками JSON (для выгрузки)")
+    return parser
+
+
+def stats_args_parse(args: list[str]) -> dict:
+    import argparse
+    try:
+        parsed_args = _stats_parser().parse_args(args)
+        return {"command": parsed_args.command, "json": parsed_args.json}
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды stats: {e}")
+
+
+def stats_realisation(args: dict) -> None:
+    """Выводит сводку метрик по типам команд (или сами записи строками JSON)"""
+    import json
+    from src.sub_functions.trash_dependences import format_size
+    records = (record for record in read_metrics() if args["command"] in (None, record["command"]))
+    if args["json"]:
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False))
+        return
+
+    summary = summarize(records)
+    if not summary:
+        print("Метрик пока нет")
+        return
+    print(f"{'команда':<10} {'запусков':>8} {'ошибок':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'CPU ср.':>9} "
+          f"{'прочитано':>10} {'записано':>10} {'пик RSS':>8}")
+    for command, row in sorted(summary.items(), key=lambda item: item[1]["p95"], reverse=True):
+        print(f"{command:<10} {row['count']:>8} {row['errors']:>6} {row['p50'] * 1000:>7.1f}ms "
+              f"{row['p95'] * 1000:>7.1f}ms {row['p99'] * 1000:>7.1f}ms {row['cpu'] * 1000:>7.1f}ms "
+              f"{format_size(row['read_bytes']):>10} {format_size(row['write_bytes']):>10} "
+              f"{'-' if row['peak_rss'] is None else format_size(row['peak_rss']):>8}")
@@ -2,12 +2,14 @@ import argparse
 import os
 import logging
 from pathlib import Path
+from functools import cache
 
 
 # Здесь собраны функции, необходимые основной функции - mv, чтобы не загрязнять и так грязный main
 
-def mv_args_parse(args: list[str]) -> list[str]:
-    """Парсит аргументы команды mv"""
+@cache
+def _mv_parser() -> argparse.ArgumentParser:
+    """Парсер команды mv (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(
         prog="mv",
         description="Перемещает файл из path_from в path_to",
@@ -15,9 +17,13 @@ def mv_args_parse(args: list[str]) -> list[str]:
     )
     parser.add_argument("path_from", help="Путь откуда переместить")
     parser.add_argument("path_to", help="Путь куда переместить")
+    return parser
+
 
+def mv_args_parse(args: list[str]) -> list[str]:
+    """Парсит аргументы команды mv"""
     try:
-        parsed_args = parser.parse_args(args)
+        parsed_args = _mv_parser().parse_args(args)
         return [parsed_args.path_from, parsed_args.path_to]
     except SystemExit:
         raise Exception("Ошибка парсинга команды mv: требуется 2 аргумента - путь_откуда и путь_куда")
@@ -0,0 +1,196 @@
+import io
+import itertools
+from typing import Iterator, TextIO
+
+from src.sub_functions.registry_dependences import get_command, get_stream_command
+
+# Здесь собраны функции разбора строки команд и конвейеров (cmd1 | cmd2), чтобы не загрязнять и так грязный main
+#
+# Конвейер выполняется в одном процессе: каждая команда - генератор строк, который читает строки предыдущей.
+# cat и grep работают построчно (cat big.log | grep ERROR не держит файл в памяти), остальные команды
+# могут стоять в начале конвейера - их вывод перехватывается и передается дальше.
+# Вывод команды или конвейера можно перенаправить в файл (> и >>): строки пишутся в файл с большим буфером.
+# Перехват вывода и точки прерывания берутся из модуля задач при выполнении: запуск оболочки его не загружает.
+
+
+# Операторы оболочки (распознаются только вне кавычек), длинные - раньше коротких
+OPERATORS = (";", "|", "&", ">>", ">")
+# Буфер файла, в который перенаправлен вывод (> и >>): запись крупными блоками, а не строками
+REDIRECT_BUFFER_SIZE = 1024 * 1024
+# Строки в файл пишутся пачками: один write на пачку вместо вызова на каждую строку
+REDIRECT_BATCH_LINES = 1000
+
+
+class Operator(str):
+    """Оператор оболочки в списке токенов (в отличие от такого же аргумента в кавычках)"""
+
+
+def tokenize(line: str) -> list[str]:
+    """
+    Разбивает строку на аргументы по правилам shell: кавычки '...' и "...", экранирование \\, комментарий #.
+    Операторы вне кавычек возвращаются отдельными токенами класса Operator.
+    """
+    tokens: list[str] = []
+    word: str | None = None  # None - слова нет (пустые кавычки дают пустой аргумент)
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if char.isspace():
+            if word is not None:
+                tokens.append(word)
+                word = None
+            i += 1
+        elif char == "#" and word is None:
+            break
+        elif char == "'":
+            end = line.find("'", i + 1)
+            if end == -1:
+                raise ValueError("Нет закрывающей кавычки")
+            word = (word or "") + line[i + 1:end]
+            i = end + 1
+        elif char == '"':
+            i += 1
+            part = []
+            while True:
+                if i >= len(line):
+                    raise ValueError("Нет закрывающей кавычки")
+                if line[i] == '"':
+                    i += 1
+                    break
+                # Внутри двойных кавычек экранируются только ", \, $ и `
+                if line[i] == "\\" and i + 1 < len(line) and line[i + 1] in '"\\$`':
+                    i += 1
+                part.append(line[i])
+                i += 1
+            word = (word or "") + "".join(part)
+        elif char == "\\":
+            if i + 1 >= len(line):
+                raise ValueError("Нет символа после \\")
+            word = (word or "") + line[i + 1]
+            i += 2
+        else:
+            operator = next((op for op in OPERATORS if line.startswith(op, i)), None)
+            if operator is None:
+                word = (word or "") + char
+                i += 1
+                continue
+            if word is not None:
+                tokens.append(word)
+                word = None
+            tokens.append(Operator(operator))
+            i += len(operator)
+    if word is not None:
+        tokens.append(word)
+    return tokens
+
+
+def is_operator(token: str, operator: str) -> bool:
+    """Является ли токен оператором operator (а не аргументом с тем же текстом)"""
+    return isinstance(token, Operator) and token == operator
+
+
+def split_on(tokens: list[str], operator: str) -> list[list[str]]:
+    """Делит токены по оператору"""
+    parts: list[list[str]] = [[]]
+    for token in tokens:
+        if is_operator(token, operator):
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def split_commands(line: str) -> list[list[str]]:
+    """
+    Разбивает строку на команды, разделенные ; или & (пустые команды пропускаются).
+    Команда, после которой стоит &, заканчивается оператором & - она выполняется в фоне.
+    """
+    commands: list[list[str]] = [[]]
+    for token in tokenize(line):
+        if is_operator(token, ";"):
+            commands.append([])
+        elif is_operator(token, "&"):
+            commands[-1].append(token)
+            commands.append([])
+        else:
+            commands[-1].append(token)
+    return [args for args in commands if args]
+
+
+def split_redirect(args: list[str]) -> tuple[list[str], tuple[str, bool] | None]:
+    """Отделяет перенаправление вывода: (аргументы без него, (файл, дописывать ли) или None)"""
+    positions = [i for i, token in enumerate(args) if is_operator(token, ">") or is_operator(token, ">>")]
+    if not positions:
+        return args, None
+    if len(positions) > 1:
+        raise ValueError("Вывод можно перенаправить только в один файл")
+    position = positions[0]
+    if position + 1 >= len(args) or isinstance(args[position + 1], Operator):
+        raise ValueError(f"Нет имени файла после {args[position]}")
+    if any(is_operator(token, "|") for token in args[position + 2:]):
+        raise ValueError("Перенаправление вывода возможно только в конце конвейера")
+    target = (args[position + 1], args[position] == ">>")
+    return args[:position] + args[position + 2:], target
+
+
+def run_redirected(stages: list[list[str]], path: str, append: bool = False) -> None:
+    """Выполняет команду или конвейер, записывая вывод в файл (append - дописать в конец)"""
+    from src.sub_functions.jobs_dependences import capture_stdout
+    # Ошибка в команде не должна успеть обнулить файл
+    _check_stages(stages)
+    with open(path, "a" if append else "w", encoding="utf-8", buffering=REDIRECT_BUFFER_SIZE) as out:
+        # print команд без построчного режима тоже попадает в буфер файла, а не в терминал
+        with capture_stdout(out):
+            run_pipeline(stages, out)
+
+
+def run_pipeline(stages: list[list[str]], out: TextIO | None = None) -> None:
+    """
+    Выполняет конвейер: строки передаются от команды к команде без временных файлов и подпроцессов.
+    out - файл для вывода последней команды (None - print).
+    """
+    from src.sub_functions.jobs_dependences import check_cancelled
+    _check_stages(stages)
+    if len(stages) == 1 and get_stream_command(stages[0][0]) is None:
+        get_command(stages[0][0])(stages[0])
+        return
+    lines = _stage(stages[0], None)
+    for args in stages[1:]:
+        lines = _stage(args, lines)
+    if out is None:
+        for line in lines:
+            print(line)
+        return
+    for batch in itertools.batched(lines, REDIRECT_BATCH_LINES):
+        check_cancelled()
+        out.write("\n".join(batch))
+        out.write("\n")
+
+
+def _check_stages(stages: list[list[str]]) -> None:
+    """Проверяет до выполнения, что в конвейере нет пустых и неизвестных команд"""
+    for args in stages:
+        if not args:
+            raise ValueError("Пустая команда в конвейере")
+        if get_stream_command(args[0]) is None:
+            get_command(args[0])
+
+
+def _stage(args: list[str], lines: Iterator[str] | None) -> Iterator[str]:
+    """Генератор строк одной команды конвейера. lines - вывод предыдущей команды (None - это первая)"""
+    stream_handler = get_stream_command(args[0])
+    if stream_handler is not None:
+        return stream_handler(args, lines)
+    if lines is not None:
+        raise ValueError(f"Команда {args[0]} не читает ввод из канала")
+    return _captured_output(args)
+
+
+def _captured_output(args: list[str]) -> Iterator[str]:
+    """Выполняет обычную команду, перехватывая ее вывод, и отдает его построчно"""
+    from src.sub_functions.jobs_dependences import capture_stdout
+    handler = get_command(args[0])
+    buffer = io.StringIO()
+    with capture_stdout(buffer):
+        handler(args)
+    yield from buffer.getvalue().splitlines()
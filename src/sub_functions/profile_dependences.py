@@ -0,0 +1,56 @@
+import argparse
+import cProfile
+import pstats
+import sys
+from functools import cache
+from typing import Callable
+
+# Здесь собраны функции, необходимые основной функции - profile, чтобы не загрязнять и так грязный main
+#
+# profile выполняет любую команду (или конвейер) через обычный диспетчер под cProfile и выводит самые дорогие
+# функции. Профилируется только поток команды: работа пулов процессов и потоков (zip -j, tar -j) в отчет не попадает.
+
+
+SORT_KEYS = {"cumulative": pstats.SortKey.CUMULATIVE, "tottime": pstats.SortKey.TIME, "calls": pstats.SortKey.CALLS}
+
+
+@cache
+def _profile_parser() -> argparse.ArgumentParser:
+    """Парсер команды profile (строится один раз, при первом вызове)"""
+    parser = argparse.ArgumentParser(prog="profile", description="Профилирование команды (cProfile)",
+                                     exit_on_error=False)
+    parser.add_argument("--top", type=int, default=20, help="Сколько функций вывести")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="cumulative",
+                        help="Сортировка: cumulative - с вложенными вызовами, tottime - собственное время, calls")
+    parser.add_argument("-o", "--output", default=None, help="Сохранить профиль в файл .pstats")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Команда с аргументами")
+    return parser
+
+
+def profile_args_parse(args: list[str]) -> dict:
+    try:
+        parsed_args = _profile_parser().parse_args(args)
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды profile: {e}")
+    if not parsed_args.command:
+        raise ValueError("Укажите команду: profile [--top N] [--sort KEY] [-o FILE] <команда>")
+    if parsed_args.top <= 0:
+        raise ValueError("--top должен быть больше нуля")
+    return {"top": parsed_args.top, "sort": parsed_args.sort, "output": parsed_args.output,
+            "command": parsed_args.command}
+
+
+def profile_realisation(args: dict, run: Callable[[], None]) -> None:
+    """Выполняет run под cProfile и выводит самые дорогие функции (и при ошибке команды - тоже)"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run)
+    finally:
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        if args["output"] is not None:
+            # Файл - с полными путями, для snakeviz, pstats и т.п.
+            stats.dump_stats(args["output"])
+        print(f"Профиль: {' '.join(args['command'])}")
+        stats.strip_dirs().sort_stats(SORT_KEYS[args["sort"]]).print_stats(args["top"])
+        if args["output"] is not None:
+            print(f"Профиль сохранен в {args['output']}")
@@ -0,0 +1,213 @@
+import os
+import threading
+from typing import Callable, Iterator
+
+# Здесь собран реестр команд оболочки, чтобы не загрязнять и так грязный main
+#
+# Модуль команды импортируется при первом ее вызове (импорт внутри обработчика): запуск оболочки не тянет
+# zipfile, tarfile, сжатие и корзину, если сценарий их не использует.
+
+
+# Каталог запуска: корзина закрепляется за ним, даже если модуль корзины загрузится уже после cd
+_startup_dir: str | None = None
+_trash_ready = False
+_trash_lock = threading.Lock()
+
+
+def init_registry() -> None:
+    """Запоминает каталог запуска оболочки"""
+    global _startup_dir
+    _startup_dir = os.getcwd()
+
+
+def ensure_trash() -> None:
+    """При первой команде, работающей с корзиной, создает корзину и запускает ее фоновую очистку"""
+    global _trash_ready
+    # Блокировка - первые cp/mv могут прийти одновременно из фоновых задач
+    with _trash_lock:
+        if _trash_ready:
+            return
+        from src.sub_functions.undo_dependences import init_trash
+        from src.sub_functions.trash_dependences import start_trash_collector
+        init_trash(_startup_dir)
+        start_trash_collector()
+        _trash_ready = True
+
+
+def _ls(args: list[str]) -> None:
+    from src.sub_functions.ls_dependences import ls_args_parse, ls_realisation
+    args_value = ls_args_parse(args[1:])
+    ls_realisation(path=str(args_value.path), long=bool(args_value.long))
+
+
+def _cd(args: list[str]) -> None:
+    from src.sub_functions.cd_dependences import cd_args_parse, cd_realisation
+    from src.sub_functions.jobs_dependences import running_jobs
+    # Текущий каталог общий для всех потоков - относительные пути выполняющихся задач сломались бы
+    if running_jobs():
+        raise ValueError("cd недоступна, пока выполняются фоновые задачи (jobs, wait)")
+    cd_realisation(str(cd_args_parse(args[1:])))
+
+
+def _cat(args: list[str]) -> None:
+    from src.sub_functions.cat_dependences import cat_args_parse, cat_realisation
+    cat_realisation(str(cat_args_parse(args[1:])))
+
+
+def _cp(args: list[str]) -> None:
+    from src.sub_functions.cp_dependences import cp_args_parse
+    from src.sub_functions.undo_dependences import cp_with_history
+    ensure_trash()
+    cp_args = cp_args_parse(args[1:])
+    # Используем версию с историей для поддержки undo
+    cp_with_history(cp_args[0], str(cp_args[1]))
+
+
+def _mv(args: list[str]) -> None:
+    from src.sub_functions.mv_dependences import mv_args_parse
+    from src.sub_functions.undo_dependences import mv_with_history
+    ensure_trash()
+    path_from, path_to = mv_args_parse(args[1:])
+    mv_with_history(path_from, path_to)
+
+
+def _rm(args: list[str]) -> None:
+    from src.sub_functions.rm_dependences import rm_args_parse
+    from src.sub_functions.undo_dependences import rm_with_history
+    ensure_trash()
+    rm_args = rm_args_parse(args[1:])
+    # Используем версию с историей для поддержки undo
+    rm_with_history(str(rm_args['path']))
+
+
+def _archive(args: list[str]) -> None:
+    from src.sub_functions.archive_dependences import archive_realisation
+    archive_realisation(args)
+
+
+def _unarchive(args: list[str]) -> None:
+    from src.sub_functions.unarchive_dependences import unarchive_command_parse, unarchive_realisation
+    unarchive_realisation(*unarchive_command_parse(args))
+
+
+def _grep(args: list[str]) -> None:
+    from src.sub_functions.grep_dependences import grep_args_parse, grep_realisation
+    grep_realisation(grep_args_parse(args[1:]))
+
+
+def _history(args: list[str]) -> None:
+    from src.sub_functions.history_dependences import history_args_parse, history_realisation
+    history_realisation(history_args_parse(args[1:]))
+
+
+def _undo(args: list[str]) -> None:
+    from src.sub_functions.undo_dependences import undo_args_parse, undo_realisation
+    ensure_trash()
+    undo_realisation(undo_args_parse(args[1:]))
+
+
+def _redo(args: list[str]) -> None:
+    from src.sub_functions.undo_dependences import undo_args_parse, redo_realisation
+    ensure_trash()
+    redo_realisation(undo_args_parse(args[1:], prog="redo"))
+
+
+def _trash(args: list[str]) -> None:
+    from src.sub_functions.trash_dependences import trash_args_parse, trash_realisation
+    ensure_trash()
+    trash_realisation(trash_args_parse(args[1:]))
+
+
+def _jobs(args: list[str]) -> None:
+    from src.sub_functions.jobs_dependences import jobs_args_parse, jobs_realisation
+    jobs_args_parse(args[1:])
+    jobs_realisation()
+
+
+def _wait(args: list[str]) -> None:
+    from src.sub_functions.jobs_dependences import wait_args_parse, wait_realisation
+    wait_realisation(wait_args_parse(args[1:]))
+
+
+def _kill(args: list[str]) -> None:
+    from src.sub_functions.jobs_dependences import kill_args_parse, kill_realisation
+    kill_realisation(kill_args_parse(args[1:]))
+
+
+def _stats(args: list[str]) -> None:
+    from src.sub_functions.metrics_dependences import stats_args_parse, stats_realisation
+    stats_realisation(stats_args_parse(args[1:]))
+
+
+def _profile(args: list[str]) -> None:
+    from functools import partial
+    from src.sub_functions.profile_dependences import profile_args_parse, profile_realisation
+    from src.sub_functions.pipeline_dependences import run_pipeline, split_on
+    options = profile_args_parse(args[1:])
+    # Команда выполняется тем же диспетчером, что и без profile (конвейер - целиком)
+    profile_realisation(options, partial(run_pipeline, split_on(options["command"], "|")))
+
+
+def _help(args: list[str]) -> None:
+    from src.sub_functions.help_func import help_realisation
+    help_realisation()
+
+
+# Команда -> обработчик (получает аргументы вместе с именем команды)
+COMMANDS: dict[str, Callable[[list[str]], None]] = {
+    "ls": _ls,
+    "cd": _cd,
+    "cat": _cat,
+    "cp": _cp,
+    "mv": _mv,
+    "rm": _rm,
+    "zip": _archive,
+    "tar": _archive,
+    "unzip": _unarchive,
+    "untar": _unarchive,
+    "grep": _grep,
+    "history": _history,
+    "undo": _undo,
+    "redo": _redo,
+    "trash": _trash,
+    "jobs": _jobs,
+    "wait": _wait,
+    "kill": _kill,
+    "stats": _stats,
+    "profile": _profile,
+    "help": _help,
+}
+
+
+def get_command(command: str) -> Callable[[list[str]], None]:
+    """Обработчик команды"""
+    handler = COMMANDS.get(command)
+    if handler is None:
+        raise Exception(f"Неизвестная команда: {command}")
+    return handler
+
+
+def _cat_stream(args: list[str], lines: Iterator[str] | None) -> Iterator[str]:
+    from src.sub_functions.cat_dependences import cat_args_parse, cat_lines
+    if lines is not None:
+        raise ValueError("Команда cat не читает ввод из канала")
+    return cat_lines(str(cat_args_parse(args[1:])))
+
+
+def _grep_stream(args: list[str], lines: Iterator[str] | None) -> Iterator[str]:
+    from src.sub_functions.grep_dependences import grep_args_parse, grep_filter_args_parse, grep_search, grep_filter
+    if lines is None:
+        return grep_search(grep_args_parse(args[1:]))
+    return grep_filter(grep_filter_args_parse(args[1:]), lines)
+
+
+# Команды, работающие в конвейере построчно: (аргументы, строки из канала или None) -> генератор строк
+STREAM_COMMANDS: dict[str, Callable[[list[str], Iterator[str] | None], Iterator[str]]] = {
+    "cat": _cat_stream,
+    "grep": _grep_stream,
+}
+
+
+def get_stream_command(command: str) -> Callable[[list[str], Iterator[str] | None], Iterator[str]] | None:
+    """Построчный обработчик команды для конвейера (None - команда выполняется целиком, вывод перехватывается)"""
+    return STREAM_COMMANDS.get(command)
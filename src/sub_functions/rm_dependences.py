@@ -1,10 +1,12 @@
 import argparse
+from functools import cache
 
 
 # Здесь собраны функции, необходимые основной функции - rm, чтобы не загрязнять и так грязный main
 
-def rm_args_parse(args: list[str]) -> dict[str, object]:
-    """Парсит аргументы команды rm"""
+@cache
+def _rm_parser() -> argparse.ArgumentParser:
+    """Парсер команды rm (строится один раз, при первом вызове)"""
     parser = argparse.ArgumentParser(
         prog="rm",
         description="Удаляет файл или директорию",
@@ -16,9 +18,13 @@ def rm_args_parse(args: list[str]) -> dict[str, object]:
         help="Рекурсивное удаление директорий"
     )
     parser.add_argument("path", help="Путь к удаляемому файлу или директории")
+    return parser
+
 
+def rm_args_parse(args: list[str]) -> dict[str, object]:
+    """Парсит аргументы команды rm"""
     try:
-        parsed_args = parser.parse_args(args)
+        parsed_args = _rm_parser().parse_args(args)
         return {
             "recursive": parsed_args.recursive,
             "path": parsed_args.path
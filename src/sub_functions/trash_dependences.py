@@ -0,0 +1,324 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from functools import cache
+
+from src.sub_functions import undo_dependences
+from src.sub_functions.cas_trash_dependences import (cas_enabled, cas_entries_dir, cas_remove, cas_root,
+                                                     cas_stored_bytes, compact_manifest, is_cas_entry,
+                                                     set_cas_enabled)
+from src.sub_functions.history_dependences import history_lock, invalidate_trash_records
+
+# Здесь собраны функции, необходимые основной функции - trash, чтобы не загрязнять и так грязный main
+
+
+# Константы
+TRASH_POLICY_FILE = ".policy.json"  # хранится внутри корзины
+COLLECT_INTERVAL = 30.0
+COLLECT_BATCH = 64  # сколько элементов корзины удаляется за один шаг сборщика
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_AGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# Элементы корзины не меняются, поэтому размер каталога считаем один раз
+_size_cache: dict[tuple[str, int], int] = {}
+_collector_stop = threading.Event()
+_collector_thread: threading.Thread | None = None
+
+
+def parse_size(value: str) -> int:
+    """Переводит размер вида 500, 10K, 2M, 1G в байты"""
+    value = value.strip().upper().removesuffix("B")
+    unit = value[-1] if value and value[-1] in _SIZE_UNITS else ""
+    try:
+        return int(float(value[:len(value) - len(unit)]) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Неверный размер: {value}. Пример: 500M, 2G")
+
+
+def parse_age(value: str) -> float:
+    """Переводит возраст вида 90, 30m, 12h, 7d, 2w в секунды"""
+    value = value.strip().lower()
+    unit = value[-1] if value and value[-1] in _AGE_UNITS else ""
+    try:
+        return float(value[:len(value) - len(unit)]) * _AGE_UNITS[unit]
+    except ValueError:
+        raise ValueError(f"Неверный возраст: {value}. Пример: 12h, 7d")
+
+
+def format_size(size: int) -> str:
+    """Форматирует размер в байтах для вывода"""
+    amount = float(size)
+    for unit in ("B", "K", "M", "G"):
+        if amount < 1024:
+            return f"{amount:.0f}{unit}" if unit == "B" else f"{amount:.1f}{unit}"
+        amount /= 1024
+    return f"{amount:.1f}T"
+
+
+def trash_dir() -> Path:
+    """Основной каталог корзины (в нем же хранится политика)"""
+    return Path(undo_dependences.TRASH_DIR).absolute()
+
+
+def load_policy() -> dict:
+    """Читает политику хранения корзины: max_bytes и max_age (None - без ограничения)"""
+    policy_path = trash_dir() / TRASH_POLICY_FILE
+    policy = {"max_bytes": None, "max_age": None}
+    if policy_path.exists():
+        with open(policy_path, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f))
+    return policy
+
+
+def format_policy(policy: dict) -> str:
+    """Форматирует политику хранения для вывода"""
+    max_bytes = format_size(policy["max_bytes"]) if policy["max_bytes"] is not None else "нет"
+    max_age = f"{policy['max_age']:.0f}s" if policy["max_age"] is not None else "нет"
+    return f"Политика: max-bytes={max_bytes}, max-age={max_age}"
+
+
+def save_policy(policy: dict) -> None:
+    """Сохраняет политику хранения корзины"""
+    policy_path = trash_dir() / TRASH_POLICY_FILE
+    policy_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(policy_path, 'w', encoding='utf-8') as f:
+        json.dump(policy, f)
+
+
+def entry_size(path: Path) -> int:
+    """Размер элемента корзины (для каталога - суммарный размер файлов)"""
+    entry_stat = path.lstat()
+    if not path.is_dir() or path.is_symlink():
+        return entry_stat.st_size
+
+    key = (str(path), entry_stat.st_ino)
+    if key not in _size_cache:
+        total = 0
+        for root, _dirs, files in os.walk(path):
+            for file_name in files:
+                try:
+                    total += os.lstat(os.path.join(root, file_name)).st_size
+                except OSError:
+                    continue
+        _size_cache[key] = total
+    return _size_cache[key]
+
+
+def deletion_time(path: Path) -> datetime:
+    """Время удаления: берется из префикса имени в корзине, иначе - время изменения inode"""
+    try:
+        return datetime.strptime(path.name[:22], "%Y%m%d_%H%M%S_%f")
+    except ValueError:
+        return datetime.fromtimestamp(path.lstat().st_ctime)
+
+
+def list_trash() -> list[dict]:
+    """Возвращает элементы всех корзин от старых к новым"""
+    entries: list[dict] = []
+    # Основная корзина и корзины на других файловых системах
+    for directory in map(Path, undo_dependences.known_trash_dirs()):
+        if not directory.exists():
+            continue
+
+        # Элементы дедуплицирующего хранилища лежат в служебном каталоге .cas/entries
+        paths = list(directory.iterdir())
+        if cas_entries_dir(directory).exists():
+            paths.extend(cas_entries_dir(directory).iterdir())
+
+        for path in paths:
+            if path.name.startswith("."):
+                continue
+            try:
+                entries.append({"path": path, "deleted_at": deletion_time(path), "size": entry_size(path)})
+            except OSError as e:
+                # Элемент мог исчезнуть между iterdir и stat (например, его восстановил undo)
+                logging.warning(f"Пропущен элемент корзины {path}: {e}")
+
+    entries.sort(key=lambda entry: entry["deleted_at"])
+    return entries
+
+
+def select_for_purge(entries: list[dict], max_bytes: int | None, max_age: float | None,
+                     now: datetime | None = None) -> list[dict]:
+    """Выбирает элементы для удаления: все старше max_age и самые старые, пока корзина больше max_bytes"""
+    now = now or datetime.now()
+    victims = []
+    kept = []
+    for entry in entries:
+        if max_age is not None and (now - entry["deleted_at"]).total_seconds() > max_age:
+            victims.append(entry)
+        else:
+            kept.append(entry)
+
+    if max_bytes is not None:
+        total = sum(entry["size"] for entry in kept)
+        for entry in kept:
+            if total <= max_bytes:
+                break
+            victims.append(entry)
+            total -= entry["size"]
+
+    return victims
+
+
+def purge_entries(entries: list[dict]) -> tuple[int, int]:
+    """Удаляет элементы корзины и помечает их записи в истории. Возвращает (количество, байты)"""
+    purged_paths = set()
+    cas_roots = set()
+    freed = 0
+    # Под блокировкой истории: undo не может восстанавливать элемент, пока его удаляют
+    with history_lock():
+        for entry in entries:
+            path = entry["path"]
+            try:
+                if is_cas_entry(path):
+                    # Объект удаляется только вместе с последней ссылкой на него
+                    freed += cas_remove(path)
+                    cas_roots.add(path.parent.parent)
+                elif path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path)
+                    freed += entry["size"]
+                else:
+                    path.unlink()
+                    freed += entry["size"]
+            except FileNotFoundError:
+                continue
+            purged_paths.add(str(path))
+
+        for root in cas_roots:
+            compact_manifest(root)
+        invalidate_trash_records(purged_paths)
+    return len(purged_paths), freed
+
+
+def collect_trash(policy: dict, stop: threading.Event | None = None) -> tuple[int, int]:
+    """Один проход сборщика: удаляет элементы по политике порциями по COLLECT_BATCH, пока не выставлен stop"""
+    victims = select_for_purge(list_trash(), policy.get("max_bytes"), policy.get("max_age"))
+    purged, freed = 0, 0
+    for start in range(0, len(victims), COLLECT_BATCH):
+        if stop is not None and stop.is_set():
+            break
+        count, size = purge_entries(victims[start:start + COLLECT_BATCH])
+        purged += count
+        freed += size
+        # Отдаем процессор основному потоку между порциями
+        time.sleep(0)
+    return purged, freed
+
+
+def _collector_loop(interval: float) -> None:
+    """Цикл фонового сборщика корзины"""
+    while not _collector_stop.wait(interval):
+        try:
+            policy = load_policy()
+            if policy["max_bytes"] is not None or policy["max_age"] is not None:
+                collect_trash(policy, _collector_stop)
+        except Exception as e:
+            logging.error(f"Ошибка фоновой очистки корзины: {e}")
+
+
+def start_trash_collector(interval: float = COLLECT_INTERVAL) -> None:
+    """Запускает фоновую очистку корзины по сохраненной политике (rm при этом не ждет очистки)"""
+    global _collector_thread
+    if _collector_thread is not None and _collector_thread.is_alive():
+        return
+    _collector_stop.clear()
+    _collector_thread = threading.Thread(target=_collector_loop, args=(interval,), name="trash-collector", daemon=True)
+    _collector_thread.start()
+
+
+def stop_trash_collector() -> None:
+    """Останавливает фоновую очистку корзины"""
+    _collector_stop.set()
+    if _collector_thread is not None:
+        _collector_thread.join()
+
+
+@cache
+def _trash_parser() -> argparse.ArgumentParser:
+    """Парсер команды trash (строится один раз, при первом вызове)"""
+    parser = argparse.ArgumentParser(prog="trash", description="Управление корзиной", exit_on_error=False)
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    subparsers.add_parser("list", help="Список элементов корзины", exit_on_error=False)
+    subparsers.add_parser("stats", help="Статистика корзины", exit_on_error=False)
+    backend_parser = subparsers.add_parser("backend", help="Способ хранения удаленных файлов", exit_on_error=False)
+    backend_parser.add_argument("backend", nargs="?", choices=["move", "cas"], default=None,
+                                help="move - перемещение, cas - дедупликация по содержимому")
+    for action, help_text in (("purge", "Очистить корзину"), ("policy", "Политика фоновой очистки")):
+        subparser = subparsers.add_parser(action, help=help_text, exit_on_error=False)
+        subparser.add_argument("--max-bytes", type=parse_size, default=None, help="Максимальный размер корзины")
+        subparser.add_argument("--max-age", type=parse_age, default=None, help="Максимальный возраст элемента")
+        if action == "purge":
+            subparser.add_argument("--all", action="store_true", help="Удалить все элементы")
+        else:
+            subparser.add_argument("--off", action="store_true", help="Отключить фоновую очистку")
+    return parser
+
+
+def trash_args_parse(args: list[str]) -> dict:
+    """Парсит аргументы команды trash"""
+    try:
+        parsed_args = _trash_parser().parse_args(args)
+    except argparse.ArgumentError as e:
+        raise Exception(f"Ошибка парсинга команды trash: {e}")
+    return vars(parsed_args)
+
+
+def trash_realisation(args: dict) -> None:
+    """Основная реализация функции trash"""
+    action = args["action"]
+
+    if action == "list":
+        for entry in list_trash():
+            deleted_at = entry["deleted_at"].strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{deleted_at} {format_size(entry['size']):>8} {entry['path'].name}")
+
+    elif action == "stats":
+        entries = list_trash()
+        policy = load_policy()
+        total = sum(entry["size"] for entry in entries)
+        print(f"Элементов: {len(entries)}")
+        print(f"Размер: {format_size(total)}")
+        if entries:
+            print(f"Самый старый: {entries[0]['deleted_at'].strftime('%Y-%m-%d %H:%M:%S')}")
+        print(format_policy(policy))
+        directories = [Path(directory) for directory in undo_dependences.known_trash_dirs()]
+        if cas_enabled(trash_dir()) or any(cas_root(directory).exists() for directory in directories):
+            logical = sum(entry["size"] for entry in entries if is_cas_entry(entry["path"]))
+            stored = sum(cas_stored_bytes(directory) for directory in directories)
+            print(f"Хранилище cas: {format_size(logical)} файлов занимают {format_size(stored)}")
+
+    elif action == "purge":
+        entries = list_trash()
+        if args["all"]:
+            victims = entries
+        elif args["max_bytes"] is None and args["max_age"] is None:
+            policy = load_policy()
+            victims = select_for_purge(entries, policy["max_bytes"], policy["max_age"])
+        else:
+            victims = select_for_purge(entries, args["max_bytes"], args["max_age"])
+        count, freed = purge_entries(victims)
+        print(f"Удалено элементов: {count}, освобождено: {format_size(freed)}")
+
+    elif action == "backend":
+        if args["backend"] is not None:
+            set_cas_enabled(trash_dir(), args["backend"] == "cas")
+        print(f"Хранилище корзины: {'cas' if cas_enabled(trash_dir()) else 'move'}")
+
+    elif action == "policy":
+        policy = load_policy()
+        if args["off"]:
+            policy = {"max_bytes": None, "max_age": None}
+        if args["max_bytes"] is not None:
+            policy["max_bytes"] = args["max_bytes"]
+        if args["max_age"] is not None:
+            policy["max_age"] = args["max_age"]
+        save_policy(policy)
+        print(format_policy(policy))
@@ -1,82 +1,449 @@
+import argparse
+import bz2
+import fnmatch
+import gzip
+import io
+import json
+import lzma
+import posixpath
 import shutil
+import threading
 import zipfile
 import tarfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import cache
 from pathlib import Path
 
+from src.sub_functions.chunk_store_dependences import (CHUNK_FORMAT, list_snapshot, restore_snapshot, snapshot_path,
+                                                       check_snapshot_name)
+from src.sub_functions.compression_dependences import load_index
+from src.sub_functions.incremental_dependences import is_incremental_member, apply_deletions
+
 # Здесь собраны функции, необходимые функции разархивирования, чтобы не загрязнять и так грязный main
 
-def unarchive_args_parse(args: list[str]) -> list[str]:
-    if len(args) != 2:
-        error_msg = f"Ожидается 2 аргумента (cmd, archive_name), передано {len(args)}."
-        raise ValueError(error_msg)
+# Расширение архива -> формат (названия форматов как в shutil.unpack_archive)
+ARCHIVE_FORMATS = {".zip": "zip", ".tar.gz": "gztar", ".tar.bz2": "bztar", ".tar.xz": "xztar", ".tar": "tar"}
+FORMAT_NAMES = {"gztar": "TAR.GZ", "bztar": "TAR.BZ2", "xztar": "TAR.XZ", "tar": "TAR"}
+
+@cache
+def _unarchive_parser(cmd: str) -> argparse.ArgumentParser:
+    """Парсер опций команды распаковки (строится один раз для каждой команды, при первом вызове)"""
+    parser = argparse.ArgumentParser(prog=cmd, exit_on_error=False, add_help=False)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-l", "--list", action="store_true")
+    parser.add_argument("-m", "--member", action="append", default=None)
+    parser.add_argument("--repo", type=Path, default=None)
+    return parser
 
-    cmd, arch_name = args
 
-    if arch_name.startswith("'") and arch_name.endswith("'"):
-        arch_name = arch_name[1:-1]
+def unarchive_options_parse(cmd: str, args: list[str]) -> tuple[dict, list[str]]:
+    """Отделяет опции команды от позиционных аргументов"""
+    try:
+        options, positional = _unarchive_parser(cmd).parse_known_args(args)
+    except argparse.ArgumentError as e:
+        raise ValueError(f"Ошибка парсинга команды {cmd}: {e}")
+    # Список по умолчанию не хранится в общем парсере - у каждого вызова свой
+    options.member = options.member or []
+
+    if options.jobs < 1:
+        raise ValueError("Число потоков -j должно быть положительным")
+    if options.jobs > 1 and cmd != "unzip":
+        raise ValueError("Параллельная распаковка (-j) поддерживается только для unzip")
+    if options.jobs > 1 and options.repo is not None:
+        raise ValueError("Параллельная распаковка (-j) не поддерживается для хранилища фрагментов")
+    return vars(options), positional
+
 
+def _detect_format(cmd: str, arch_name: str) -> tuple[str, str]:
+    """Проверяет архив и определяет его формат по расширению. Возвращает (формат, расширение)"""
     # Проверяем, что архив существует (это файл, а не директория)
     if not Path(arch_name).is_file():
         error_msg = f"Архив {arch_name} не существует."
         raise FileNotFoundError(error_msg)
 
     # Определяем формат архива на основе расширения
-    if arch_name.endswith('.zip'):
-        detected_format = 'zip'
-    elif arch_name.endswith('.tar.gz'):
-        detected_format = 'gztar'
-    else:
-        error_msg = f"Неподдерживаемый формат архива: {arch_name}. Поддерживаются .zip и .tar.gz"
+    extension = next((extension for extension in ARCHIVE_FORMATS if arch_name.endswith(extension)), None)
+    if extension is None:
+        error_msg = (f"Неподдерживаемый формат архива: {arch_name}. "
+                     f"Поддерживаются {', '.join(ARCHIVE_FORMATS)}")
         raise ValueError(error_msg)
+    detected_format = ARCHIVE_FORMATS[extension]
 
     # Проверяем соответствие команды и формата архива
     if cmd == "unzip" and detected_format != 'zip':
         error_msg = f"Команда unzip ожидает архив с расширением .zip, получен: {arch_name}"
         raise ValueError(error_msg)
 
-    if cmd == "untar" and detected_format != 'gztar':
-        error_msg = f"Команда untar ожидает архив с расширением .tar.gz, получен: {arch_name}"
+    if cmd == "untar" and detected_format == 'zip':
+        error_msg = (f"Команда untar ожидает архив с расширением .tar.gz, .tar.bz2, .tar.xz или .tar, "
+                     f"получен: {arch_name}")
         raise ValueError(error_msg)
 
-    # Создаем имя папки для распаковки (без расширения)
-    archive_stem = Path(arch_name).stem
-    # Для tar.gz нужно убрать еще .tar из имени
-    if detected_format == 'gztar' and archive_stem.endswith('.tar'):
-        archive_stem = archive_stem[:-4]  # Убираем .tar
+    return detected_format, extension
+
+
+def unarchive_args_parse(args: list[str]) -> list[str]:
+    """Разбирает команду распаковки: [cmd, архив, формат, каталог распаковки] (опции - unarchive_command_parse)"""
+    return unarchive_command_parse(args)[0]
+
+
+def unarchive_command_parse(args: list[str]) -> tuple[list[str], dict]:
+    """Разбирает команду распаковки: ([cmd, архив, формат, каталог распаковки], опции команды)"""
+    options, positional = unarchive_options_parse(args[0], args[1:]) if args else ({}, [])
+    args = args[:1] + positional
+    # untar принимает цепочку: базовый архив и инкременты к нему по порядку
+    if len(args) != 2 and not (len(args) > 2 and args[0] == "untar"):
+        error_msg = f"Ожидается 2 аргумента (cmd, archive_name), передано {len(args)}."
+        raise ValueError(error_msg)
+
+    cmd, arch_name, *chain_names = [arg[1:-1] if arg.startswith("'") and arg.endswith("'") else arg
+                                    for arg in args]
+
+    if options.get("repo") is not None:
+        # Снимок из хранилища фрагментов (zip/tar --repo) распаковывается в каталог с его именем
+        if chain_names:
+            raise ValueError("Из хранилища фрагментов распаковывается один снимок")
+        check_snapshot_name(arch_name)
+        if not snapshot_path(options["repo"], arch_name).is_file():
+            raise FileNotFoundError(f"Снимок {arch_name} не найден в хранилище {options['repo']}")
+        return [cmd, arch_name, CHUNK_FORMAT, arch_name], options
+
+    detected_format, extension = _detect_format(cmd, arch_name)
+    if chain_names:
+        options["chain"] = [(name, _detect_format(cmd, name)[0]) for name in chain_names]
+
+    # Создаем имя папки для распаковки (без расширения, для tar.* - вместе с .tar)
+    archive_stem = Path(arch_name).name[:-len(extension)]
 
-    return [cmd, arch_name, detected_format, archive_stem]
+    return [cmd, arch_name, detected_format, archive_stem], options
 
 
-def unarchive_realisation(args: list[str]) -> None:
+def unarchive_realisation(args: list[str], options: dict | None = None) -> None:
+    """
+    Распаковывает архив за один проход: целостность (CRC для zip, заголовки для tar)
+    проверяется во время записи файлов на диск. При ошибке частично распакованное удаляется.
+    options - опции команды из unarchive_command_parse (например, число потоков -j).
+    """
     cmd, arch_name, archive_format, extract_dir_name = args
+    options = options or {}
     try:
-        # Проверяем, является ли файл валидным архивом
-        if archive_format == 'zip':
-            try:
-                with zipfile.ZipFile(arch_name, 'r') as zip_ref:
-                    # Простая проверка целостности архива
-                    bad_file = zip_ref.testzip()
-                    if bad_file is not None:
-                        error_msg = f"Архив {arch_name} поврежден. Первый поврежденный файл: {bad_file}"
-                        raise ValueError(error_msg)
-            except zipfile.BadZipFile:
-                error_msg = f"Файл {arch_name} не является валидным ZIP-архивом"
-                raise ValueError(error_msg)
-        else:  # archive_format == 'gztar'
-            try:
-                with tarfile.open(arch_name, 'r:gz') as tar_ref:
-                    # Простая проверка целостности архива
-                    tar_ref.getmembers()
-            except tarfile.ReadError:
-                error_msg = f"Файл {arch_name} не является валидным TAR.GZ-архивом"
-                raise ValueError(error_msg)
+        if options.get("list"):
+            if archive_format == CHUNK_FORMAT:
+                _print_listing(arch_name, list_snapshot(options["repo"], arch_name,
+                                                        MemberSelector(options.get("member", []))))
+                return
+            for name, format_name in [(arch_name, archive_format)] + options.get("chain", []):
+                _print_listing(name, list_archive(name, format_name, options.get("member", [])))
+            return
 
-        # Создаем папку для распаковки
+        # Создаем папку для распаковки и запоминаем, что в ней было до нас
         extract_path = Path("") / extract_dir_name
+        created = not extract_path.exists()
         extract_path.mkdir(exist_ok=True)
+        existing = set() if created else set(extract_path.iterdir())
 
-        # Распаковываем архив в созданную папку
-        shutil.unpack_archive(arch_name, extract_path, archive_format)
+        # Выбор файлов по пути или шаблону (-m): распаковываются только они
+        selector = MemberSelector(options.get("member", []))
+        try:
+            if archive_format == CHUNK_FORMAT:
+                restore_snapshot(options["repo"], arch_name, extract_path, selector)
+            elif archive_format == 'zip' and options.get("jobs", 1) > 1:
+                _extract_zip_parallel(arch_name, extract_path, options["jobs"], selector)
+            elif archive_format == 'zip':
+                _extract_zip(arch_name, extract_path, selector)
+            else:  # tar, gztar, bztar, xztar
+                _extract_tar_chain(arch_name, extract_path, archive_format, options.get("chain", []), selector)
+            selector.check_all_matched(arch_name)
+        except Exception:
+            _remove_partial_output(extract_path, created, existing)
+            raise
 
     except Exception as e:
         raise e
+
+
+def normalize_member_name(name: str) -> str:
+    """Имя члена архива без ./ в начале и / в конце"""
+    return posixpath.normpath(name.rstrip("/")) if name.strip("/.") else "."
+
+
+class MemberSelector:
+    """
+    Выбор членов архива по путям и шаблонам (fnmatch). Путь каталога выбирает и все его содержимое.
+    Без шаблонов выбирается все. Запоминает, каким шаблонам нашлись файлы.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = [normalize_member_name(pattern) for pattern in patterns]
+        self.matched: set[str] = set()
+
+    def __call__(self, name: str) -> bool:
+        if not self.patterns:
+            return True
+        parts = normalize_member_name(name).split("/")
+        prefixes = ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+        found = False
+        for pattern in self.patterns:
+            if any(fnmatch.fnmatchcase(prefix, pattern) for prefix in prefixes):
+                self.matched.add(pattern)
+                found = True
+        return found
+
+    def check_all_matched(self, arch_name: str) -> None:
+        missing = [pattern for pattern in self.patterns if pattern not in self.matched]
+        if missing:
+            raise ValueError(f"В архиве {arch_name} нет файлов, подходящих под: {', '.join(missing)}")
+
+
+def list_archive(arch_name: str, archive_format: str, patterns: list[str] | None = None) -> list[dict]:
+    """
+    Содержимое архива без распаковки: для zip читается только центральный каталог,
+    для tar - только заголовки (данные файлов пропускаются через seek).
+    """
+    selector = MemberSelector(patterns or [])
+    entries = []
+    if archive_format == 'zip':
+        try:
+            with zipfile.ZipFile(arch_name, 'r') as zip_ref:
+                for info in zip_ref.infolist():
+                    if selector(info.filename):
+                        entries.append({"name": info.filename, "size": info.file_size,
+                                        "mtime": datetime(*info.date_time), "is_dir": info.is_dir()})
+        except zipfile.BadZipFile:
+            raise ValueError(f"Файл {arch_name} не является валидным ZIP-архивом")
+        return entries
+
+    with _open_tar_stream(arch_name, archive_format) as stream:
+        try:
+            # Режим с произвольным доступом: tarfile переходит к следующему заголовку через seek
+            with tarfile.open(fileobj=stream, mode='r:') as tar_ref:
+                for member in tar_ref:
+                    if not is_incremental_member(member.name) and selector(member.name):
+                        entries.append({"name": member.name, "size": member.size,
+                                        "mtime": datetime.fromtimestamp(member.mtime), "is_dir": member.isdir()})
+        except (tarfile.TarError, OSError, EOFError, lzma.LZMAError) as e:
+            raise ValueError(f"Файл {arch_name} не является валидным {FORMAT_NAMES[archive_format]}-архивом: {e}")
+    return entries
+
+
+def _open_tar_stream(arch_name: str, archive_format: str) -> io.BufferedIOBase:
+    """Открывает сжатый поток tar архива (модули сжатия читают и файлы из нескольких сжатых членов)"""
+    if archive_format == "gztar":
+        return gzip.open(arch_name, "rb")
+    if archive_format == "bztar":
+        return bz2.open(arch_name, "rb")
+    if archive_format == "xztar":
+        return lzma.open(arch_name, "rb")
+    return open(arch_name, "rb")
+
+
+def _print_listing(arch_name: str, entries: list[dict]) -> None:
+    """Выводит содержимое архива в формате unzip -l"""
+    print(f"Архив: {arch_name}")
+    for entry in entries:
+        print(f"{entry['size']:>12}  {entry['mtime'].strftime('%Y-%m-%d %H:%M')}  {entry['name']}")
+    total = sum(entry["size"] for entry in entries)
+    print(f"{total:>12}  {len(entries)} файлов")
+
+
+def _extract_zip(arch_name: str, extract_path: Path, selector: MemberSelector | None = None) -> None:
+    """Потоково распаковывает zip, CRC каждого файла проверяется при чтении"""
+    try:
+        with zipfile.ZipFile(arch_name, 'r') as zip_ref:
+            for member in zip_ref.infolist():
+                if selector is not None and not selector(member.filename):
+                    continue
+                try:
+                    zip_ref.extract(member, extract_path)
+                except (zipfile.BadZipFile, zlib.error, EOFError):
+                    error_msg = f"Архив {arch_name} поврежден. Первый поврежденный файл: {member.filename}"
+                    raise ValueError(error_msg)
+    except zipfile.BadZipFile:
+        error_msg = f"Файл {arch_name} не является валидным ZIP-архивом"
+        raise ValueError(error_msg)
+
+
+def _member_target(extract_path: Path, member: zipfile.ZipInfo) -> Path:
+    """Путь, по которому zipfile.extract положит файл (с тем же отбрасыванием '..' и корня)"""
+    parts = [part for part in member.filename.split('/') if part not in ('', '.', '..')]
+    return extract_path.joinpath(*parts)
+
+
+def schedule_members(members: list[zipfile.ZipInfo], jobs: int) -> list[list[zipfile.ZipInfo]]:
+    """
+    Делит файлы между потоками: сначала самые большие, каждый - наименее загруженному потоку (LPT),
+    чтобы потоки заканчивали примерно одновременно.
+    """
+    groups: list[list[zipfile.ZipInfo]] = [[] for _ in range(jobs)]
+    loads = [0] * jobs
+    for member in sorted(members, key=lambda info: info.file_size, reverse=True):
+        worker = loads.index(min(loads))
+        groups[worker].append(member)
+        loads[worker] += member.file_size
+    return [group for group in groups if group]
+
+
+def _extract_zip_parallel(arch_name: str, extract_path: Path, jobs: int,
+                          selector: MemberSelector | None = None) -> None:
+    """Распаковывает zip в jobs потоков: каждый поток открывает архив сам и распаковывает свою часть файлов"""
+    try:
+        with zipfile.ZipFile(arch_name, 'r') as zip_ref:
+            members = [member for member in zip_ref.infolist() if selector is None or selector(member.filename)]
+    except zipfile.BadZipFile:
+        error_msg = f"Файл {arch_name} не является валидным ZIP-архивом"
+        raise ValueError(error_msg)
+
+    # Каталоги создаются заранее, чтобы потоки не создавали одни и те же каталоги одновременно
+    files = []
+    for member in members:
+        if member.is_dir():
+            _member_target(extract_path, member).mkdir(parents=True, exist_ok=True)
+        else:
+            _member_target(extract_path, member).parent.mkdir(parents=True, exist_ok=True)
+            files.append(member)
+
+    failed = threading.Event()
+
+    def extract_group(group: list[zipfile.ZipInfo]) -> None:
+        # zlib и crc32 отпускают GIL, поэтому потоки распаковывают действительно параллельно
+        with zipfile.ZipFile(arch_name, 'r') as zip_ref:
+            for member in group:
+                if failed.is_set():
+                    return
+                try:
+                    zip_ref.extract(member, extract_path)
+                except (zipfile.BadZipFile, zlib.error, EOFError):
+                    failed.set()
+                    error_msg = f"Архив {arch_name} поврежден. Первый поврежденный файл: {member.filename}"
+                    raise ValueError(error_msg)
+                except Exception:
+                    failed.set()
+                    raise
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(extract_group, group) for group in schedule_members(files, jobs)]
+    for future in futures:
+        future.result()
+
+
+def _extract_tar_chain(arch_name: str, extract_path: Path, archive_format: str,
+                       chain: list[tuple[str, str]], selector: MemberSelector | None = None) -> None:
+    """Распаковывает базовый архив и по порядку применяет к нему инкременты (измененные файлы и удаления)"""
+    # Отдельные файлы из tar.gz с индексом (tar --index) распаковываются без чтения архива с начала
+    if not chain and archive_format == 'gztar' and selector is not None and selector.patterns:
+        index = load_index(Path(arch_name))
+        if index is not None and _extract_tar_indexed(arch_name, extract_path, index, selector):
+            return
+
+    incremental = _extract_tar(arch_name, extract_path, archive_format, selector=selector)
+    for chain_name, chain_format in chain:
+        # Для инкрементов _extract_tar сам проверяет описание, без него может быть только база цепочки
+        if incremental is None:
+            raise ValueError(f"Архив {arch_name} создан без манифеста (--manifest) и не может быть базой цепочки")
+        incremental = _extract_tar(chain_name, extract_path, chain_format, expected_base=incremental["id"],
+                                   selector=selector)
+
+
+def _extract_tar(arch_name: str, extract_path: Path, archive_format: str = 'gztar',
+                 expected_base: str | None = None, selector: MemberSelector | None = None) -> dict | None:
+    """
+    Распаковывает tar архив в потоковом режиме: архив читается и распаковывается один раз.
+    Возвращает описание инкремента (.incremental.json), если архив создан с манифестом.
+    expected_base - id архива, к которому должен относиться этот инкремент.
+    """
+    format_name = FORMAT_NAMES[archive_format]
+    incremental = None
+    # Модули сжатия (в отличие от режимов r|gz, r|bz2) читают и архивы из нескольких сжатых членов, как у tar -j
+    with _open_tar_stream(arch_name, archive_format) as stream:
+        try:
+            tar_ref = tarfile.open(fileobj=stream, mode='r|')
+        except (tarfile.ReadError, OSError, EOFError, lzma.LZMAError):
+            error_msg = f"Файл {arch_name} не является валидным {format_name}-архивом"
+            raise ValueError(error_msg)
+
+        with tar_ref:
+            try:
+                # Заголовки (с контрольной суммой) читаются по мере продвижения по архиву
+                for member in tar_ref:
+                    if is_incremental_member(member.name):
+                        incremental = _read_incremental(tar_ref, member)
+                        _check_chain(arch_name, incremental, expected_base)
+                        apply_deletions(extract_path, incremental["deleted"])
+                        continue
+                    if expected_base is not None and incremental is None:
+                        _check_chain(arch_name, incremental, expected_base)
+                    if selector is not None and not selector(member.name):
+                        continue
+                    tar_ref.extract(member, extract_path, filter='data')
+            except (tarfile.TarError, OSError, zlib.error, EOFError, lzma.LZMAError) as e:
+                error_msg = f"Архив {arch_name} поврежден: {e}"
+                raise ValueError(error_msg)
+
+    if expected_base is not None and incremental is None:
+        _check_chain(arch_name, incremental, expected_base)
+    return incremental
+
+
+def _read_incremental(tar_ref: tarfile.TarFile, member: tarfile.TarInfo) -> dict:
+    """Читает описание инкремента (.incremental.json) из архива"""
+    stream = tar_ref.extractfile(member)
+    if stream is None:
+        raise tarfile.TarError(f"{member.name} не является файлом")
+    return json.loads(stream.read())
+
+
+def _extract_tar_indexed(arch_name: str, extract_path: Path, index: dict, selector: MemberSelector) -> bool:
+    """
+    Распаковывает выбранные файлы tar.gz по индексу: архив состоит из независимых gzip-блоков,
+    поэтому чтение начинается с блока, в котором лежит заголовок файла, и распаковывается только он.
+    Возвращает False, если по индексу распаковать нельзя (выбрана жесткая ссылка) - тогда архив читается целиком.
+    """
+    selected = [(offset, name) for name, offset in index["members"].items()
+                if is_incremental_member(name) or selector(name)]
+    if any(offset is None for offset, _ in selected):
+        return False
+
+    block_size = index["block_size"]
+    with open(arch_name, 'rb') as raw:
+        for offset, name in sorted(selected):
+            block = offset // block_size
+            raw.seek(index["blocks"][block])
+            try:
+                with gzip.GzipFile(fileobj=raw, mode='rb') as stream:
+                    stream.seek(offset - block * block_size)
+                    with tarfile.open(fileobj=stream, mode='r|') as tar_ref:
+                        member = tar_ref.next()
+                        if member is None or member.name != name:
+                            raise ValueError(f"Индекс архива {arch_name} не соответствует его содержимому")
+                        if is_incremental_member(name):
+                            apply_deletions(extract_path, _read_incremental(tar_ref, member)["deleted"])
+                        else:
+                            tar_ref.extract(member, extract_path, filter='data')
+            except (tarfile.TarError, OSError, zlib.error, EOFError, IndexError) as e:
+                error_msg = f"Архив {arch_name} поврежден: {e}"
+                raise ValueError(error_msg)
+    return True
+
+
+def _check_chain(arch_name: str, incremental: dict | None, expected_base: str | None) -> None:
+    """Проверяет, что инкремент продолжает цепочку: он сделан относительно предыдущего архива"""
+    if expected_base is None:
+        return
+    if incremental is None:
+        raise ValueError(f"Архив {arch_name} не является инкрементом (создан без --since)")
+    if incremental["base"] != expected_base:
+        raise ValueError(f"Архив {arch_name} сделан не относительно предыдущего архива цепочки")
+
+
+def _remove_partial_output(extract_path: Path, created: bool, existing: set[Path]) -> None:
+    """Удаляет то, что успело распаковаться до ошибки (файлы, бывшие в папке раньше, не трогаются)"""
+    if created:
+        shutil.rmtree(extract_path, ignore_errors=True)
+        return
+    for path in set(extract_path.iterdir()) - existing:
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
@@ -1,31 +1,121 @@
 import argparse
+import errno
 import logging
+import os
 import shutil
+import stat
 from pathlib import Path
 from datetime import datetime
-from src.sub_functions.history_dependences import add_to_history, save_history as save_hist, read_history as read_hist
+from functools import cache
+from src.sub_functions.history_dependences import (add_to_history, history_lock, history_is_empty, read_undo_stack,
+                                                  mark_undone, drop_undo_entries, push_redo_entries, read_redo_stack,
+                                                  drop_redo_entries, restore_undo_entry, SESSION_ID)
+from src.sub_functions.jobs_dependences import JobCancelled, check_cancelled
+from src.sub_functions.cas_trash_dependences import (cas_enabled, cas_entries_dir, cas_restore, cas_store,
+                                                     is_cas_entry)
 
 # Здесь собраны функции, необходимые основным функциям - undo, чтобы не загрязнять и так грязный main
 
 # Константы
 HISTORY_FILE = ".history"
 TRASH_DIR = ".trash"
+# Список корзин на других файловых системах (хранится в основной корзине), чтобы trash видел их все
+TRASH_MOUNTS_FILE = ".mounts"
 
+# st_dev -> каталог корзины на этой файловой системе (None - основная корзина)
+_trash_dirs: dict[int, Path | None] = {}
 
-def init_trash() -> None:
-    """Инициализирует папку для корзины"""
+
+def init_trash(base_dir: str | None = None) -> None:
+    """Инициализирует папку для корзины. base_dir - каталог запуска (по умолчанию текущий)"""
+    global TRASH_DIR
     try:
-        trash_path = Path(TRASH_DIR).absolute()
+        # Корзина закрепляется за каталогом запуска и не зависит от последующих cd
+        trash_path = (Path(base_dir) / TRASH_DIR if base_dir is not None else Path(TRASH_DIR)).absolute()
         trash_path.mkdir(exist_ok=True)
+        TRASH_DIR = str(trash_path)
     except Exception as e:
         raise e
 
 
-def undo_args_parse(args: list[str]) -> dict[str, int]:
-    """Парсит аргументы команды undo"""
+def mount_top(path: Path, device: int) -> Path:
+    """Находит корень файловой системы, на которой лежит path: поднимается по каталогам, пока не сменится st_dev"""
+    top = path.absolute().parent
+    while top.parent != top and os.stat(top.parent).st_dev == device:
+        top = top.parent
+    return top
+
+
+def trash_dir_for(path: Path) -> Path:
+    """
+    Возвращает корзину на той же файловой системе, что и path, чтобы перемещение в нее было переименованием.
+    Для чужих файловых систем используется XDG-каталог <корень>/.Trash-<uid>/files, при неудаче - основная корзина.
+    """
+    default_dir = Path(TRASH_DIR).absolute()
+    try:
+        device = os.lstat(path).st_dev
+    except OSError:
+        return default_dir
+
+    if device not in _trash_dirs:
+        _trash_dirs[device] = None
+        get_uid = getattr(os, "getuid", None)
+        try:
+            if get_uid is not None and os.stat(default_dir).st_dev != device:
+                mount_trash = mount_top(path, device) / f".Trash-{get_uid()}" / "files"
+                mount_trash.mkdir(mode=0o700, parents=True, exist_ok=True)
+                register_trash_dir(mount_trash)
+                _trash_dirs[device] = mount_trash
+        except OSError as e:
+            logging.warning(f"Не удалось создать корзину на файловой системе {path}: {e}")
+
+    # None - файл на той же файловой системе, что и основная корзина
+    return _trash_dirs[device] or default_dir
+
+
+def register_trash_dir(trash_path: Path) -> None:
+    """Запоминает корзину на другой файловой системе в списке основной корзины"""
+    mounts_file = Path(TRASH_DIR).absolute() / TRASH_MOUNTS_FILE
+    with history_lock():
+        if str(trash_path) not in known_trash_dirs():
+            mounts_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(mounts_file, 'a', encoding='utf-8') as f:
+                f.write(f"{trash_path}\n")
+
+
+def known_trash_dirs() -> list[str]:
+    """Основная корзина и все известные корзины на других файловых системах"""
+    default_dir = Path(TRASH_DIR).absolute()
+    dirs = [str(default_dir)]
+    mounts_file = default_dir / TRASH_MOUNTS_FILE
+    if mounts_file.exists():
+        with open(mounts_file, 'r', encoding='utf-8') as f:
+            dirs.extend(line.strip() for line in f if line.strip() and line.strip() not in dirs)
+    return dirs
+
+
+def make_trash_path(path: Path) -> Path:
+    """Возвращает уникальный путь в корзине (на той же файловой системе) для элемента path"""
+    # Сессия в имени исключает коллизии между параллельными shell
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    trash_dir = trash_dir_for(path)
+    name = f"{timestamp}_{SESSION_ID}_{path.name}"
+    # Обычные файлы при включенном хранилище дедуплицируются, каталоги и ссылки перемещаются как есть
+    if cas_enabled(Path(TRASH_DIR).absolute()):
+        try:
+            if stat.S_ISREG(os.lstat(path).st_mode):
+                return cas_entries_dir(trash_dir) / name
+        except OSError:
+            pass
+    return trash_dir / name
+
+
+@cache
+def _undo_parser(prog: str) -> argparse.ArgumentParser:
+    """Парсер команды undo или redo (строится один раз для каждой, при первом вызове)"""
     parser = argparse.ArgumentParser(
-        prog="undo",
-        description="Отменяет step предыдущих команд cp, mv, rm.",
+        prog=prog,
+        description=f"{'Отменяет' if prog == 'undo' else 'Повторяет отмененные'} step предыдущих команд cp, mv, rm.",
         exit_on_error=False
     )
     parser.add_argument(
@@ -35,185 +125,210 @@ def undo_args_parse(args: list[str]) -> dict[str, int]:
         type=int,
         help="Количество последних команд для отмены"
     )
+    return parser
+
 
+def undo_args_parse(args: list[str], prog: str = "undo") -> dict[str, int]:
+    """Парсит аргументы команды undo (и redo - у них одинаковый синтаксис)"""
     try:
-        parsed_args = parser.parse_args(args)
+        parsed_args = _undo_parser(prog).parse_args(args)
         return {"steps": parsed_args.step}
     except SystemExit:
-        raise Exception("Ошибка парсинга команды undo: неверный аргумент")
-
-
-def read_history() -> list:
-    """Читает историю команд из файла"""
-    return read_hist()
-
-
-def save_history(history: list) -> None:
-    """Сохраняет историю команд"""
-    save_hist(history)
+        raise Exception(f"Ошибка парсинга команды {prog}: неверный аргумент")
 
 
 def undo_realisation(args: dict[str, int]) -> None:
-    """Основная реализация функции undo"""
+    """
+    Основная реализация функции undo.
+    Отмена транзакционная: сначала строятся и одним проходом проверяются все шаги, затем они выполняются,
+    а при ошибке уже выполненные шаги откатываются - история и файловая система не расходятся.
+    """
     try:
         steps = args["steps"]
 
-        # Читаем историю
-        history = read_history()
-
-        if not history:
-            info_msg = "История команд пуста - нечего отменять"
-            raise Exception(info_msg)
-
-        # Ищем последние команды cp, mv, rm для отмены
-        undoable_commands = []
-        for record in reversed(history):
-            if record["command"] in ["cp", "mv", "rm"] and record.get("undo_data"):
-                undoable_commands.append(record)
-            if len(undoable_commands) >= steps:
-                break
-
-        if not undoable_commands:
-            error_msg = "Нет команд для отмены (поддерживаются только cp, mv, rm)"
-            raise Exception(error_msg)
-
-        if len(undoable_commands) < steps:
-            error_msg = f"Недостаточно команд для отмены (найдено {len(undoable_commands)}, требуется {steps})"
-            raise Exception(error_msg)
-
-        # Отменяем команды
-        success_count = 0
-        for record in undoable_commands:
-            success = undo_command(record)
-            if success:
-                success_count += 1
-
-        # Удаляем отмененные команды из истории
-        if success_count > 0:
-            remaining_history = [r for r in history if r not in undoable_commands]
-            save_history(remaining_history)
+        # Весь цикл чтение-отмена-пометка выполняется под блокировкой, чтобы параллельные сессии не теряли записи
+        with history_lock():
+            if history_is_empty():
+                info_msg = "История команд пуста - нечего отменять"
+                raise Exception(info_msg)
+
+            # Берем из стека undo последние команды cp, mv, rm текущей сессии - читаются только steps записей
+            undoable_commands = read_undo_stack(steps)
+
+            if not undoable_commands:
+                error_msg = "Нет команд для отмены (поддерживаются только cp, mv, rm текущей сессии)"
+                raise Exception(error_msg)
+
+            if len(undoable_commands) < steps:
+                error_msg = f"Недостаточно команд для отмены (найдено {len(undoable_commands)}, требуется {steps})"
+                raise Exception(error_msg)
+
+            # Файлы из корзины уже удалены сборщиком мусора - сообщаем сразу, без обращений к файловой системе
+            purged_commands = [record for record in undoable_commands if record.get("purged")]
+            if purged_commands:
+                drop_undo_entries(purged_commands)
+                paths = ", ".join(record["undo_data"].get("path", "") for record in purged_commands)
+                raise Exception(f"Нельзя отменить удаление {paths}: файлы уже удалены из корзины")
+
+            plans = [plan_undo(record) for record in undoable_commands]
+            run_transaction([step for plan in plans for step in plan])
+
+            # Помечаем отмененные команды прямо в истории, не переписывая файл, и запоминаем их для redo
+            mark_undone(undoable_commands)
+            push_redo_entries([
+                {
+                    "offset": record["offset"],
+                    "length": record["length"],
+                    "timestamp": record["timestamp"],
+                    "steps": [[str(source), str(target)] for source, target in plan],
+                }
+                for record, plan in zip(undoable_commands, plans)
+            ])
 
     except Exception as e:
         raise e
 
 
-def undo_command(record: dict) -> bool:
-    """Отменяет конкретную команду"""
-    command = record["command"]
+def redo_realisation(args: dict[str, int]) -> None:
+    """Повторяет последние отмененные через undo команды текущей сессии"""
     try:
-        undo_data = record.get("undo_data", {})
-
-        if command == "cp":
-            return undo_cp(undo_data)
-        elif command == "mv":
-            return undo_mv(undo_data)
-        elif command == "rm":
-            return undo_rm(undo_data)
-        else:
-            return False
+        steps = args["steps"]
 
-    except Exception as e:
-        logging.error(f"Ошибка при отмене команды {command}: {e}")
-        return False
+        with history_lock():
+            entries = read_redo_stack(steps)
 
+            if not entries:
+                raise Exception("Нет отмененных команд для повтора")
 
-def undo_cp(undo_data: dict) -> bool:
-    """Отменяет команду cp удалением скопированного файла"""
-    try:
-        src_path = Path(undo_data.get("src", ""))
-        dst_path = Path(undo_data.get("dst", ""))
+            if len(entries) < steps:
+                error_msg = f"Недостаточно команд для повтора (найдено {len(entries)}, требуется {steps})"
+                raise Exception(error_msg)
 
-        if not dst_path.exists():
-            return False
+            # Повтор - это шаги отмены в обратную сторону и в обратном порядке
+            redo_steps = [
+                (Path(target), Path(source))
+                for entry in entries
+                for source, target in reversed(entry["steps"])
+            ]
+            run_transaction(redo_steps)
 
-        # Если dst является директорией, то нужно удалить файл внутри неё с именем исходного файла
-        if dst_path.is_dir():
-            # Определяем имя исходного файла
-            original_filename = src_path.name
-            # Формируем полный путь к скопированному файлу
-            copied_file_path = dst_path / original_filename
-
-            if copied_file_path.exists():
-                copied_file_path.unlink()
-                return True
-            else:
-                return False
-        else:
-            # Если dst является файлом, просто удаляем его
-            dst_path.unlink()
-            return True
+            drop_redo_entries(entries)
+            for entry in entries:
+                if not restore_undo_entry(entry["offset"], entry["length"], entry["timestamp"]):
+                    logging.warning(f"Запись истории {entry['timestamp']} уже удалена - повтор нельзя будет отменить")
 
     except Exception as e:
-        logging.error(f"Ошибка при отмене cp: {e}")
-        return False
-
-
-def undo_mv(undo_data: dict) -> bool:
-    """Отменяет команду mv - возвращает файл на исходное место"""
-    try:
-        src_path_str = undo_data.get("src", "")
-        dst_path_str = undo_data.get("dst", "")
-
-        if not src_path_str or not dst_path_str:
-            return False
-
-        src_path = Path(src_path_str)
-        dst_path = Path(dst_path_str)
-
-        # Проверяем существование перемещенного файла
-        if not dst_path.exists():
-            return False
+        raise e
 
-        # Проверяем существование исходной директории
-        if not src_path.parent.exists():
-            return False
 
-        # Если исходный файл уже существует, спрашиваем пользователя
-        if src_path.exists():
-            response = input(f"Файл {src_path} уже существует. Перезаписать? (y/n): ")
-            if response.lower() != 'y':
-                return False
+def plan_undo(record: dict) -> list[tuple[Path, Path]]:
+    """Строит шаги отмены команды - список переименований (откуда, куда)"""
+    command = record["command"]
+    undo_data = record.get("undo_data", {})
+
+    if command == "cp":
+        return plan_undo_cp(undo_data)
+    elif command == "mv":
+        return plan_undo_mv(undo_data)
+    elif command == "rm":
+        return plan_undo_rm(undo_data)
+    else:
+        raise ValueError(f"Команда {command} не поддерживает отмену")
+
+
+def plan_undo_cp(undo_data: dict) -> list[tuple[Path, Path]]:
+    """Отмена cp - копия уходит в корзину (а не удаляется), чтобы ее можно было вернуть при откате или redo"""
+    dst_path_str = undo_data.get("dst", "")
+    if not dst_path_str:
+        raise ValueError("Нет данных для отмены cp")
+
+    copied_path = Path(dst_path_str)
+    return [(copied_path, make_trash_path(copied_path))]
+
+
+def plan_undo_mv(undo_data: dict) -> list[tuple[Path, Path]]:
+    """Отмена mv - файл возвращается на исходное место"""
+    src_path_str = undo_data.get("src", "")
+    dst_path_str = undo_data.get("dst", "")
+    if not src_path_str or not dst_path_str:
+        raise ValueError("Нет данных для отмены mv")
+
+    return [(Path(dst_path_str), Path(src_path_str))]
+
+
+def plan_undo_rm(undo_data: dict) -> list[tuple[Path, Path]]:
+    """Отмена rm - файл восстанавливается из корзины"""
+    original_path = undo_data.get("path")
+    trash_path = undo_data.get("trash_path")
+    if not original_path or not trash_path:
+        raise ValueError("Нет данных для отмены rm")
+
+    return [(Path(trash_path), Path(original_path))]
+
+
+def validate_steps(steps: list[tuple[Path, Path]]) -> None:
+    """
+    Проверяет все шаги до выполнения: один stat на каждый затронутый путь,
+    дальше выполнение шагов моделируется в памяти (шаг может зависеть от предыдущего).
+    """
+    paths = {path for step in steps for path in step}
+    existing = {path for path in paths if os.path.lexists(path)}
+
+    errors = []
+    for source, target in steps:
+        if source not in existing:
+            errors.append(f"{source} не существует")
+        elif target in existing:
+            errors.append(f"{target} уже существует")
+        else:
+            existing.discard(source)
+            existing.add(target)
 
-        # Перемещаем файл обратно
-        shutil.move(str(dst_path), str(src_path))
+    if errors:
+        raise Exception(f"Отмена невозможна: {'; '.join(errors)}")
 
-        # Проверяем результат
-        return src_path.exists() and not dst_path.exists()
 
-    except Exception as e:
-        logging.error(f"Ошибка при отмене mv: {e}")
-        return False
+def move_path(source: Path, target: Path) -> None:
+    """Переименование в пределах файловой системы, копирование - только если пути на разных устройствах"""
+    # Элементы дедуплицирующего хранилища кладутся и достаются через него
+    if is_cas_entry(target):
+        cas_store(source, target)
+        return
+    if is_cas_entry(source):
+        cas_restore(source, target)
+        return
 
-
-def undo_rm(undo_data: dict) -> bool:
-    """Отменяет команду rm - восстанавливает файл из корзины"""
+    target.parent.mkdir(parents=True, exist_ok=True)
     try:
-        original_path = undo_data.get("path")
-        trash_path = undo_data.get("trash_path")
-        # Проверки на None и тип
-        if not original_path or not trash_path:
-            return False
+        os.rename(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise e
+        shutil.move(str(source), str(target))
 
-        if not isinstance(original_path, str) or not isinstance(trash_path, str):
-            return False
 
-        trash_file = Path(trash_path)
-        original_file = Path(original_path)
+def run_transaction(steps: list[tuple[Path, Path]]) -> None:
+    """Проверяет и выполняет шаги по порядку; при ошибке откатывает уже выполненные шаги и пробрасывает ошибку"""
+    validate_steps(steps)
 
-        # Создаем родительские директории, если нужно
-        original_file.parent.mkdir(parents=True, exist_ok=True)
+    done: list[tuple[Path, Path]] = []
+    try:
+        for source, target in steps:
+            move_path(source, target)
+            done.append((source, target))
+    except Exception as e:
+        for source, target in reversed(done):
+            try:
+                move_path(target, source)
+            except Exception as rollback_error:
+                logging.error(f"Не удалось откатить {target} -> {source}: {rollback_error}")
+        raise Exception(f"Ошибка при выполнении {source} -> {target}: {e}. Выполненные шаги откатаны")
 
-        # Восстанавливаем файл
-        shutil.move(str(trash_file), str(original_file))
 
-        # Проверяем успешность восстановления
-        if original_file.exists():
-            return True
-        else:
-            return False
+def _copy_file_checked(src: str, dst: str) -> str:
+    check_cancelled()
+    return shutil.copy2(src, dst)
 
-    except Exception as e:
-        raise e
 
 def cp_with_history(src: str, dst: str) -> None:
     """Копирование с записью в историю"""
@@ -231,13 +346,18 @@ def cp_with_history(src: str, dst: str) -> None:
                 shutil.copy2(src, dst)
                 actual_dst = dst
         else:
-            shutil.copytree(src, dst)
+            try:
+                # Точка прерывания фоновой задачи (kill) перед каждым файлом; недокопированный каталог удаляется
+                shutil.copytree(src, dst, copy_function=_copy_file_checked)
+            except JobCancelled:
+                shutil.rmtree(dst, ignore_errors=True)
+                raise
             actual_dst = dst
 
-        # Добавляем в историю с данными для отмены
+        # Добавляем в историю с данными для отмены (dst - фактически созданный путь)
         undo_data = {
             "src": str(src_path.absolute()),
-            "dst": actual_dst if src_path.is_file() and dst_path.is_dir() else str(dst_path.absolute())
+            "dst": os.path.abspath(actual_dst)
         }
 
         add_to_history("cp", [src, dst], undo_data)
@@ -291,17 +411,11 @@ def rm_with_history(path: str) -> None:
         # Получаем абсолютный пути
         absolute_path = path_obj.absolute()
 
-        # Проверка, что корзина существует
-        trash_dir = Path(TRASH_DIR).absolute()
-        trash_dir.mkdir(exist_ok=True)
-
-        # Создаем уникальное имя в корзине
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        trash_name = f"{timestamp}_{path_obj.name}"
-        trash_path = trash_dir / trash_name
+        # Корзина на той же файловой системе - перемещение в нее будет простым переименованием
+        trash_path = make_trash_path(absolute_path)
 
         # Перемещаем в корзину
-        shutil.move(str(absolute_path), str(trash_path))
+        move_path(absolute_path, trash_path)
 
         # Добавляем в историю с данными для отмены
         undo_data = {
@@ -1,3 +1,5 @@
+import gzip
+import io
 import os
 import sys
 import shutil
@@ -6,8 +8,14 @@ import unittest
 from unittest.mock import patch, MagicMock
 import zipfile
 import tarfile
+from pathlib import Path
 from src.sub_functions.archive_dependences import archive_args_parse, archive_realisation
-from src.sub_functions.unarchive_dependences import unarchive_args_parse, unarchive_realisation
+from src.sub_functions.compression_dependences import (write_zip, collect_zip_members, ZIP_STORED, load_index,
+                                                       index_path_for)
+from src.sub_functions.chunk_store_dependences import (iter_chunks, find_cut, store_snapshot, repo_size, GEAR,
+                                                       CUT_THRESHOLD, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE)
+from src.sub_functions.unarchive_dependences import (unarchive_args_parse, unarchive_command_parse,
+                                                    unarchive_realisation, schedule_members, list_archive)
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
@@ -126,6 +134,274 @@ class TestArchiveCommands(unittest.TestCase):
         archive_path = os.path.join(self.test_dir, 'relative_archive.zip')
         self.assertTrue(os.path.exists(archive_path))
 
+    def test_archive_args_parse_jobs(self):
+        """Тест парсинга числа процессов -j."""
+        result = archive_args_parse(['zip', '-j', '4', self.test_dir, 'archive.zip'])
+        self.assertEqual(str(result[1]), self.test_dir)
+        self.assertEqual(result[3]["jobs"], 4)
+        with self.assertRaises(ValueError):
+            archive_args_parse(['zip', '-j', '0', self.test_dir, 'archive.zip'])
+
+    def test_archive_realisation_zip_parallel(self):
+        """Тест параллельного создания ZIP архива: содержимое, права и каталоги сохраняются."""
+        source = os.path.join(self.test_dir, 'source')
+        os.makedirs(os.path.join(source, 'sub', 'empty'))
+        self._create_test_files(source, 5)
+        self._create_test_files(os.path.join(source, 'sub'), 2)
+        with open(os.path.join(source, 'random.bin'), 'wb') as f:
+            f.write(os.urandom(5000))
+        os.chmod(os.path.join(source, 'test_file_0.txt'), 0o750)
+
+        archive_realisation(['zip', '-j', '2', source, 'parallel.zip'])
+
+        archive_path = os.path.join(source, 'parallel.zip')
+        with zipfile.ZipFile(archive_path) as zipf:
+            self.assertIsNone(zipf.testzip())
+            names = zipf.namelist()
+            self.assertIn('sub/empty/', names)
+            self.assertNotIn('parallel.zip', names)
+            self.assertEqual(zipf.read('sub/test_file_1.txt'), b'Test content 1')
+            # Несжимаемые данные хранятся без сжатия
+            self.assertEqual(zipf.getinfo('random.bin').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zipf.getinfo('test_file_0.txt').external_attr >> 16 & 0o777, 0o750)
+
+    def test_archive_realisation_tar_parallel(self):
+        """Тест параллельного сжатия TAR.GZ: несколько gzip-членов читаются tarfile и untar."""
+        source = os.path.join(self.test_dir, 'source')
+        os.makedirs(os.path.join(source, 'sub'))
+        for i in range(3):
+            with open(os.path.join(source, 'sub', f'file{i}.bin'), 'wb') as f:
+                f.write(os.urandom(700000))
+
+        archive_realisation(['tar', '-j', '3', source, 'parallel.tar.gz'])
+
+        archive_path = os.path.join(source, 'parallel.tar.gz')
+        with open(archive_path, 'rb') as f:
+            # Больше одного gzip-члена: заголовок gzip встречается несколько раз
+            self.assertGreater(f.read().count(b'\x1f\x8b\x08\x00\x00\x00\x00\x00'), 1)
+        with tarfile.open(archive_path, 'r:gz') as tarf:
+            self.assertNotIn('./parallel.tar.gz', tarf.getnames())
+        unarchive_realisation(['untar', archive_path, 'gztar', 'restored'])
+        for i in range(3):
+            with open(os.path.join(source, 'sub', f'file{i}.bin'), 'rb') as original, \
+                    open(os.path.join('restored', 'sub', f'file{i}.bin'), 'rb') as restored:
+                self.assertEqual(original.read(), restored.read())
+
+    def test_archive_args_parse_tar_jobs_needs_gzip(self):
+        """Тест: -j для tar без сжатия не поддерживается."""
+        with self.assertRaises(ValueError):
+            archive_args_parse(['tar', '-j', '2', self.test_dir, 'archive.tar'])
+
+    def test_archive_formats_round_trip(self):
+        """Тест: tar, tar.gz, tar.bz2 и tar.xz создаются и распаковываются обратно."""
+        source = os.path.join(self.test_dir, 'source')
+        os.makedirs(source)
+        self._create_test_files(source, 2)
+        for extension, archive_format in (('.tar', 'tar'), ('.tar.gz', 'gztar'), ('.tar.bz2', 'bztar'),
+                                          ('.tar.xz', 'xztar')):
+            archive_path = os.path.join(self.test_dir, f'archive{extension}')
+            archive_realisation(['tar', '--level', '1', source, archive_path] if extension != '.tar'
+                                else ['tar', source, archive_path])
+            parsed = unarchive_args_parse(['untar', archive_path])
+            self.assertEqual(parsed[2:4], [archive_format, 'archive'])
+            unarchive_realisation(parsed)
+            with open(os.path.join('archive', 'test_file_1.txt')) as f:
+                self.assertEqual(f.read(), 'Test content 1')
+            shutil.rmtree('archive')
+
+    def test_archive_realisation_zip_store(self):
+        """Тест: --store сохраняет файлы zip без сжатия."""
+        self._create_test_files(self.test_dir, 2)
+        archive_realisation(['zip', '--store', self.test_dir, 'stored.zip'])
+        with zipfile.ZipFile(os.path.join(self.test_dir, 'stored.zip')) as zipf:
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in zipf.infolist()))
+            self.assertEqual(zipf.read('test_file_0.txt'), b'Test content 0')
+
+    def test_archive_realisation_zip_level_without_pool(self):
+        """Тест: zip --level без -j пишется через zipfile, без пула процессов."""
+        self._create_test_files(self.test_dir, 2)
+        with patch('src.sub_functions.compression_dependences.ProcessPoolExecutor',
+                   side_effect=AssertionError("пул процессов не нужен")):
+            archive_realisation(['zip', '--level', '1', self.test_dir, 'level.zip'])
+        with zipfile.ZipFile(os.path.join(self.test_dir, 'level.zip')) as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertNotIn('level.zip', zipf.namelist())
+            self.assertEqual(zipf.getinfo('test_file_1.txt').compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_archive_args_parse_level_validation(self):
+        """Тест проверки уровня сжатия и --store для разных форматов."""
+        self.assertEqual(archive_args_parse(['zip', '--level', '9', self.test_dir, 'a.zip'])[3]["level"], 9)
+        self.assertEqual(archive_args_parse(['tar', '--store', self.test_dir, 'a.tar.gz'])[3]["level"], 0)
+        for args in (['zip', '--level', '10', self.test_dir, 'a.zip'],
+                     ['tar', '--level', '0', self.test_dir, 'a.tar.bz2'],
+                     ['tar', '--store', self.test_dir, 'a.tar.xz'],
+                     ['tar', '--level', '3', self.test_dir, 'a.tar'],
+                     ['zip', '--store', '--level', '3', self.test_dir, 'a.zip']):
+            with self.assertRaises(ValueError):
+                archive_args_parse(args)
+
+    def _write(self, path, content):
+        """Записывает файл и сдвигает время изменения, чтобы изменение было заметно по mtime."""
+        with open(path, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+
+    def test_incremental_chain(self):
+        """Тест: инкременты содержат только изменения, untar цепочки восстанавливает последнее состояние."""
+        source = os.path.join(self.test_dir, 'source')
+        archives = os.path.join(self.test_dir, 'archives')
+        os.makedirs(os.path.join(source, 'sub'))
+        os.makedirs(archives)
+        self._write(os.path.join(source, 'keep.txt'), 'keep')
+        self._write(os.path.join(source, 'change.txt'), 'v1')
+        self._write(os.path.join(source, 'sub', 'gone.txt'), 'gone')
+        base = os.path.join(archives, 'base.tar.gz')
+        archive_realisation(['tar', '--manifest', source, base])
+
+        self._write(os.path.join(source, 'change.txt'), 'v2')
+        self._write(os.path.join(source, 'new.txt'), 'new')
+        os.remove(os.path.join(source, 'sub', 'gone.txt'))
+        os.makedirs(os.path.join(source, 'empty'))
+        inc1 = os.path.join(archives, 'inc1.tar.gz')
+        archive_realisation(['tar', '--since', base, source, inc1])
+
+        with tarfile.open(inc1) as tarf:
+            files = {name for name in tarf.getnames() if tarf.getmember(name).isfile()}
+        self.assertEqual(files, {'./.incremental.json', './change.txt', './new.txt'})
+
+        self._write(os.path.join(source, 'change.txt'), 'v3')
+        inc2 = os.path.join(archives, 'inc2.tar.xz')
+        archive_realisation(['tar', '--since', inc1, source, inc2])
+
+        unarchive_realisation(*unarchive_command_parse(['untar', base, inc1, inc2]))
+        with open(os.path.join('base', 'change.txt')) as f:
+            self.assertEqual(f.read(), 'v3')
+        self.assertTrue(os.path.exists(os.path.join('base', 'new.txt')))
+        self.assertTrue(os.path.isdir(os.path.join('base', 'empty')))
+        self.assertFalse(os.path.exists(os.path.join('base', 'sub', 'gone.txt')))
+        self.assertFalse(os.path.exists(os.path.join('base', '.incremental.json')))
+
+        # Пропущенное звено цепочки обнаруживается, частичный результат удаляется
+        shutil.rmtree('base')
+        with self.assertRaises(ValueError) as context:
+            unarchive_realisation(*unarchive_command_parse(['untar', base, inc2]))
+        self.assertIn("не относительно предыдущего архива", str(context.exception))
+        self.assertFalse(os.path.exists('base'))
+
+    def test_incremental_unchanged_tree(self):
+        """Тест: инкремент неизмененного каталога пуст, хотя архивы цепочки лежат в самом каталоге."""
+        source = os.path.join(self.test_dir, 'source')
+        os.makedirs(source)
+        self._write(os.path.join(source, 'keep.txt'), 'keep')
+        archive_realisation(['tar', '--manifest', source, 'base.tar.gz'])
+        archive_realisation(['tar', '--since', os.path.join(source, 'base.tar.gz'), source, 'inc1.tar.gz'])
+        archive_realisation(['tar', '--since', os.path.join(source, 'inc1.tar.gz'), source, 'inc2.tar.gz'])
+
+        with tarfile.open(os.path.join(source, 'base.tar.gz')) as tarf:
+            self.assertEqual(tarf.getnames(), ['./.incremental.json', './keep.txt'])
+        for name in ('inc1.tar.gz', 'inc2.tar.gz'):
+            with tarfile.open(os.path.join(source, name)) as tarf:
+                self.assertEqual(tarf.getnames(), ['./.incremental.json'])
+
+    def test_incremental_keeps_user_tar_files(self):
+        """Тест: *.tar и похожие файлы пользователя архивируются, пропускаются только архивы цепочки."""
+        source = os.path.join(self.test_dir, 'source')
+        os.makedirs(source)
+        user_files = ['notes.txt', 'vendor.tar', 'my.tarball', 'release.tar.gz.sha256', 'old.tar.gz.manifest.json']
+        for name in user_files:
+            self._write(os.path.join(source, name), name)
+        archive_realisation(['tar', '--manifest', source, 'full.tar.gz'])
+        archive_realisation(['tar', '--index', source, 'indexed.tar.gz'])
+        self._write(os.path.join(source, 'vendor.tar'), 'vendor v2')
+        archive_realisation(['tar', '--since', os.path.join(source, 'full.tar.gz'), source, 'inc.tar.gz'])
+
+        with tarfile.open(os.path.join(source, 'full.tar.gz')) as tarf:
+            self.assertEqual(sorted(tarf.getnames()), sorted(['./.incremental.json'] + [f'./{n}' for n in user_files]))
+        with tarfile.open(os.path.join(source, 'inc.tar.gz')) as tarf:
+            self.assertEqual(tarf.getnames(), ['./.incremental.json', './vendor.tar'])
+
+        unarchive_realisation(*unarchive_command_parse(['untar', os.path.join(source, 'full.tar.gz'),
+                                                        os.path.join(source, 'inc.tar.gz')]))
+        self.assertEqual(sorted(os.listdir('full')), sorted(user_files))
+        with open(os.path.join('full', 'vendor.tar')) as f:
+            self.assertEqual(f.read(), 'vendor v2')
+
+    def test_incremental_needs_manifest(self):
+        """Тест: --since без манифеста предыдущего архива - ошибка."""
+        self._create_test_files(self.test_dir, 1)
+        archive_realisation(['tar', self.test_dir, 'plain.tar'])
+        with self.assertRaises(FileNotFoundError):
+            archive_realisation(['tar', '--since', os.path.join(self.test_dir, 'plain.tar'), self.test_dir, 'b.tar'])
+
+    def test_write_zip_zip64_entry_count(self):
+        """Тест: архив с числом файлов больше 65535 записывается с концом каталога zip64."""
+        open('empty.txt', 'w').close()
+        member = collect_zip_members(self.test_dir)[0]
+        members = ({**member, "arcname": f"f{i}", "crc": 0, "size": 0, "method": ZIP_STORED, "data": b""}
+                   for i in range(70000))
+        with open('many.zip', 'wb') as out:
+            write_zip(out, members)
+        with zipfile.ZipFile('many.zip') as zipf:
+            self.assertEqual(len(zipf.infolist()), 70000)
+
+    def _archive_to_stdout(self, args):
+        """Запускает архивацию в stdout и возвращает записанные байты."""
+        stdout = io.TextIOWrapper(io.BytesIO())
+        with patch('sys.stdout', stdout):
+            archive_realisation(args)
+        return stdout.buffer.getvalue()
+
+    def test_archive_to_stdout(self):
+        """Тест: архив с именем - пишется в stdout, файл архива не создается."""
+        self._create_test_files(self.test_dir, 3)
+        data = self._archive_to_stdout(['zip', '-j', '2', self.test_dir, '-'])
+        with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+            self.assertEqual(zipf.read('test_file_2.txt'), b'Test content 2')
+
+        for args in (['tar', self.test_dir, '-'], ['tar', '--format', 'xz', '--level', '1', self.test_dir, '-'],
+                     ['tar', '--format', 'tar', self.test_dir, '-'], ['tar', '-j', '2', self.test_dir, '-']):
+            data = self._archive_to_stdout(args)
+            with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as tarf:
+                self.assertEqual(tarf.extractfile('./test_file_1.txt').read(), b'Test content 1')
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['test_file_0.txt', 'test_file_1.txt', 'test_file_2.txt'])
+
+    def test_zip_to_stdout_streamed(self):
+        """Тест: zip в stdout сжимает файлы блоками, crc и размеры пишутся в дескрипторе после данных."""
+        with open(os.path.join(self.test_dir, 'big.txt'), 'wb') as f:
+            f.write(b'line of text\n' * 5000)
+        open(os.path.join(self.test_dir, 'empty.txt'), 'w').close()
+        for level in ('6', '0'):
+            with patch('src.sub_functions.compression_dependences.ZIP_CHUNK_SIZE', 4096):
+                data = self._archive_to_stdout(['zip', '--level', level, self.test_dir, '-'])
+            with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+                self.assertIsNone(zipf.testzip())
+                info = zipf.getinfo('big.txt')
+                self.assertTrue(info.flag_bits & 0x08)
+                self.assertEqual(info.compress_type, zipfile.ZIP_STORED if level == '0' else zipfile.ZIP_DEFLATED)
+                self.assertEqual(zipf.read('big.txt'), b'line of text\n' * 5000)
+                self.assertEqual(zipf.read('empty.txt'), b'')
+
+    def test_archive_to_stdout_validation(self):
+        """Тест: в терминал архив не пишется, опции файлового архива с - не сочетаются."""
+        with patch('sys.stdout.isatty', return_value=True):
+            with self.assertRaises(ValueError):
+                archive_realisation(['tar', self.test_dir, '-'])
+        for args in (['tar', '--manifest', self.test_dir, '-'], ['tar', '--index', self.test_dir, '-'],
+                     ['tar', '--format', 'gz', self.test_dir, 'a.tar.gz'], ['tar', '--format', 'zip', self.test_dir, '-'],
+                     ['tar', '-j', '2', '--format', 'xz', self.test_dir, '-']):
+            with self.assertRaises(ValueError):
+                archive_args_parse(args)
+
+    def test_archive_to_captured_stdout(self):
+        """Тест: в перехваченный текстовый вывод (фоновая задача, конвейер) архив не пишется."""
+        from src.sub_functions.jobs_dependences import capture_stdout
+        buffer = io.StringIO()
+        with patch('sys.stdout', io.TextIOWrapper(io.BytesIO())), capture_stdout(buffer):
+            with self.assertRaises(ValueError):
+                archive_realisation(['zip', self.test_dir, '-'])
+        self.assertEqual(buffer.getvalue(), '')
+
     def test_archive_realisation_exception_handling(self):
         """Тест обработки исключений при создании архива."""
         args = ['zip', '/nonexistent/directory', 'archive.zip']
@@ -247,6 +523,13 @@ class TestUnarchiveCommands(unittest.TestCase):
             unarchive_args_parse(args)
         self.assertIn("Команда untar ожидает архив с расширением .tar.gz", str(context.exception))
 
+    def test_unarchive_args_parse_plain_tar(self):
+        """Тест: untar принимает архив .tar без сжатия."""
+        with tarfile.open('plain.tar', 'w'):
+            pass
+        result = unarchive_args_parse(['untar', 'plain.tar'])
+        self.assertEqual(result[2:4], ['tar', 'plain'])
+
     def test_unarchive_args_parse_tar_stem_calculation(self):
         """Тест правильности вычисления имени папки для tar.gz архивов."""
         archive_name = self._create_test_archive('complex.name.tar.gz')
@@ -255,84 +538,386 @@ class TestUnarchiveCommands(unittest.TestCase):
         self.assertEqual(result[3], 'complex.name')
         self.assertIsInstance(result, list)
 
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
-    @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile')
-    def test_unarchive_realisation_unzip_success(self, mock_zipfile, _mock_unpack):
+    @staticmethod
+    def _corrupt_last_member(archive_name):
+        """Портит данные последнего файла в zip архиве, не трогая заголовки."""
+        with zipfile.ZipFile(archive_name) as zipf:
+            info = zipf.infolist()[-1]
+        with open(archive_name, 'r+b') as f:
+            # Данные начинаются после локального заголовка (30 байт + имя + extra)
+            f.seek(info.header_offset + 30 + len(info.filename.encode()) + len(info.extra))
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        return info.filename
+
+    def test_unarchive_realisation_unzip_success(self):
         """Тест успешной разархивации ZIP архива."""
-        mock_zip_instance = MagicMock()
-        mock_zipfile.return_value.__enter__.return_value = mock_zip_instance
-        mock_zip_instance.testzip.return_value = None
-        args = ['unzip', 'test.zip', 'zip', 'test']
-        unarchive_realisation(args)
-        mock_zipfile.assert_called_once_with('test.zip', 'r')
+        self._create_test_archive('test.zip')
+        unarchive_realisation(['unzip', 'test.zip', 'zip', 'test'])
+        with open(os.path.join('test', 'test_file_1.txt')) as f:
+            self.assertEqual(f.read(), 'Test content 1')
 
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
-    @patch('src.sub_functions.unarchive_dependences.tarfile.open')
-    def test_unarchive_realisation_untar_success(self, mock_tarfile, _mock_unpack):
+    def test_unarchive_realisation_untar_success(self):
         """Тест успешной разархивации TAR.GZ архива."""
-        mock_tar_instance = MagicMock()
-        mock_tarfile.return_value.__enter__.return_value = mock_tar_instance
-        args = ['untar', 'test.tar.gz', 'gztar', 'test']
-        unarchive_realisation(args)
-        mock_tarfile.assert_called_once_with('test.tar.gz', 'r:gz')
+        self._create_test_archive('test.tar.gz')
+        unarchive_realisation(['untar', 'test.tar.gz', 'gztar', 'test'])
+        with open(os.path.join('test', 'test_file_0.txt')) as f:
+            self.assertEqual(f.read(), 'Test content 0')
+
+    @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile.testzip')
+    def test_unarchive_realisation_single_pass(self, mock_testzip):
+        """Тест: архив не проверяется отдельным проходом перед распаковкой."""
+        self._create_test_archive('test.zip')
+        unarchive_realisation(['unzip', 'test.zip', 'zip', 'test'])
+        mock_testzip.assert_not_called()
+
+    def test_unarchive_realisation_broken_zip_archive(self):
+        """Тест обработки битого ZIP архива: ошибка CRC и удаление частично распакованного."""
+        self._create_test_archive('broken.zip', content_files=3)
+        # Портим последний файл, чтобы первые успели распаковаться
+        broken_member = self._corrupt_last_member('broken.zip')
 
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
-    @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile')
-    def test_unarchive_realisation_broken_zip_archive(self, mock_zipfile, _mock_unpack):
-        """Тест обработки битого ZIP архива."""
-        mock_zip_instance = MagicMock()
-        mock_zipfile.return_value.__enter__.return_value = mock_zip_instance
-        mock_zip_instance.testzip.return_value = 'broken_file.txt'
-        args = ['unzip', 'broken.zip', 'zip', 'broken']
         with self.assertRaises(ValueError) as context:
-            unarchive_realisation(args)
-        self.assertIn("Архив broken.zip поврежден", str(context.exception))
+            unarchive_realisation(['unzip', 'broken.zip', 'zip', 'broken'])
+        self.assertIn(f"Архив broken.zip поврежден. Первый поврежденный файл: {broken_member}",
+                      str(context.exception))
+        self.assertFalse(os.path.exists('broken'))
 
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
     @patch('src.sub_functions.unarchive_dependences.tarfile.open')
-    def test_unarchive_realisation_broken_tar_archive(self, mock_tarfile, _mock_unpack):
+    def test_unarchive_realisation_broken_tar_archive(self, mock_tarfile):
         """Тест обработки битого TAR.GZ архива."""
+        with gzip.open('broken.tar.gz', 'wb') as f:
+            f.write(b'not a tar')
         mock_tarfile.side_effect = tarfile.ReadError("Invalid tar archive")
         args = ['untar', 'broken.tar.gz', 'gztar', 'broken']
         with self.assertRaises(ValueError) as context:
             unarchive_realisation(args)
         self.assertIn("Файл broken.tar.gz не является валидным TAR.GZ-архивом", str(context.exception))
 
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
-    @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile')
-    def test_unarchive_realisation_zip_bad_zipfile(self, mock_zipfile, _mock_unpack):
+    def test_unarchive_realisation_truncated_tar_archive(self):
+        """Тест: обрезанный TAR.GZ обнаруживается при распаковке, частичный результат удаляется."""
+        with open('big.txt', 'wb') as f:
+            f.write(os.urandom(200000))
+        with tarfile.open('cut.tar.gz', 'w:gz') as tarf:
+            tarf.add('big.txt')
+        with open('cut.tar.gz', 'r+b') as f:
+            f.truncate(os.path.getsize('cut.tar.gz') // 2)
+        os.mkdir('cut')
+        with open(os.path.join('cut', 'keep.txt'), 'w') as f:
+            f.write('keep')
+
+        with self.assertRaises(ValueError) as context:
+            unarchive_realisation(['untar', 'cut.tar.gz', 'gztar', 'cut'])
+        self.assertIn("Архив cut.tar.gz поврежден", str(context.exception))
+        # Бывшие в папке файлы остаются, распакованные - удаляются
+        self.assertEqual(os.listdir('cut'), ['keep.txt'])
+
+    def test_unarchive_realisation_not_gzip(self):
+        """Тест обработки файла, который не является gzip."""
+        with open('plain.tar.gz', 'w') as f:
+            f.write('not a gzip')
+        with self.assertRaises(ValueError) as context:
+            unarchive_realisation(['untar', 'plain.tar.gz', 'gztar', 'plain'])
+        self.assertIn("не является валидным TAR.GZ-архивом", str(context.exception))
+        self.assertFalse(os.path.exists('plain'))
+
+    def test_unarchive_realisation_zip_bad_zipfile(self):
         """Тест обработки невалидного ZIP файла."""
-        mock_zipfile.side_effect = zipfile.BadZipFile("Not a zip file")
+        with open('not_zip.zip', 'w') as f:
+            f.write('not a zip')
         args = ['unzip', 'not_zip.zip', 'zip', 'not_zip']
         with self.assertRaises(ValueError) as context:
             unarchive_realisation(args)
         self.assertIn("Файл not_zip.zip не является валидным ZIP-архивом", str(context.exception))
+        self.assertFalse(os.path.exists('not_zip'))
+
+    def test_unarchive_args_parse_jobs(self):
+        """Тест парсинга числа потоков -j для unzip."""
+        archive_name = self._create_test_archive('test.zip')
+        result, options = unarchive_command_parse(['unzip', '-j', '4', archive_name])
+        self.assertEqual(result[1], archive_name)
+        self.assertEqual(options["jobs"], 4)
+
+    def test_unarchive_args_parse_jobs_only_for_unzip(self):
+        """Тест: -j не поддерживается для untar."""
+        archive_name = self._create_test_archive('test.tar.gz')
+        with self.assertRaises(ValueError):
+            unarchive_args_parse(['untar', '-j', '2', archive_name])
+
+    def test_schedule_members_largest_first(self):
+        """Тест: большие файлы распределяются первыми, нагрузка потоков выравнивается."""
+        members = []
+        for name, size in (("a", 10), ("b", 70), ("c", 30), ("d", 40), ("e", 50)):
+            info = zipfile.ZipInfo(name)
+            info.file_size = size
+            members.append(info)
+        groups = schedule_members(members, 2)
+        self.assertEqual([[info.filename for info in group] for group in groups], [["b", "c"], ["e", "d", "a"]])
+        self.assertEqual(schedule_members(members[:1], 4)[0][0].filename, "a")
+
+    def test_unarchive_realisation_unzip_parallel(self):
+        """Тест параллельной распаковки: результат совпадает с последовательной."""
+        with zipfile.ZipFile('many.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr('nested/', '')
+            for i in range(40):
+                zipf.writestr(f'nested/dir{i % 5}/file{i}.txt', f'content {i}' * (i + 1))
+
+        unarchive_realisation(['unzip', 'many.zip', 'zip', 'many'], {"jobs": 4})
+
+        for i in range(40):
+            with open(os.path.join('many', 'nested', f'dir{i % 5}', f'file{i}.txt')) as f:
+                self.assertEqual(f.read(), f'content {i}' * (i + 1))
+
+    def test_unarchive_realisation_unzip_parallel_broken(self):
+        """Тест: ошибка CRC в одном потоке останавливает распаковку и удаляет частичный результат."""
+        self._create_test_archive('broken.zip', content_files=6)
+        broken_member = self._corrupt_last_member('broken.zip')
+
+        with self.assertRaises(ValueError) as context:
+            unarchive_realisation(['unzip', 'broken.zip', 'zip', 'broken'], {"jobs": 3})
+        self.assertIn(f"Первый поврежденный файл: {broken_member}", str(context.exception))
+        self.assertFalse(os.path.exists('broken'))
+
+    def _create_tree_archives(self):
+        """Создает zip и tar архивы с вложенными каталогами."""
+        for path in ('docs/a.txt', 'docs/b.md', 'src/main.py', 'src/util/helpers.py', 'readme.txt'):
+            os.makedirs(os.path.dirname(os.path.join('tree', path)) or 'tree', exist_ok=True)
+            with open(os.path.join('tree', path), 'w') as f:
+                f.write(path)
+        archive_realisation(['zip', 'tree', os.path.join(self.test_dir, 'tree.zip')])
+        archive_realisation(['tar', 'tree', os.path.join(self.test_dir, 'tree.tar')])
+        archive_realisation(['tar', 'tree', os.path.join(self.test_dir, 'tree.tar.gz')])
+        shutil.rmtree('tree')
+
+    def test_list_archive(self):
+        """Тест: список содержимого zip и tar без распаковки."""
+        self._create_tree_archives()
+        zip_names = [entry["name"] for entry in list_archive('tree.zip', 'zip') if not entry["is_dir"]]
+        self.assertEqual(sorted(zip_names), ['docs/a.txt', 'docs/b.md', 'readme.txt', 'src/main.py',
+                                             'src/util/helpers.py'])
+        for name, archive_format in (('tree.tar', 'tar'), ('tree.tar.gz', 'gztar')):
+            entries = [entry for entry in list_archive(name, archive_format, ['src']) if not entry["is_dir"]]
+            self.assertEqual(sorted(entry["name"] for entry in entries), ['./src/main.py', './src/util/helpers.py'])
+            self.assertEqual(entries[0]["size"], len(entries[0]["name"]) - 2)
+
+    @patch('builtins.print')
+    def test_unarchive_list_does_not_extract(self, mock_print):
+        """Тест: unzip -l выводит содержимое и не создает каталог."""
+        self._create_tree_archives()
+        unarchive_realisation(*unarchive_command_parse(['unzip', '-l', 'tree.zip']))
+        self.assertFalse(os.path.exists('tree'))
+        printed = "\n".join(call.args[0] for call in mock_print.call_args_list)
+        self.assertIn('src/util/helpers.py', printed)
+
+    def test_unarchive_selected_members(self):
+        """Тест: распаковываются только файлы, выбранные путем, шаблоном или каталогом."""
+        self._create_tree_archives()
+        for args in (['unzip', '-m', 'docs/*.txt', '-m', 'src/util', 'tree.zip'],
+                     ['unzip', '-j', '2', '-m', 'docs/*.txt', '-m', 'src/util', 'tree.zip'],
+                     ['untar', '--member', './docs/*.txt', '--member', 'src/util', 'tree.tar.gz']):
+            unarchive_realisation(*unarchive_command_parse(args))
+            extracted = sorted(os.path.relpath(os.path.join(root, name), 'tree')
+                               for root, _dirs, files in os.walk('tree') for name in files)
+            self.assertEqual(extracted, ['docs/a.txt', 'src/util/helpers.py'])
+            shutil.rmtree('tree')
+
+    def test_unarchive_selected_members_not_found(self):
+        """Тест: шаблон, которому нет файлов в архиве, - ошибка без частичного результата."""
+        self._create_tree_archives()
+        with self.assertRaises(ValueError) as context:
+            unarchive_realisation(*unarchive_command_parse(['untar', '-m', 'docs', '-m', '*.exe', 'tree.tar']))
+        self.assertIn("*.exe", str(context.exception))
+        self.assertFalse(os.path.exists('tree'))
+
+    def test_untar_indexed_member(self):
+        """Тест: из tar.gz с индексом файл распаковывается по индексу, без чтения архива с начала."""
+        os.makedirs(os.path.join('big', 'sub'))
+        contents = {}
+        for i in range(3):
+            # Файлы больше блока сжатия - архив состоит из нескольких блоков
+            contents[f'sub/file{i}.bin'] = os.urandom(1024 * 1024 + 1000 * i)
+            with open(os.path.join('big', 'sub', f'file{i}.bin'), 'wb') as f:
+                f.write(contents[f'sub/file{i}.bin'])
+        archive = os.path.join(self.test_dir, 'big.tar.gz')
+        archive_realisation(['tar', '--index', 'big', archive])
+        index = load_index(Path(archive))
+        self.assertGreater(len(index["blocks"]), 3)
+        shutil.rmtree('big')
+
+        with patch('src.sub_functions.unarchive_dependences._extract_tar', side_effect=AssertionError):
+            unarchive_realisation(*unarchive_command_parse(['untar', '-m', 'sub/file2.bin', 'big.tar.gz']))
+        self.assertEqual(os.listdir(os.path.join('big', 'sub')), ['file2.bin'])
+        with open(os.path.join('big', 'sub', 'file2.bin'), 'rb') as f:
+            self.assertEqual(f.read(), contents['sub/file2.bin'])
+
+        # Архив по-прежнему читается целиком обычным tar
+        with tarfile.open(archive) as tarf:
+            self.assertEqual(tarf.extractfile('./sub/file1.bin').read(), contents['sub/file1.bin'])
+
+    def test_untar_stale_index_ignored(self):
+        """Тест: индекс от другого архива не используется, файлы распаковываются обычным чтением."""
+        os.makedirs('tree')
+        with open(os.path.join('tree', 'a.txt'), 'w') as f:
+            f.write('a')
+        archive_realisation(['tar', '--index', 'tree', os.path.join(self.test_dir, 'indexed.tar.gz')])
+        with open(index_path_for(Path('indexed.tar.gz')), 'r+') as f:
+            stale = f.read().replace('"archive_size": ', '"archive_size": 1')
+            f.seek(0)
+            f.write(stale)
+        self.assertIsNone(load_index(Path('indexed.tar.gz')))
+        shutil.rmtree('tree')
+        unarchive_realisation(*unarchive_command_parse(['untar', '-m', 'a.txt', 'indexed.tar.gz']))
+        self.assertTrue(os.path.exists(os.path.join('indexed', 'a.txt')))
+
+        # Архив, пересозданный без --index, остается без индекса
+        os.makedirs('tree', exist_ok=True)
+        archive_realisation(['tar', 'tree', os.path.join(self.test_dir, 'indexed.tar.gz')])
+        self.assertFalse(index_path_for(Path('indexed.tar.gz')).exists())
+
+    def test_archive_index_only_for_tar_gz(self):
+        """Тест: --index поддерживается только для .tar.gz."""
+        for args in (['tar', '--index', self.test_dir, 'a.tar.bz2'], ['zip', '--index', self.test_dir, 'a.zip']):
+            with self.assertRaises(ValueError):
+                archive_args_parse(args)
 
     @patch('src.sub_functions.unarchive_dependences.Path.mkdir')
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
     @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile')
-    def test_unarchive_realisation_directory_creation(self, mock_zipfile, _mock_unpack, mock_mkdir):
+    def test_unarchive_realisation_directory_creation(self, mock_zipfile, mock_mkdir):
         """Тест создания директории для распаковки."""
         mock_zip_instance = MagicMock()
         mock_zipfile.return_value.__enter__.return_value = mock_zip_instance
-        mock_zip_instance.testzip.return_value = None
+        mock_zip_instance.infolist.return_value = []
         args = ['unzip', 'test.zip', 'zip', 'test']
         unarchive_realisation(args)
         mock_mkdir.assert_called_once_with(exist_ok=True)
 
-    @patch('src.sub_functions.unarchive_dependences.shutil.unpack_archive')
-    @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile')
-    def test_unarchive_realisation_exception_propagation(self, mock_zipfile, mock_unpack):
+    @patch('src.sub_functions.unarchive_dependences.zipfile.ZipFile.extract')
+    def test_unarchive_realisation_exception_propagation(self, mock_extract):
         """Тест исключений из unarchive_realisation."""
-        mock_zip_instance = MagicMock()
-        mock_zipfile.return_value.__enter__.return_value = mock_zip_instance
-        mock_zip_instance.testzip.return_value = None
-        mock_unpack.side_effect = Exception("Unexpected error during unpacking")
+        self._create_test_archive('test.zip')
+        mock_extract.side_effect = Exception("Unexpected error during unpacking")
         args = ['unzip', 'test.zip', 'zip', 'test']
         with self.assertRaises(Exception) as context:
             unarchive_realisation(args)
         self.assertEqual(str(context.exception), "Unexpected error during unpacking")
 
 
+class TestChunkStore(unittest.TestCase):
+    """Тесты хранилища фрагментов (zip/tar --repo, unzip/untar --repo)"""
+
+    def setUp(self):
+        """Создает временную директорию с каталогом для архивации."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        os.makedirs(os.path.join('tree', 'sub'))
+        os.makedirs(os.path.join('tree', 'empty'))
+        self.big = os.urandom(1024 * 1024)
+        with open(os.path.join('tree', 'sub', 'big.bin'), 'wb') as f:
+            f.write(self.big)
+        with open(os.path.join('tree', 'note.txt'), 'w') as f:
+            f.write('note')
+        os.chmod(os.path.join('tree', 'note.txt'), 0o640)
+        os.symlink('note.txt', os.path.join('tree', 'link'))
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_chunks_are_content_defined(self):
+        """Тест: вставка в начало меняет только первые фрагменты, остальные совпадают."""
+        chunks = list(iter_chunks(io.BytesIO(self.big)))
+        shifted = list(iter_chunks(io.BytesIO(b'inserted' + self.big)))
+        self.assertEqual(b''.join(chunks), self.big)
+        self.assertTrue(all(MIN_CHUNK_SIZE <= len(chunk) <= MAX_CHUNK_SIZE for chunk in chunks[:-1]))
+        self.assertGreaterEqual(len(set(chunks) & set(shifted)), len(chunks) - 2)
+
+    def test_find_cut_matches_rolling_hash(self):
+        """Тест: граница, найденная пачками, совпадает с побайтовым скользящим хешем."""
+        def rolling_cut(data):
+            h = 0
+            end = min(len(data), MAX_CHUNK_SIZE)
+            for position in range(MIN_CHUNK_SIZE, end):
+                h = ((h << 1) + GEAR[data[position]]) & ((1 << 64) - 1)
+                if h < CUT_THRESHOLD:
+                    return position + 1
+            return end
+
+        for data in (self.big, self.big[:MIN_CHUNK_SIZE + 100], bytes(MAX_CHUNK_SIZE + 1), b'abc' * 100000):
+            for offset in (0, 12345, 300000):
+                self.assertEqual(find_cut(data[offset:]), rolling_cut(data[offset:]))
+
+    def test_snapshot_skips_unchanged_files(self):
+        """Тест: файлы с прежними размером и временем изменения не читаются, измененные - читаются."""
+        first = store_snapshot(Path('tree'), Path('repo'), 'night1')
+        self.assertEqual(first['bytes'], len(self.big) + 4)
+        with patch('builtins.open', wraps=open) as mock_open:
+            second = store_snapshot(Path('tree'), Path('repo'), 'night2')
+        self.assertEqual(second['bytes'], 0)
+        self.assertEqual(second['chunks'], first['chunks'])
+        self.assertEqual([call.args[1] for call in mock_open.call_args_list], ['r', 'w'])
+
+        with open(os.path.join('tree', 'note.txt'), 'a') as f:
+            f.write('!')
+        third = store_snapshot(Path('tree'), Path('repo'), 'night3')
+        self.assertEqual(third['bytes'], 5)
+        unarchive_realisation(*unarchive_command_parse(['untar', '--repo', 'repo', 'night2']))
+        with open(os.path.join('night2', 'sub', 'big.bin'), 'rb') as f:
+            self.assertEqual(f.read(), self.big)
+
+    @patch('builtins.print')
+    def test_snapshot_round_trip_and_dedup(self, mock_print):
+        """Тест: повторный снимок почти не занимает места, снимок восстанавливается через untar."""
+        archive_realisation(['tar', '--repo', 'repo', 'tree', 'night1'])
+        first_size = repo_size(Path('repo'))
+        with open(os.path.join('tree', 'sub', 'big.bin'), 'r+b') as f:
+            f.seek(500000)
+            f.write(b'changed')
+        archive_realisation(['zip', '--repo', 'repo', 'tree', 'night2'])
+        self.assertLess(repo_size(Path('repo')) - first_size, first_size // 3)
+
+        unarchive_realisation(*unarchive_command_parse(['untar', '--repo', 'repo', 'night1']))
+        with open(os.path.join('night1', 'sub', 'big.bin'), 'rb') as f:
+            self.assertEqual(f.read(), self.big)
+        self.assertEqual(os.readlink(os.path.join('night1', 'link')), 'note.txt')
+        self.assertTrue(os.path.isdir(os.path.join('night1', 'empty')))
+        note_stat = os.stat(os.path.join('night1', 'note.txt'))
+        self.assertEqual(note_stat.st_mode & 0o777, 0o640)
+        self.assertEqual(note_stat.st_mtime_ns, os.stat(os.path.join('tree', 'note.txt')).st_mtime_ns)
+
+        unarchive_realisation(*unarchive_command_parse(['unzip', '--repo', 'repo', '-m', '*.txt', 'night2']))
+        self.assertEqual(os.listdir('night2'), ['note.txt'])
+
+        mock_print.reset_mock()
+        unarchive_realisation(*unarchive_command_parse(['untar', '--repo', 'repo', '-l', 'night2']))
+        printed = "\n".join(call.args[0] for call in mock_print.call_args_list)
+        self.assertIn('sub/big.bin', printed)
+
+    @patch('builtins.print')
+    def test_snapshot_corrupted_chunk(self, _mock_print):
+        """Тест: поврежденный фрагмент обнаруживается по хешу, частичный результат удаляется."""
+        archive_realisation(['tar', '--repo', 'repo', 'tree', 'night'])
+        chunk = next(path for path in Path('repo', 'chunks').glob('*/*'))
+        chunk.write_bytes(gzip.compress(b'garbage'))
+        with self.assertRaises(ValueError):
+            unarchive_realisation(*unarchive_command_parse(['untar', '--repo', 'repo', 'night']))
+        self.assertFalse(os.path.exists('night'))
+
+    @patch('builtins.print')
+    def test_snapshot_validation(self, _mock_print):
+        """Тест: повторное имя снимка, недопустимое имя и лишние опции - ошибки."""
+        archive_realisation(['tar', '--repo', 'repo', 'tree', 'night'])
+        with self.assertRaises(FileExistsError):
+            archive_realisation(['tar', '--repo', 'repo', 'tree', 'night'])
+        for args in (['tar', '--repo', 'repo', 'tree', '../night'], ['zip', '-j', '2', '--repo', 'repo', 'tree', 'x'],
+                     ['tar', '--repo', 'repo', '--index', 'tree', 'x']):
+            with self.assertRaises(ValueError):
+                archive_args_parse(args)
+        with self.assertRaises(FileNotFoundError):
+            unarchive_args_parse(['untar', '--repo', 'repo', 'missing'])
+
+
 if __name__ == '__main__':
     unittest.main()
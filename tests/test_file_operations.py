@@ -8,8 +8,10 @@ from src.sub_functions.mv_dependences import mv_args_parse, filesystem_check
 from src.sub_functions.rm_dependences import rm_args_parse
 from src.sub_functions.undo_dependences import (
     cp_with_history, mv_with_history, rm_with_history,
-    undo_args_parse, undo_realisation, undo_rm, undo_cp, undo_mv, undo_command
+    undo_args_parse, undo_realisation, redo_realisation, plan_undo, plan_undo_cp, plan_undo_mv, plan_undo_rm,
+    validate_steps, run_transaction
 )
+from src.sub_functions.history_dependences import SESSION_ID
 
 # Добавляем корневую директорию проекта в Python path для корректного импорта
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -189,10 +191,11 @@ class TestFileOperationsWithMocks(unittest.TestCase):
             cp_with_history("source.txt", "dest_dir")
 
     @patch('src.sub_functions.undo_dependences.add_to_history')
-    @patch('src.sub_functions.undo_dependences.shutil.move')
+    @patch('src.sub_functions.undo_dependences.move_path')
+    @patch('src.sub_functions.undo_dependences.make_trash_path')
     @patch('src.sub_functions.undo_dependences.Path')
     @patch('builtins.input')
-    def test_rm_with_history_file_confirmed(self, mock_input, mock_path, mock_move, mock_add_history):
+    def test_rm_with_history_file_confirmed(self, mock_input, mock_path, mock_trash_path, mock_move, mock_add_history):
         """Тест удаления файла с подтверждением и записью в историю"""
         # Настраиваем моки
         mock_input.return_value = 'y'  # Пользователь подтверждает удаление
@@ -201,19 +204,20 @@ class TestFileOperationsWithMocks(unittest.TestCase):
         mock_path_obj.exists.return_value = True
         mock_path_obj.absolute.return_value = Path("/absolute/test.txt")
         mock_path_obj.name = "test.txt"
+        mock_path.return_value = mock_path_obj
 
-        # Мокаем корзину
-        with patch('src.sub_functions.undo_dependences.TRASH_DIR', '/absolute/.trash'):
-            with patch('src.sub_functions.undo_dependences.Path') as mock_trash_path:
-                mock_trash_dir = MagicMock()
-                mock_trash_dir.mkdir.return_value = None
-                mock_trash_path.return_value = mock_trash_dir
+        # Мокаем корзину на той же файловой системе
+        mock_trash_path.return_value = Path("/absolute/.trash/test.txt")
 
-                rm_with_history("test.txt")
+        rm_with_history("test.txt")
 
         # Проверяем вызовы
-        mock_move.assert_called_once()
-        mock_add_history.assert_called_once()
+        mock_trash_path.assert_called_once_with(Path("/absolute/test.txt"))
+        mock_move.assert_called_once_with(Path("/absolute/test.txt"), Path("/absolute/.trash/test.txt"))
+        mock_add_history.assert_called_once_with("rm", ["test.txt"], {
+            "path": "/absolute/test.txt",
+            "trash_path": "/absolute/.trash/test.txt"
+        })
 
     @patch('src.sub_functions.undo_dependences.Path')
     @patch('builtins.input')
@@ -282,248 +286,170 @@ class TestFileOperationsWithMocks(unittest.TestCase):
         self.assertIn("unrecognized", str(context.exception).lower())
 
 
-    @patch('src.sub_functions.undo_dependences.read_history')
-    def test_undo_realisation_no_history(self, mock_read):
+    @patch('src.sub_functions.undo_dependences.history_is_empty')
+    def test_undo_realisation_no_history(self, mock_empty):
         """Тест отмены при пустой истории"""
-        mock_read.return_value = []
+        mock_empty.return_value = True
         with self.assertRaises(Exception) as context:
             undo_realisation({"steps": 1})
         self.assertIn("История команд пуста", str(context.exception))
 
-    @patch('src.sub_functions.undo_dependences.read_history')
-    @patch('src.sub_functions.undo_dependences.save_history')
-    @patch('src.sub_functions.undo_dependences.undo_command')
-    def test_undo_realisation_success(self, mock_undo_command, mock_save_history, mock_read_history):
+    @patch('src.sub_functions.undo_dependences.history_is_empty', return_value=False)
+    @patch('src.sub_functions.undo_dependences.read_undo_stack')
+    @patch('src.sub_functions.undo_dependences.mark_undone')
+    @patch('src.sub_functions.undo_dependences.push_redo_entries')
+    @patch('src.sub_functions.undo_dependences.run_transaction')
+    def test_undo_realisation_success(self, mock_run, mock_push_redo, mock_mark_undone, mock_read_stack, _mock_empty):
         """Тест успешной отмены команд"""
-        # Мокаем историю с командами для отменя
-        mock_history = [
-            {"command": "cp", "undo_data": {"src": "/src", "dst": "/dst"}},
-            {"command": "rm", "undo_data": {"path": "/path", "trash_path": "/trash"}}
+        # Мокаем стек undo с командами для отмены
+        mock_stack = [
+            {"command": "mv", "offset": 10, "length": 5, "timestamp": "t2",
+             "undo_data": {"src": "/src", "dst": "/dst", "session": SESSION_ID}},
+            {"command": "rm", "offset": 0, "length": 5, "timestamp": "t1",
+             "undo_data": {"path": "/path", "trash_path": "/trash", "session": SESSION_ID}}
         ]
-        mock_read_history.return_value = mock_history
-        mock_undo_command.return_value = True
+        mock_read_stack.return_value = mock_stack
 
         undo_realisation({"steps": 2})
 
-        self.assertEqual(mock_undo_command.call_count, 2)
-        mock_save_history.assert_called_once()
+        mock_read_stack.assert_called_once_with(2)
+        # Все шаги выполняются одной транзакцией
+        mock_run.assert_called_once_with([(Path("/dst"), Path("/src")), (Path("/trash"), Path("/path"))])
+        mock_mark_undone.assert_called_once_with(mock_stack)
+        redo_entries = mock_push_redo.call_args[0][0]
+        self.assertEqual(redo_entries[0]["steps"], [["/dst", "/src"]])
 
-    @patch('src.sub_functions.undo_dependences.read_history')
-    def test_undo_realisation_no_undoable_commands(self, mock_read):
+    @patch('src.sub_functions.undo_dependences.history_is_empty', return_value=False)
+    @patch('src.sub_functions.undo_dependences.read_undo_stack')
+    def test_undo_realisation_no_undoable_commands(self, mock_read_stack, _mock_empty):
         """Тест отмены когда нет команд для отмены"""
-        mock_read.return_value = [
-            {"command": "ls", "args": ["-l"]},  # Не поддерживается для отмены
-            {"command": "cat", "args": ["file.txt"]}  # Не поддерживается для отмены
-        ]
+        mock_read_stack.return_value = []
         with self.assertRaises(Exception) as context:
             undo_realisation({"steps": 1})
         self.assertIn("Нет команд для отмены", str(context.exception))
 
-    @patch('src.sub_functions.undo_dependences.undo_cp')
-    def test_undo_command_cp(self, mock_undo_cp):
-        """Тест отмены команды cp"""
-        mock_undo_cp.return_value = True
-        record = {"command": "cp", "undo_data": {"src": "/src", "dst": "/dst"}}
+    @patch('src.sub_functions.undo_dependences.history_is_empty', return_value=False)
+    @patch('src.sub_functions.undo_dependences.read_undo_stack')
+    @patch('src.sub_functions.undo_dependences.mark_undone')
+    @patch('src.sub_functions.undo_dependences.run_transaction')
+    def test_undo_realisation_failed_transaction(self, mock_run, mock_mark_undone, mock_read_stack, _mock_empty):
+        """Тест: при неудачной транзакции история не меняется"""
+        mock_read_stack.return_value = [{"command": "mv", "undo_data": {"src": "/a", "dst": "/b"}}]
+        mock_run.side_effect = Exception("Отмена невозможна")
 
-        result = undo_command(record)
-
-        self.assertTrue(result)
-        mock_undo_cp.assert_called_once_with({"src": "/src", "dst": "/dst"})
-
-    @patch('src.sub_functions.undo_dependences.undo_mv')
-    def test_undo_command_mv(self, mock_undo_mv):
-        """Тест отмены команды mv"""
-        mock_undo_mv.return_value = True
-        record = {"command": "mv", "undo_data": {"src": "/src", "dst": "/dst"}}
-
-        result = undo_command(record)
+        with self.assertRaises(Exception):
+            undo_realisation({"steps": 1})
 
-        self.assertTrue(result)
-        mock_undo_mv.assert_called_once_with({"src": "/src", "dst": "/dst"})
+        mock_mark_undone.assert_not_called()
 
-    @patch('src.sub_functions.undo_dependences.undo_rm')
-    def test_undo_command_rm(self, mock_undo_rm):
-        """Тест отмены команды rm"""
-        mock_undo_rm.return_value = True
-        record = {"command": "rm", "undo_data": {"path": "/path", "trash_path": "/trash"}}
+    @patch('src.sub_functions.undo_dependences.read_redo_stack')
+    @patch('src.sub_functions.undo_dependences.drop_redo_entries')
+    @patch('src.sub_functions.undo_dependences.restore_undo_entry')
+    @patch('src.sub_functions.undo_dependences.run_transaction')
+    def test_redo_realisation(self, mock_run, mock_restore, mock_drop, mock_read_redo):
+        """Тест повтора отмененной команды"""
+        entry = {"offset": 0, "length": 5, "timestamp": "t1", "steps": [["/dst", "/src"]], "line": 0}
+        mock_read_redo.return_value = [entry]
 
-        result = undo_command(record)
+        redo_realisation({"steps": 1})
 
-        self.assertTrue(result)
-        mock_undo_rm.assert_called_once_with({"path": "/path", "trash_path": "/trash"})
+        mock_run.assert_called_once_with([(Path("/src"), Path("/dst"))])
+        mock_drop.assert_called_once_with([entry])
+        mock_restore.assert_called_once_with(0, 5, "t1")
 
-    def test_undo_command_unknown(self):
+    @patch('src.sub_functions.undo_dependences.read_redo_stack')
+    def test_redo_realisation_empty(self, mock_read_redo):
+        """Тест повтора при пустом стеке redo"""
+        mock_read_redo.return_value = []
+        with self.assertRaises(Exception) as context:
+            redo_realisation({"steps": 1})
+        self.assertIn("Нет отмененных команд", str(context.exception))
+
+    @patch('src.sub_functions.undo_dependences.plan_undo_cp')
+    def test_plan_undo_cp(self, mock_plan_cp):
+        """Тест выбора плана отмены для cp"""
+        mock_plan_cp.return_value = []
+        plan_undo({"command": "cp", "undo_data": {"src": "/src", "dst": "/dst"}})
+        mock_plan_cp.assert_called_once_with({"src": "/src", "dst": "/dst"})
+
+    @patch('src.sub_functions.undo_dependences.plan_undo_mv')
+    def test_plan_undo_mv(self, mock_plan_mv):
+        """Тест выбора плана отмены для mv"""
+        mock_plan_mv.return_value = []
+        plan_undo({"command": "mv", "undo_data": {"src": "/src", "dst": "/dst"}})
+        mock_plan_mv.assert_called_once_with({"src": "/src", "dst": "/dst"})
+
+    @patch('src.sub_functions.undo_dependences.plan_undo_rm')
+    def test_plan_undo_rm(self, mock_plan_rm):
+        """Тест выбора плана отмены для rm"""
+        mock_plan_rm.return_value = []
+        plan_undo({"command": "rm", "undo_data": {"path": "/path", "trash_path": "/trash"}})
+        mock_plan_rm.assert_called_once_with({"path": "/path", "trash_path": "/trash"})
+
+    def test_plan_undo_unknown(self):
         """Тест отмены неизвестной команды"""
-        record = {"command": "unknown", "undo_data": {}}
-
-        result = undo_command(record)
-
-        self.assertFalse(result)
+        with self.assertRaises(ValueError):
+            plan_undo({"command": "unknown", "undo_data": {}})
 
 
 class TestUndoFunctionsWithMocks(unittest.TestCase):
     """Тесты для функций отмены с использованием моков"""
 
-    @patch('src.sub_functions.undo_dependences.Path')
-    def test_undo_cp_file_to_file(self, mock_path):
-        """Тест отмены копирования файла в файл"""
-        # Настраиваем моки
-        mock_dst_path = MagicMock()
-        mock_dst_path.exists.return_value = True
-        mock_dst_path.is_dir.return_value = False
-
-        mock_path.return_value = mock_dst_path
-
-        undo_data = {"src": "/src", "dst": "/dst"}
-        result = undo_cp(undo_data)
-
-        self.assertTrue(result)
-        mock_dst_path.unlink.assert_called_once()
-
-    @patch('src.sub_functions.undo_dependences.Path')
-    def test_undo_cp_file_to_dir(self, mock_path):
-        """Тест отмены копирования файла в директорию"""
-        # Настраиваем моки
-        mock_dst_path = MagicMock()
-        mock_dst_path.exists.return_value = True
-        mock_dst_path.is_dir.return_value = True
-
-        mock_copied_file = MagicMock()
-        mock_copied_file.exists.return_value = True
-
-        mock_dst_path.__truediv__.return_value = mock_copied_file
-
-        mock_path.return_value = mock_dst_path
-
-        undo_data = {"src": "/src/file.txt", "dst": "/dst_dir"}
-        result = undo_cp(undo_data)
-
-        self.assertTrue(result)
-        mock_copied_file.unlink.assert_called_once()
-
-    @patch('src.sub_functions.undo_dependences.Path')
-    def test_undo_cp_nonexistent_destination(self, mock_path):
-        """Тест отмены копирования когда файл назначения не существует"""
-        mock_dst_path = MagicMock()
-        mock_dst_path.exists.return_value = False
-        mock_path.return_value = mock_dst_path
-
-        undo_data = {"src": "/src", "dst": "/nonexistent"}
-        result = undo_cp(undo_data)
-
-        self.assertFalse(result)
-
-
-    @patch('src.sub_functions.undo_dependences.shutil.move')
-    @patch('src.sub_functions.undo_dependences.Path')
-    @patch('builtins.input')
-    def test_undo_mv(self, mock_input, mock_path, mock_move):
-        """Тест отмены перемещения файла"""
-        # Настраиваем моки
-        mock_input.return_value = 'y'  # Подтверждение перезаписи
-
-        mock_dst_path = MagicMock()
-        mock_dst_path.exists.return_value = True
-        mock_dst_path.__str__ = MagicMock(return_value="/dst")
-
-        mock_src_path = MagicMock()
-        mock_src_path.__str__ = MagicMock(return_value="/src")
-        mock_src_path.parent.exists.return_value = True
-        mock_src_path.exists.return_value = True
-
-        def path_side_effect(path):
-            if path == "/dst":
-                return mock_dst_path
-            elif path == "/src":
-                return mock_src_path
-            else:
-                return MagicMock()
-
-        mock_path.side_effect = path_side_effect
-
-        # Настраиваем side_effect для shutil.move, чтобы изменить состояние файлов
-        def move_side_effect(src, dst):
-            mock_dst_path.exists.return_value = False
-            mock_src_path.exists.return_value = True
-
-        mock_move.side_effect = move_side_effect
-
-        undo_data = {"src": "/src", "dst": "/dst"}
-        result = undo_mv(undo_data)
-
-        self.assertTrue(result)
-        mock_move.assert_called_once_with("/dst", "/src")
-        mock_input.assert_called_once()
-
-    @patch('src.sub_functions.undo_dependences.Path')
-    def test_undo_mv_nonexistent_destination(self, mock_path):
-        """Тест отмены перемещения когда файл назначения не существует"""
-        mock_dst_path = MagicMock()
-        mock_dst_path.exists.return_value = False
-        mock_path.return_value = mock_dst_path
-
-        undo_data = {"src": "/src", "dst": "/nonexistent"}
-        result = undo_mv(undo_data)
-
-        self.assertFalse(result)
-
-    @patch('src.sub_functions.undo_dependences.shutil.move')
-    @patch('src.sub_functions.undo_dependences.Path')
-    def test_undo_rm(self, mock_path, mock_move):
-        """Тест отмены удаления файла"""
-        # Настраиваем моки с правильными строковыми представлениями
-        mock_trash_path = MagicMock()
-        mock_trash_path.exists.return_value = True
-        mock_trash_path.__str__ = MagicMock(return_value="/trash")
-
-        mock_original_path = MagicMock()
-        mock_original_path.parent.mkdir.return_value = None
-        mock_original_path.__str__ = MagicMock(return_value="/original")
-
-        mock_path.side_effect = [mock_trash_path, mock_original_path]
-
-        undo_data = {
-            "path": "/original",
-            "trash_path": "/trash"
-        }
-        result = undo_rm(undo_data)
-
-        self.assertTrue(result)
-        mock_move.assert_called_once_with("/trash", "/original")
-
-    @patch('src.sub_functions.undo_dependences.shutil.move')
-    @patch('src.sub_functions.undo_dependences.Path')
-    def test_undo_rm_nonexistent_trash_file(self, mock_path, mock_move):
-        """Тест отмены удаления когда файл в корзине не существует"""
-        # Настраиваем моки
-        mock_trash_path = MagicMock()
-        mock_trash_path.exists.return_value = False
-
-        mock_original_path = MagicMock()
-        mock_original_path.parent.mkdir.return_value = None
-
-        # Настраиваем side_effect для правильного распределения моков
-        def path_side_effect(path):
-            if path == "/nonexistent/trash":
-                return mock_trash_path
-            elif path == "/path":
-                return mock_original_path
-            else:
-                return MagicMock()
-
-        mock_path.side_effect = path_side_effect
+    @patch('src.sub_functions.undo_dependences.make_trash_path')
+    def test_plan_undo_cp_moves_copy_to_trash(self, mock_trash_path):
+        """Тест: отмена копирования перемещает копию в корзину"""
+        mock_trash_path.return_value = Path("/trash/copy")
+        steps = plan_undo_cp({"src": "/src/file.txt", "dst": "/dst_dir/file.txt"})
+        self.assertEqual(steps, [(Path("/dst_dir/file.txt"), Path("/trash/copy"))])
+        mock_trash_path.assert_called_once_with(Path("/dst_dir/file.txt"))
+
+    def test_plan_undo_cp_without_data(self):
+        """Тест отмены копирования без данных"""
+        with self.assertRaises(ValueError):
+            plan_undo_cp({})
+
+    def test_plan_undo_mv(self):
+        """Тест: отмена перемещения возвращает файл назад"""
+        steps = plan_undo_mv({"src": "/src", "dst": "/dst"})
+        self.assertEqual(steps, [(Path("/dst"), Path("/src"))])
+
+    def test_plan_undo_rm(self):
+        """Тест: отмена удаления восстанавливает файл из корзины"""
+        steps = plan_undo_rm({"path": "/original", "trash_path": "/trash"})
+        self.assertEqual(steps, [(Path("/trash"), Path("/original"))])
+
+    @patch('src.sub_functions.undo_dependences.os.path.lexists')
+    def test_validate_steps_chained(self, mock_lexists):
+        """Тест: шаг может использовать путь, созданный предыдущим шагом"""
+        mock_lexists.side_effect = lambda path: str(path) == "/c"
+        validate_steps([(Path("/c"), Path("/b")), (Path("/b"), Path("/trash/b"))])
+        # Каждый путь проверяется ровно один раз
+        self.assertEqual(mock_lexists.call_count, 3)
+
+    @patch('src.sub_functions.undo_dependences.os.path.lexists')
+    def test_validate_steps_conflicts(self, mock_lexists):
+        """Тест: недостающий источник и занятое место назначения собираются в одну ошибку"""
+        mock_lexists.side_effect = lambda path: str(path) in ("/b", "/src")
+        with self.assertRaises(Exception) as context:
+            validate_steps([(Path("/a"), Path("/x")), (Path("/b"), Path("/src"))])
+        self.assertIn("/a не существует", str(context.exception))
+        self.assertIn("/src уже существует", str(context.exception))
 
-        # Мокаем shutil.move чтобы выбросить исключение
-        mock_move.side_effect = FileNotFoundError("File not found")
+    @patch('src.sub_functions.undo_dependences.validate_steps')
+    @patch('src.sub_functions.undo_dependences.move_path')
+    def test_run_transaction_rollback(self, mock_move, _mock_validate):
+        """Тест: при ошибке выполненные шаги откатываются в обратном порядке"""
+        mock_move.side_effect = [None, None, PermissionError("Permission denied"), None, None]
+        steps = [(Path("/a"), Path("/b")), (Path("/c"), Path("/d")), (Path("/e"), Path("/f"))]
 
-        undo_data = {
-            "path": "/path",
-            "trash_path": "/nonexistent/trash"
-        }
+        with self.assertRaises(Exception) as context:
+            run_transaction(steps)
 
-        # Ожидаем, что функция выбросит исключение
-        with self.assertRaises(FileNotFoundError):
-            undo_rm(undo_data)
+        self.assertIn("откатаны", str(context.exception))
+        self.assertEqual(mock_move.call_args_list[3:], [
+            ((Path("/d"), Path("/c")),),
+            ((Path("/b"), Path("/a")),),
+        ])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from src.sub_functions.history_dependences import (
+    add_to_history, read_history, history_lock, read_undo_stack, mark_undone, push_undo_entry,
+    MAX_HISTORY_SIZE, SESSION_ID, UNDO_STACK_FILE
+)
+from src.sub_functions.undo_dependences import cp_with_history, mv_with_history, undo_realisation, redo_realisation
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+"""
+Тесты истории команд, включая одновременную запись из нескольких процессов
+"""
+
+
+def _append_records(history_dir: str, worker: int, count: int) -> None:
+    """Процесс-писатель: добавляет count записей в историю в каталоге history_dir"""
+    os.chdir(history_dir)
+    for i in range(count):
+        add_to_history("ls", [f"w{worker}", str(i)], None)
+
+
+class TestHistory(unittest.TestCase):
+    """Тесты для файла истории"""
+
+    def setUp(self):
+        """Создает временную директорию для каждого теста."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _run_writers(self, workers: int, count: int) -> None:
+        """Запускает workers процессов, каждый из которых пишет count записей"""
+        processes = [
+            multiprocessing.Process(target=_append_records, args=(self.test_dir, worker, count))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+
+    def test_add_to_history_marks_session(self):
+        """Тест: отменяемые записи помечаются идентификатором сессии"""
+        add_to_history("cp", ["a", "b"], {"src": "/a", "dst": "/b"})
+        history = read_history()
+        self.assertEqual(history[-1]["undo_data"]["session"], SESSION_ID)
+
+    def test_add_to_history_escapes_separators(self):
+        """Тест: разделители в значениях не ломают запись"""
+        add_to_history("mv", ["a", "b"], {"src": "/a|b", "dst": "/c=d"})
+        undo_data = read_history()[-1]["undo_data"]
+        self.assertEqual(undo_data["src"], "/a|b")
+        self.assertEqual(undo_data["dst"], "/c=d")
+
+    def test_history_lock_is_reentrant(self):
+        """Тест: вложенная блокировка в одном потоке не приводит к взаимоблокировке"""
+        with history_lock():
+            with history_lock():
+                add_to_history("ls", [], None)
+        self.assertEqual(len(read_history()), 1)
+
+    def test_concurrent_writers_keep_all_records(self):
+        """Стресс-тест: параллельные процессы не теряют записи"""
+        workers, count = 4, MAX_HISTORY_SIZE // 4
+        self._run_writers(workers, count)
+
+        history = read_history()
+        self.assertEqual(len(history), workers * count)
+        written = {tuple(record["args"]) for record in history}
+        expected = {(f"w{worker}", str(i)) for worker in range(workers) for i in range(count)}
+        self.assertEqual(written, expected)
+
+    def test_concurrent_writers_with_trimming(self):
+        """Стресс-тест: обрезка истории при параллельной записи оставляет ровно MAX_HISTORY_SIZE целых записей"""
+        self._run_writers(8, MAX_HISTORY_SIZE)
+
+        with open(".history", encoding='utf-8') as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), MAX_HISTORY_SIZE)
+        for line in lines:
+            self.assertEqual(len(line.rstrip("\n").split("|")), 4)
+
+
+class TestUndoStack(unittest.TestCase):
+    """Тесты для стека undo - индекса отменяемых записей истории"""
+
+    def setUp(self):
+        """Создает временную директорию для каждого теста."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_read_undo_stack_newest_first(self):
+        """Тест: стек отдает последние отменяемые команды от новых к старым"""
+        add_to_history("cp", ["a", "b"], {"src": "/a", "dst": "/b"})
+        add_to_history("ls", [], None)
+        add_to_history("mv", ["c", "d"], {"src": "/c", "dst": "/d"})
+
+        records = read_undo_stack(5)
+        self.assertEqual([record["command"] for record in records], ["mv", "cp"])
+        self.assertEqual(records[0]["undo_data"]["dst"], "/d")
+
+    def test_read_undo_stack_skips_other_sessions(self):
+        """Тест: записи другой сессии в стеке пропускаются"""
+        add_to_history("cp", ["a", "b"], {"src": "/a", "dst": "/b"})
+        with open(".history", "rb") as f:
+            offset = len(f.read())
+        with open(".history", "a", encoding="utf-8") as f:
+            f.write("2025-01-01T00:00:00|rm|x|path=/x|trash_path=/t|session=aaaaaaaaaaaa|undone=0\n")
+        push_undo_entry(offset, "aaaaaaaaaaaa")
+
+        records = read_undo_stack(5)
+        self.assertEqual([record["command"] for record in records], ["cp"])
+        self.assertEqual(len(read_undo_stack(5, "aaaaaaaaaaaa")), 1)
+
+    def test_mark_undone_in_place(self):
+        """Тест: отмена помечает запись на месте и снимает ее со стека"""
+        add_to_history("cp", ["a", "b"], {"src": "/a", "dst": "/b"})
+        add_to_history("mv", ["c", "d"], {"src": "/c", "dst": "/d"})
+        size_before = os.path.getsize(".history")
+
+        mark_undone(read_undo_stack(1))
+
+        self.assertEqual(os.path.getsize(".history"), size_before)
+        self.assertTrue(read_history()[-1]["undone"])
+        self.assertEqual([record["command"] for record in read_undo_stack(5)], ["cp"])
+        # Хвост стека из отмененных записей обрезается
+        self.assertEqual(os.path.getsize(UNDO_STACK_FILE), 26)
+
+    def test_stack_rebuilt_after_trimming(self):
+        """Тест: после обрезки истории смещения в стеке остаются верными"""
+        for i in range(MAX_HISTORY_SIZE + 10):
+            add_to_history("cp", [str(i)], {"src": f"/src{i}", "dst": f"/dst{i}"})
+
+        records = read_undo_stack(MAX_HISTORY_SIZE + 10)
+        self.assertEqual(len(records), MAX_HISTORY_SIZE)
+        self.assertEqual(records[0]["undo_data"]["dst"], f"/dst{MAX_HISTORY_SIZE + 9}")
+
+    def test_rebuild_on_stale_stack(self):
+        """Тест: испорченный стек перестраивается по истории"""
+        add_to_history("cp", ["a", "b"], {"src": "/a", "dst": "/b"})
+        with open(UNDO_STACK_FILE, "w", encoding="ascii") as f:
+            f.write(f"{5:012d} {SESSION_ID}\n")
+
+        records = read_undo_stack(1)
+        self.assertEqual(records[0]["undo_data"]["src"], "/a")
+
+    def test_undo_cp_end_to_end(self):
+        """Тест: cp с последующим undo удаляет копию и помечает запись"""
+        with open("source.txt", "w") as f:
+            f.write("data")
+        cp_with_history("source.txt", "copy.txt")
+
+        undo_realisation({"steps": 1})
+
+        self.assertFalse(os.path.exists("copy.txt"))
+        self.assertTrue(read_history()[-1]["undone"])
+        with self.assertRaises(Exception):
+            undo_realisation({"steps": 1})
+
+    def test_undo_redo_end_to_end(self):
+        """Тест: undo и redo нескольких команд возвращают файлы туда и обратно"""
+        with open("a.txt", "w") as f:
+            f.write("data")
+        cp_with_history("a.txt", "b.txt")
+        mv_with_history("b.txt", "c.txt")
+
+        undo_realisation({"steps": 2})
+        self.assertEqual(sorted(os.listdir(".")), [".history", ".history.lock", ".redo_stack", ".trash",
+                                                   ".undo_stack", "a.txt"])
+
+        redo_realisation({"steps": 2})
+        self.assertTrue(os.path.exists("c.txt"))
+        self.assertFalse(os.path.exists("b.txt"))
+        # После redo команды снова можно отменить
+        undo_realisation({"steps": 1})
+        self.assertTrue(os.path.exists("b.txt"))
+
+    def test_undo_is_all_or_nothing(self):
+        """Тест: если один шаг отмены невозможен, не отменяется ничего"""
+        with open("a.txt", "w") as f:
+            f.write("data")
+        mv_with_history("a.txt", "b.txt")
+        mv_with_history("b.txt", "c.txt")
+        # Занимаем место, куда должна вернуться первая команда
+        with open("a.txt", "w") as f:
+            f.write("other")
+
+        with self.assertRaises(Exception) as context:
+            undo_realisation({"steps": 2})
+
+        self.assertIn("уже существует", str(context.exception))
+        self.assertTrue(os.path.exists("c.txt"))
+        self.assertEqual(len(read_undo_stack(2)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from logging.handlers import RotatingFileHandler
+from unittest.mock import patch
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.sub_functions.logging_func import setup_logging, shutdown_logging  # noqa: E402
+
+"""
+Тесты логирования: запись через очередь в отдельном потоке и ротация файла лога
+"""
+
+
+class TestQueueLogging(unittest.TestCase):
+    """Тесты setup_logging"""
+
+    def setUp(self):
+        """Создает временную директорию и отдельный логгер для каждого теста."""
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, 'shell.log')
+        self.logger = logging.getLogger(f"test_queue_logging.{self._testMethodName}")
+        self.logger.propagate = False
+
+    def tearDown(self):
+        """Останавливает поток записи, снимает обработчики логгера и удаляет временную директорию."""
+        shutdown_logging()
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_write_in_listener_thread(self):
+        """Тест: запись в файл выполняется не в потоке команды; после shutdown_logging все записи в файле."""
+        writers = set()
+        emit = RotatingFileHandler.emit
+
+        def tracking_emit(handler, record):
+            writers.add(threading.current_thread())
+            emit(handler, record)
+
+        with patch.object(RotatingFileHandler, 'emit', tracking_emit):
+            setup_logging(self.log_file, target=self.logger)
+            self.logger.info("Выполнена команда: ls")
+            self.logger.error("Ошибка: нет файла")
+            shutdown_logging()
+
+        self.assertNotIn(threading.current_thread(), writers)
+        with open(self.log_file, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("- INFO - Выполнена команда: ls"))
+        self.assertTrue(lines[1].endswith("- ERROR - Ошибка: нет файла"))
+
+    def test_rotation(self):
+        """Тест: лог ротируется по размеру и не растет неограниченно."""
+        setup_logging(self.log_file, max_bytes=1000, backup_count=2, target=self.logger)
+        for i in range(200):
+            self.logger.info(f"Выполнена команда: cat file{i}.txt")
+        shutdown_logging()
+
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['shell.log', 'shell.log.1', 'shell.log.2'])
+        for name in os.listdir(self.test_dir):
+            self.assertLessEqual(os.path.getsize(os.path.join(self.test_dir, name)), 1000)
+        with open(self.log_file, encoding='utf-8') as f:
+            self.assertIn("file199.txt", f.read())
+
+    def test_loggers_share_listener(self):
+        """Тест: второй логгер пишет через тот же поток, каждая запись попадает только в файл своего логгера."""
+        other = logging.getLogger(f"{self.logger.name}.other")
+        other.propagate = False
+        other_file = os.path.join(self.test_dir, 'other.log')
+        setup_logging(self.log_file, target=self.logger)
+        self.logger.info("первый")
+        setup_logging(other_file, target=other, log_format="%(message)s")
+        other.info("второй")
+        self.logger.info("снова первый")
+        shutdown_logging()
+
+        self.assertEqual(other.handlers, [])
+        with open(self.log_file, encoding='utf-8') as f:
+            self.assertEqual([line.rsplit(' - ', 1)[1] for line in f.read().splitlines()], ["первый", "снова первый"])
+        with open(other_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "второй\n")
+
+    def test_configured_logger_unchanged(self):
+        """Тест: логгер с обработчиками не перенастраивается (как basicConfig)."""
+        handler = logging.NullHandler()
+        self.logger.addHandler(handler)
+        self.assertFalse(setup_logging(self.log_file, target=self.logger))
+        self.assertEqual(self.logger.handlers, [handler])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.sub_functions import metrics_dependences  # noqa: E402
+from src.sub_functions.logging_func import shutdown_logging  # noqa: E402
+from src.sub_functions.metrics_dependences import (run_measured, read_metrics, percentile, summarize,  # noqa: E402
+                                                   stats_args_parse, stats_realisation)
+
+"""
+Тесты метрик команд: запись времени и ресурсов, перцентили и команда stats
+"""
+
+
+class TestMetrics(unittest.TestCase):
+    """Тесты run_measured, summarize и stats"""
+
+    def setUp(self):
+        """Направляет метрики во временную директорию (с новым потоком записи)."""
+        self.test_dir = tempfile.mkdtemp()
+        self.metrics_file = os.path.join(self.test_dir, '.metrics.jsonl')
+        self.file_patch = patch.object(metrics_dependences, 'METRICS_FILE', self.metrics_file)
+        self.file_patch.start()
+        self._reset_logger()
+
+    def tearDown(self):
+        """Останавливает поток записи метрик и удаляет временную директорию."""
+        self._reset_logger()
+        self.file_patch.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _reset_logger(self):
+        shutdown_logging()
+        metrics_logger = logging.getLogger("shell.metrics")
+        for handler in list(metrics_logger.handlers):
+            metrics_logger.removeHandler(handler)
+
+    def test_run_measured_records(self):
+        """Тест: для каждой команды пишется строка JSON с временем, CPU, байтами и статусом."""
+        data_file = os.path.join(self.test_dir, 'data.bin')
+
+        def write_data():
+            with open(data_file, 'wb') as f:
+                f.write(b'x' * 100000)
+
+        def fail():
+            raise ValueError("ошибка")
+
+        run_measured(['cp', 'a', 'b'], write_data)
+        with self.assertRaises(ValueError):
+            run_measured(['cat', 'nope'], fail, background=True)
+
+        records = list(read_metrics())
+        self.assertEqual([(r['command'], r['args'], r['status'], r['background']) for r in records],
+                         [('cp', ['a', 'b'], 'ok', False), ('cat', ['nope'], 'error', True)])
+        self.assertGreaterEqual(records[0]['wall'], 0)
+        self.assertGreaterEqual(records[0]['cpu'], 0)
+        if records[0]['write_bytes'] is not None:
+            self.assertGreaterEqual(records[0]['write_bytes'], 100000)
+        if records[0]['peak_rss'] is not None:
+            self.assertGreater(records[0]['peak_rss'], 0)
+
+    def test_read_waits_for_queue_without_restart(self):
+        """Тест: чтение метрик дожидается очереди, не останавливая поток записи."""
+        from logging.handlers import QueueListener
+        run_measured(['ls'], lambda: None)
+        with patch.object(QueueListener, 'stop') as mock_stop, patch.object(QueueListener, 'start') as mock_start:
+            for i in range(50):
+                run_measured(['cat', str(i)], lambda: None)
+            records = list(read_metrics())
+        self.assertEqual(len(records), 51)
+        mock_stop.assert_not_called()
+        mock_start.assert_not_called()
+
+    def test_percentiles(self):
+        """Тест: перцентили методом ближайшего ранга и сводка по типам команд."""
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99, 100)], [50.0, 95.0, 99.0, 100.0])
+        self.assertEqual(percentile([7.0], 99), 7.0)
+
+        records = [{"command": "ls", "status": "ok", "wall": i / 1000, "cpu": 0.001, "read_bytes": 10,
+                    "write_bytes": None, "peak_rss": 1000 + i} for i in range(1, 21)]
+        records.append({"command": "grep", "status": "error", "wall": 1.0, "cpu": 0.5, "read_bytes": None,
+                        "write_bytes": None, "peak_rss": None})
+        summary = summarize(iter(records))
+        self.assertEqual(summary["ls"]["count"], 20)
+        self.assertEqual((summary["ls"]["p50"], summary["ls"]["p95"]), (0.01, 0.019))
+        self.assertEqual((summary["ls"]["read_bytes"], summary["ls"]["peak_rss"]), (200, 1020))
+        self.assertEqual((summary["grep"]["errors"], summary["grep"]["peak_rss"]), (1, None))
+
+    def test_rotated_files_and_stats(self):
+        """Тест: stats читает и ротированные файлы; --json выводит записи для выгрузки."""
+        with open(f"{self.metrics_file}.1", 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"command": "ls", "args": [], "status": "ok", "wall": 0.5, "cpu": 0.1,
+                                "read_bytes": 1, "write_bytes": 2, "peak_rss": 3}) + "\n")
+        run_measured(['cd', '.'], lambda: None)
+
+        with patch('builtins.print') as mock_print:
+            stats_realisation(stats_args_parse(['--json']))
+        printed = [json.loads(c.args[0])['command'] for c in mock_print.call_args_list]
+        self.assertEqual(printed, ['ls', 'cd'])
+
+        with patch('builtins.print') as mock_print:
+            stats_realisation(stats_args_parse(['ls']))
+        rows = [c.args[0] for c in mock_print.call_args_list]
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[1].startswith('ls'))
+        self.assertIn('500.0ms', rows[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,8 @@ import unittest
 from pathlib import Path
 from unittest.mock import patch, MagicMock, call
 from src.sub_functions.cd_dependences import cd_args_parse, cd_realisation
-from src.sub_functions.ls_dependences import ls_args_parse, ls_realisation, detailed_list, check_access_rights
+from src.sub_functions.ls_dependences import (ls_args_parse, ls_realisation, detailed_list, check_access_rights,
+                                             _ls_parser)
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
@@ -127,6 +128,20 @@ class TestLsCommands(unittest.TestCase):
         self.assertEqual(result.path, '/some/path')
         self.assertTrue(result.long)
 
+    @patch('src.sub_functions.ls_dependences.argparse.ArgumentParser')
+    def test_ls_args_parse_parser_cached(self, mock_parser_class):
+        """Тест: парсер ls строится один раз, путь по умолчанию - текущий каталог на момент вызова"""
+        _ls_parser.cache_clear()
+        mock_parser_class.return_value.parse_args.side_effect = lambda args: MagicMock(path=None, long=False)
+        try:
+            with patch('src.sub_functions.ls_dependences.os.getcwd', side_effect=['/first', '/second']):
+                self.assertEqual(ls_args_parse([]).path, '/first')
+                self.assertEqual(ls_args_parse([]).path, '/second')
+            mock_parser_class.assert_called_once()
+            self.assertEqual(mock_parser_class.return_value.parse_args.call_count, 2)
+        finally:
+            _ls_parser.cache_clear()
+
     def test_check_access_rights(self):
         """Тест определения прав доступа к файлу"""
         mock_stat = MagicMock()
@@ -2,7 +2,7 @@ import os
 import sys
 import unittest
 from unittest.mock import patch, MagicMock, mock_open, call
-from src.sub_functions.grep_dependences import grep_args_parse, grep_realisation
+from src.sub_functions.grep_dependences import grep_args_parse, grep_realisation, _grep_parser
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
@@ -31,6 +31,16 @@ class TestGrepCommands(unittest.TestCase):
         }
         self.assertEqual(result, expected)
 
+    def test_grep_args_parse_single_parse(self):
+        """Тест: аргументы grep разбираются одним вызовом parse_args уже построенного парсера"""
+        grep_args_parse(['pattern', 'file.txt'])
+        with patch('src.sub_functions.grep_dependences.argparse.ArgumentParser') as mock_parser_class, \
+                patch.object(_grep_parser(), 'parse_args', wraps=_grep_parser().parse_args) as mock_parse:
+            result = grep_args_parse(['-i', 'pattern', 'file.txt'])
+        mock_parser_class.assert_not_called()
+        mock_parse.assert_called_once_with(['-i', 'pattern', 'file.txt'])
+        self.assertTrue(result["ignore_case"])
+
     def test_grep_args_parse_with_recursive(self):
         """Тест парсинга аргументов grep с рекурсивным поиском"""
         result = grep_args_parse(['-r', 'pattern', 'folder'])
@@ -0,0 +1,343 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+"""
+Тесты точки входа оболочки: выполнение строки (-c) и сценария без интерактивного ввода
+"""
+
+from src.sub_functions.jobs_dependences import (start_job, wait_realisation, kill_realisation,  # noqa: E402
+                                                 running_jobs, report_finished, check_cancelled, capture_stdout)
+from src.sub_functions.registry_dependences import get_command  # noqa: E402
+from src.sub_functions.pipeline_dependences import tokenize, split_commands, split_on, run_pipeline, Operator, _stage, split_redirect, run_redirected  # noqa: E402
+
+MAIN = os.path.join(project_root, "src", "main.py")
+
+
+class TestBatchMode(unittest.TestCase):
+    """Тесты пакетного режима main.py"""
+
+    def setUp(self):
+        """Создает временную директорию для каждого теста (история и корзина создаются в ней)."""
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, 'a.txt'), 'w') as f:
+            f.write('hello')
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _run(self, *args, stdin=None):
+        """Запускает оболочку с аргументами в тестовой директории."""
+        return subprocess.run([sys.executable, MAIN, *args], cwd=self.test_dir, capture_output=True, text=True,
+                              timeout=60, input=stdin)
+
+    def test_command_string(self):
+        """Тест: -c выполняет команды через ; без приглашения, ошибки - в stderr, код завершения 1."""
+        result = self._run('-c', "cat a.txt; badcmd 'x;y' # комментарий\ncp a.txt b.txt")
+        self.assertEqual(result.stdout.strip(), 'hello')
+        self.assertNotIn('>', result.stdout)
+        self.assertIn('Строка 1: Ошибка: Неизвестная команда: badcmd', result.stderr)
+        self.assertEqual(result.returncode, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'b.txt')))
+
+    def test_script_file(self):
+        """Тест: сценарий выполняется целиком, exit завершает его, код завершения 0."""
+        with open(os.path.join(self.test_dir, 'script.sh'), 'w') as f:
+            f.write("# копирование\ncp a.txt b.txt\n\nmv b.txt c.txt\nexit\nrm c.txt\n")
+        result = self._run('script.sh')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'c.txt')))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'b.txt')))
+
+    def test_script_parse_error(self):
+        """Тест: ошибка разбора любой строки останавливает сценарий до выполнения первой команды."""
+        with open(os.path.join(self.test_dir, 'script.sh'), 'w') as f:
+            f.write("cp a.txt b.txt\ncat 'a.txt\n")
+        result = self._run('script.sh')
+        self.assertEqual(result.returncode, 2)
+        self.assertIn('Строка 2', result.stderr)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'b.txt')))
+
+    def test_startup_does_not_import_commands(self):
+        """Тест: при запуске модули команд, архивы и корзина не загружаются."""
+        code = (f"import sys; sys.path.insert(0, {project_root!r}); import src.main; "
+                "print(' '.join(sorted(sys.modules)))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=self.test_dir, capture_output=True, text=True,
+                                timeout=60)
+        loaded = set(result.stdout.split())
+        self.assertIn('src.sub_functions.registry_dependences', loaded, result.stderr)
+        for module in ('tarfile', 'zipfile', 'src.sub_functions.archive_dependences',
+                       'src.sub_functions.undo_dependences', 'src.sub_functions.grep_dependences'):
+            self.assertNotIn(module, loaded)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, '.trash')))
+
+    def test_trash_stays_in_startup_dir(self):
+        """Тест: корзина создается в каталоге запуска, даже если модуль корзины загружен после cd."""
+        os.makedirs(os.path.join(self.test_dir, 'sub'))
+        result = self._run('-c', 'cd sub; cp ../a.txt x.txt; rm x.txt', stdin='y\n')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertTrue(os.path.isdir(os.path.join(self.test_dir, '.trash')))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'sub', '.trash')))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'sub', 'x.txt')))
+
+    def test_pipeline(self):
+        """Тест: cat | grep в пакетном режиме выводит только подходящие строки."""
+        with open(os.path.join(self.test_dir, 'log.txt'), 'w') as f:
+            f.write("ok 1\nERROR 2\nok 3\nerror 4\n")
+        result = self._run('-c', 'cat log.txt | grep -i error')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.splitlines(), ['ERROR 2', 'error 4'])
+
+
+    def test_redirect(self):
+        """Тест: > перезаписывает файл, >> дописывает; ошибка в команде не обнуляет файл."""
+        result = self._run('-c', 'grep hello a.txt > out.txt; ls >> out.txt; history 1 >>out.txt; badcmd > out.txt')
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.stdout, '')
+        with open(os.path.join(self.test_dir, 'out.txt'), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'a.txt:1:hello')
+        self.assertIn('a.txt', lines[1:])
+        self.assertIn('ls >> out.txt', lines[-1])
+
+    def test_command_metrics(self):
+        """Тест: каждая команда попадает в метрики, stats --json выгружает их строками JSON."""
+        result = self._run('-c', 'cat a.txt; cat nope; stats --json > metrics.jsonl')
+        self.assertEqual(result.returncode, 1)
+        with open(os.path.join(self.test_dir, 'metrics.jsonl'), encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([(r['command'], r['status']) for r in records], [('cat', 'ok'), ('cat', 'error')])
+
+    def test_background_jobs(self):
+        """Тест: команды с & выполняются в фоне, сценарий ждет их, undo отменяет фоновый cp."""
+        os.makedirs(os.path.join(self.test_dir, 'dir'))
+        result = self._run('-c', 'cp a.txt b.txt & cp dir dir2 &\ngrep hello a.txt & wait; undo; rm a.txt &')
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('[3] Завершена  grep hello a.txt\na.txt:1:hello', result.stdout)
+        self.assertIn('Команда rm не выполняется в фоне', result.stderr)
+        # undo отменил последний завершенный cp сессии, а первый остался
+        copies = [os.path.exists(os.path.join(self.test_dir, name)) for name in ('b.txt', 'dir2')]
+        self.assertEqual(sorted(copies), [False, True])
+
+
+class TestPipeline(unittest.TestCase):
+    """Тесты разбора строки и конвейеров между встроенными командами"""
+
+    def setUp(self):
+        """Создает временную директорию с файлом журнала."""
+        self.test_dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.test_dir, 'big.log')
+        with open(self.log, 'w', encoding='utf-8') as f:
+            for i in range(1000):
+                f.write(f"{'ERROR' if i % 100 == 0 else 'INFO'} line {i}\n")
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_tokenize_quotes_and_operators(self):
+        """Тест: операторы в кавычках остаются аргументами, вне кавычек - отдельными токенами."""
+        tokens = tokenize("grep 'a|b' x.txt | grep \"c;d\" ; cat a\\ b # комментарий")
+        self.assertEqual(tokens, ['grep', 'a|b', 'x.txt', '|', 'grep', 'c;d', ';', 'cat', 'a b'])
+        self.assertIsInstance(tokens[3], Operator)
+        self.assertNotIsInstance(tokens[1], Operator)
+        self.assertEqual(split_on(tokens, '|')[0], ['grep', 'a|b', 'x.txt'])
+        self.assertEqual(split_commands("grep ';' a;cat b"), [['grep', ';', 'a'], ['cat', 'b']])
+        self.assertEqual(tokenize("grep '' a"), ['grep', '', 'a'])
+        with self.assertRaises(ValueError):
+            tokenize("cat 'a")
+
+    @patch('src.sub_functions.pipeline_dependences.print')
+    def test_cat_grep(self, mock_print):
+        """Тест: cat | grep | grep выводит строки, прошедшие все фильтры."""
+        run_pipeline([['cat', self.log], ['grep', '-i', 'error'], ['grep', 'line [1-3]00$']])
+        self.assertEqual([c.args[0] for c in mock_print.call_args_list],
+                         ['ERROR line 100', 'ERROR line 200', 'ERROR line 300'])
+
+    def test_stages_are_lazy(self):
+        """Тест: стадии - генераторы: файл читается по мере запроса строк, бесконечный ввод не мешает фильтру."""
+        matches = _stage(['grep', 'ERROR'], _stage(['cat', self.log], None))
+        self.assertEqual(next(matches), 'ERROR line 0')
+        self.assertEqual(next(matches), 'ERROR line 100')
+        endless = (f"line {i}" for i in itertools.count())
+        self.assertEqual(next(_stage(['grep', '7$'], endless)), 'line 7')
+
+    @patch('src.sub_functions.pipeline_dependences.print')
+    def test_captured_first_stage(self, mock_print):
+        """Тест: обычная команда в начале конвейера - ее вывод передается следующей команде."""
+        with open(os.path.join(self.test_dir, 'other.txt'), 'w') as f:
+            f.write('x')
+        run_pipeline([['ls', self.test_dir], ['grep', 'log']])
+        self.assertEqual([c.args[0] for c in mock_print.call_args_list], ['big.log'])
+
+    def test_split_redirect(self):
+        """Тест: перенаправление отделяется от команды, в кавычках > - обычный аргумент."""
+        args, target = split_redirect(tokenize("grep '>' a.txt >> out.txt"))
+        self.assertEqual((args, target), (['grep', '>', 'a.txt'], ('out.txt', True)))
+        self.assertEqual(split_redirect(tokenize("ls>out"))[1], ('out', False))
+        self.assertEqual(split_redirect(['ls']), (['ls'], None))
+        for line in ("ls >", "ls > a > b", "ls > a | grep x", "ls > | grep x"):
+            with self.assertRaises(ValueError):
+                split_redirect(tokenize(line))
+
+    def test_run_redirected(self):
+        """Тест: вывод конвейера и обычной команды пишется в файл, а не в терминал."""
+        out = os.path.join(self.test_dir, 'out.txt')
+        terminal = io.StringIO()
+        with contextlib.redirect_stdout(terminal):
+            run_redirected([['cat', self.log], ['grep', 'ERROR']], out)
+            run_redirected([['ls', self.test_dir]], out, append=True)
+        self.assertEqual(terminal.getvalue(), '')
+        with open(out, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[:10], [f"ERROR line {i}" for i in range(0, 1000, 100)])
+        self.assertEqual(lines[10:], ['big.log', 'out.txt'])
+
+    def test_pipeline_errors(self):
+        """Тест: пустая команда и команда, не читающая канал, после | - ошибки."""
+        with self.assertRaises(ValueError):
+            run_pipeline([['cat', self.log], []])
+        with self.assertRaises(ValueError):
+            run_pipeline([['cat', self.log], ['ls']])
+        with self.assertRaises(ValueError):
+            run_pipeline([['cat', self.log], ['cat', self.log]])
+
+class TestJobs(unittest.TestCase):
+    """Тесты фоновых задач: пул потоков, перехват вывода, wait и kill"""
+
+    def tearDown(self):
+        """Дожидается всех задач теста, чтобы они не попали в следующий."""
+        with patch('src.sub_functions.jobs_dependences.print'):
+            wait_realisation([])
+
+    @patch('src.sub_functions.jobs_dependences.print')
+    def test_jobs_run_concurrently(self, mock_print):
+        """Тест: две задачи выполняются одновременно, их вывод перехватывается и выводится при wait."""
+        barrier = threading.Barrier(2, timeout=10)
+
+        def job(name):
+            barrier.wait()
+            print(f"вывод {name}")
+
+        first = start_job(['first'], lambda: job('first'))
+        second = start_job(['second'], lambda: job('second'))
+        self.assertEqual(wait_realisation([first, second]), 0)
+        printed = [c.args[0] for c in mock_print.call_args_list]
+        self.assertIn(f"[{first}] Завершена  first", printed)
+        self.assertIn("вывод first\n", printed)
+        self.assertIn("вывод second\n", printed)
+        self.assertEqual(running_jobs(), [])
+
+    @patch('src.sub_functions.jobs_dependences.print')
+    def test_job_error_and_foreground_output(self, mock_print):
+        """Тест: ошибка задачи попадает в отчет, вывод основного потока не перехватывается."""
+        started = threading.Event()
+
+        def failing():
+            started.set()
+            raise ValueError("сломалось")
+
+        job_id = start_job(['bad'], failing)
+        started.wait(10)
+        buffer = io.StringIO()
+        with capture_stdout(buffer):
+            print("основной поток")
+        self.assertEqual(buffer.getvalue(), "основной поток\n")
+        self.assertEqual(wait_realisation([job_id]), 1)
+        self.assertIn("Ошибка: сломалось", [c.args[0] for c in mock_print.call_args_list])
+
+    @patch('src.sub_functions.jobs_dependences.print')
+    def test_kill_running_job(self, mock_print):
+        """Тест: kill прерывает выполняющуюся задачу в точке прерывания."""
+        started = threading.Event()
+
+        def endless():
+            started.set()
+            while True:
+                check_cancelled()
+
+        job_id = start_job(['endless'], endless)
+        self.assertTrue(started.wait(10))
+        kill_realisation([job_id])
+        wait_realisation([job_id])
+        self.assertIn(f"[{job_id}] Прервана  endless", [c.args[0] for c in mock_print.call_args_list])
+        with self.assertRaises(ValueError):
+            kill_realisation([job_id])
+
+    @patch('src.sub_functions.jobs_dependences.print')
+    def test_wait_reports_only_waited_jobs(self, mock_print):
+        """Тест: wait N выводит только задачу N, другие завершенные остаются для jobs."""
+        first = start_job(['first'], lambda: None)
+        second = start_job(['second'], lambda: None)
+        wait_realisation([second])
+        printed = [c.args[0] for c in mock_print.call_args_list]
+        self.assertIn(f"[{second}] Завершена  second", printed)
+        self.assertNotIn(f"[{first}] Завершена  first", printed)
+        wait_realisation([first])
+        self.assertIn(f"[{first}] Завершена  first", [c.args[0] for c in mock_print.call_args_list])
+
+    def test_check_cancelled_outside_job(self):
+        """Тест: вне фоновой задачи точка прерывания ничего не делает."""
+        check_cancelled()
+        self.assertEqual(report_finished(), 0)
+
+
+
+class TestProfile(unittest.TestCase):
+    """Тесты команды profile: любая команда выполняется обычным диспетчером под cProfile"""
+
+    def setUp(self):
+        """Создает временную директорию с файлом журнала."""
+        self.test_dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.test_dir, 'big.log')
+        with open(self.log, 'w', encoding='utf-8') as f:
+            f.writelines(f"{'ERROR' if i % 10 == 0 else 'INFO'} {i}\n" for i in range(100))
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _profile(self, line):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            get_command('profile')(['profile', *tokenize(line)])
+        return out.getvalue()
+
+    def test_profile_pipeline(self):
+        """Тест: конвейер выполняется целиком, выводятся горячие функции, профиль сохраняется в .pstats."""
+        stats_file = os.path.join(self.test_dir, 'grep.pstats')
+        output = self._profile(f"--top 50 --sort tottime -o {stats_file} cat {self.log} | grep 'ERROR 9'")
+        self.assertTrue(output.startswith('ERROR 90\nПрофиль: cat'))
+        self.assertIn('grep_filter', output)
+        self.assertIn('Ordered by: internal time', output)
+        functions = {name for _file, _line, name in pstats.Stats(stats_file).stats}
+        self.assertIn('cat_lines', functions)
+
+    def test_profile_errors(self):
+        """Тест: без команды - ошибка; ошибка команды выводится после отчета профиля."""
+        with self.assertRaises(ValueError):
+            self._profile("--top 5")
+        with self.assertRaises(ValueError):
+            self._profile("--top 0 ls")
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), self.assertRaises(FileNotFoundError):
+            get_command('profile')(['profile', 'cat', os.path.join(self.test_dir, 'nope')])
+        self.assertIn('Профиль: cat', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
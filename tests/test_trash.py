@@ -0,0 +1,280 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+from src.sub_functions import trash_dependences
+from src.sub_functions.trash_dependences import (
+    parse_size, parse_age, select_for_purge, list_trash, trash_args_parse, trash_realisation, collect_trash,
+    start_trash_collector, stop_trash_collector, save_policy, purge_entries
+)
+from src.sub_functions.undo_dependences import (rm_with_history, undo_realisation, redo_realisation, trash_dir_for,
+                                               known_trash_dirs)
+from src.sub_functions.cas_trash_dependences import set_cas_enabled, cas_stored_bytes, manifest_lookup, cas_root
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+"""
+Тесты корзины: политика хранения, очистка и фоновый сборщик
+"""
+
+
+class TestTrashCommands(unittest.TestCase):
+    """Тесты для команды trash"""
+
+    def setUp(self):
+        """Создает временную директорию с корзиной для каждого теста."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.trash = Path(self.test_dir) / ".trash"
+        self.trash.mkdir()
+        self.trash_patch = patch('src.sub_functions.undo_dependences.TRASH_DIR', str(self.trash))
+        self.trash_patch.start()
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        self.trash_patch.stop()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _add_entry(self, deleted_at: datetime, size: int) -> Path:
+        """Кладет в корзину файл заданного размера с заданным временем удаления"""
+        path = self.trash / f"{deleted_at.strftime('%Y%m%d_%H%M%S_%f')}_0123456789ab_file{size}.txt"
+        path.write_bytes(b"x" * size)
+        return path
+
+    def test_parse_size(self):
+        """Тест разбора размеров"""
+        self.assertEqual(parse_size("500"), 500)
+        self.assertEqual(parse_size("10K"), 10 * 1024)
+        self.assertEqual(parse_size("2mb"), 2 * 1024 ** 2)
+        with self.assertRaises(ValueError):
+            parse_size("много")
+
+    def test_parse_age(self):
+        """Тест разбора возраста"""
+        self.assertEqual(parse_age("90"), 90)
+        self.assertEqual(parse_age("12h"), 12 * 3600)
+        self.assertEqual(parse_age("7d"), 7 * 86400)
+        with self.assertRaises(ValueError):
+            parse_age("вчера")
+
+    def test_select_for_purge_by_age_and_size(self):
+        """Тест: удаляются старые элементы и самые старые, пока корзина больше лимита"""
+        now = datetime(2025, 1, 10)
+        entries = [
+            {"path": "old", "deleted_at": now - timedelta(days=30), "size": 10},
+            {"path": "mid", "deleted_at": now - timedelta(days=2), "size": 100},
+            {"path": "new", "deleted_at": now - timedelta(hours=1), "size": 100},
+        ]
+        victims = select_for_purge(entries, max_bytes=150, max_age=7 * 86400, now=now)
+        self.assertEqual([entry["path"] for entry in victims], ["old", "mid"])
+
+    def test_list_trash_sorted_and_skips_policy(self):
+        """Тест: элементы корзины выводятся от старых к новым, служебные файлы пропускаются"""
+        newer = self._add_entry(datetime(2025, 1, 2), 5)
+        older = self._add_entry(datetime(2025, 1, 1), 7)
+        save_policy({"max_bytes": 1, "max_age": None})
+
+        entries = list_trash()
+        self.assertEqual([entry["path"] for entry in entries], [older, newer])
+        self.assertEqual(entries[0]["size"], 7)
+
+    def test_trash_args_parse(self):
+        """Тест парсинга аргументов trash"""
+        args = trash_args_parse(["purge", "--max-bytes", "1K", "--max-age", "1d"])
+        self.assertEqual(args["action"], "purge")
+        self.assertEqual(args["max_bytes"], 1024)
+        self.assertEqual(args["max_age"], 86400)
+        self.assertFalse(args["all"])
+
+    def test_trash_purge_all(self):
+        """Тест полной очистки корзины"""
+        self._add_entry(datetime(2025, 1, 1), 5)
+        self._add_entry(datetime(2025, 1, 2), 5)
+        trash_realisation(trash_args_parse(["purge", "--all"]))
+        self.assertEqual(list_trash(), [])
+
+    @patch('builtins.input', return_value='y')
+    def test_undo_fails_fast_after_purge(self, _mock_input):
+        """Тест: undo удаления, чей файл стерт из корзины, сразу сообщает об ошибке"""
+        Path("victim.txt").write_text("data")
+        rm_with_history("victim.txt")
+        trash_realisation(trash_args_parse(["purge", "--all"]))
+
+        with self.assertRaises(Exception) as context:
+            undo_realisation({"steps": 1})
+        self.assertIn("уже удалены из корзины", str(context.exception))
+
+    def test_collect_trash_uses_policy(self):
+        """Тест: проход сборщика удаляет элементы сверх лимита"""
+        self._add_entry(datetime(2025, 1, 1), 100)
+        newest = self._add_entry(datetime(2025, 1, 2), 100)
+        purged, freed = collect_trash({"max_bytes": 150, "max_age": None})
+        self.assertEqual((purged, freed), (1, 100))
+        self.assertEqual([entry["path"] for entry in list_trash()], [newest])
+
+    def test_background_collector(self):
+        """Тест: фоновый сборщик очищает корзину по сохраненной политике"""
+        self._add_entry(datetime(2025, 1, 1), 10)
+        save_policy({"max_bytes": None, "max_age": 60})
+
+        start_trash_collector(interval=0.01)
+        try:
+            deadline = time.monotonic() + 5
+            while list_trash() and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            stop_trash_collector()
+
+        self.assertEqual(list_trash(), [])
+        self.assertFalse(trash_dependences._collector_thread.is_alive())
+
+    @patch('src.sub_functions.undo_dependences._trash_dirs', {})
+    def test_trash_dir_for_same_device(self):
+        """Тест: файл на той же файловой системе попадает в основную корзину"""
+        Path("file.txt").write_text("data")
+        self.assertEqual(trash_dir_for(Path("file.txt")), self.trash)
+
+    @patch('src.sub_functions.undo_dependences._trash_dirs', {})
+    @patch('src.sub_functions.undo_dependences.mount_top')
+    def test_trash_dir_for_other_device(self, mock_mount_top):
+        """Тест: для другой файловой системы создается корзина .Trash-<uid> в ее корне"""
+        mount = Path(self.test_dir) / "mnt"
+        mock_mount_top.return_value = mount
+        real_lstat = os.lstat
+
+        def fake_lstat(path, *args, **kwargs):
+            # Файлы под mnt "лежат" на другом устройстве
+            if str(path).startswith(str(mount / "data")):
+                return MagicMock(st_dev=-1)
+            return real_lstat(path, *args, **kwargs)
+
+        with patch('src.sub_functions.undo_dependences.os.lstat', side_effect=fake_lstat):
+            result = trash_dir_for(mount / "data" / "file.txt")
+            # Повторный вызов для того же устройства берет корзину из кэша
+            trash_dir_for(mount / "data" / "other.txt")
+
+        expected = mount / f".Trash-{os.getuid()}" / "files"
+        self.assertEqual(result, expected)
+        self.assertTrue(expected.is_dir())
+        self.assertIn(str(expected), known_trash_dirs())
+        mock_mount_top.assert_called_once()
+
+    @patch('src.sub_functions.undo_dependences._trash_dirs', {})
+    def test_list_trash_includes_mount_trash(self):
+        """Тест: trash list видит элементы корзин на других файловых системах"""
+        mount_trash = Path(self.test_dir) / "mnt" / ".Trash-0" / "files"
+        mount_trash.mkdir(parents=True)
+        (mount_trash / "20250101_000000_000000_0123456789ab_a.txt").write_text("a")
+        (self.trash / ".mounts").write_text(f"{mount_trash}\n")
+
+        entries = list_trash()
+        self.assertEqual([entry["path"].parent for entry in entries], [mount_trash])
+
+
+class TestCasTrash(unittest.TestCase):
+    """Тесты для дедуплицирующего хранилища корзины"""
+
+    def setUp(self):
+        """Создает временную директорию с корзиной и включенным хранилищем для каждого теста."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.trash = Path(self.test_dir) / ".trash"
+        self.trash.mkdir()
+        self.trash_patch = patch('src.sub_functions.undo_dependences.TRASH_DIR', str(self.trash))
+        self.trash_patch.start()
+        self.dirs_patch = patch('src.sub_functions.undo_dependences._trash_dirs', {})
+        self.dirs_patch.start()
+        set_cas_enabled(self.trash, True)
+
+    def tearDown(self):
+        """Удаляет временную директорию после каждого теста."""
+        self.dirs_patch.stop()
+        self.trash_patch.stop()
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _remove(self, name: str, content: bytes, mode: int = 0o644, mtime: int = 1_000_000_000) -> None:
+        """Создает файл с заданными правами и временем изменения и удаляет его через rm"""
+        path = Path(name)
+        path.write_bytes(content)
+        os.chmod(path, mode)
+        os.utime(path, (mtime, mtime))
+        with patch('builtins.input', return_value='y'):
+            rm_with_history(name)
+
+    def test_duplicates_stored_once(self):
+        """Тест: одинаковые файлы хранятся одним объектом, в корзине видны оба элемента"""
+        self._remove("a.txt", b"x" * 1000)
+        self._remove("b.txt", b"x" * 1000)
+
+        entries = list_trash()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(cas_stored_bytes(self.trash), 1000)
+
+    def test_undo_restores_exact_original(self):
+        """Тест: undo восстанавливает содержимое, права и время изменения каждого дубликата"""
+        self._remove("a.txt", b"same", mode=0o600, mtime=1_000_000_000)
+        self._remove("b.txt", b"same", mode=0o755, mtime=1_200_000_000)
+
+        undo_realisation({"steps": 2})
+
+        for name, mode, mtime in (("a.txt", 0o600, 1_000_000_000), ("b.txt", 0o755, 1_200_000_000)):
+            file_stat = os.stat(name)
+            self.assertEqual(Path(name).read_bytes(), b"same")
+            self.assertEqual(file_stat.st_mode & 0o777, mode)
+            self.assertEqual(int(file_stat.st_mtime), mtime)
+            # Восстановленный файл не разделяет inode с другими файлами
+            self.assertEqual(file_stat.st_nlink, 1)
+        self.assertEqual(list_trash(), [])
+        self.assertEqual(cas_stored_bytes(self.trash), 0)
+
+    def test_redo_stores_again(self):
+        """Тест: redo удаления снова кладет файл в хранилище"""
+        self._remove("a.txt", b"data")
+        undo_realisation({"steps": 1})
+        redo_realisation({"steps": 1})
+
+        self.assertFalse(Path("a.txt").exists())
+        entry = list_trash()[0]["path"]
+        self.assertIsNotNone(manifest_lookup(cas_root(self.trash), entry.name))
+
+    def test_purge_keeps_shared_object(self):
+        """Тест: объект удаляется только вместе с последним ссылающимся на него элементом"""
+        self._remove("a.txt", b"y" * 100)
+        self._remove("b.txt", b"y" * 100)
+        first, second = list_trash()
+
+        self.assertEqual(purge_entries([first]), (1, 0))
+        self.assertEqual(cas_stored_bytes(self.trash), 100)
+        self.assertEqual(purge_entries([second]), (1, 100))
+        self.assertEqual(cas_stored_bytes(self.trash), 0)
+        # Записи удаленных элементов убраны из манифеста
+        self.assertEqual((cas_root(self.trash) / "manifest.jsonl").read_text(), "")
+
+    def test_directories_moved_as_is(self):
+        """Тест: каталоги не дедуплицируются и лежат в корзине как раньше"""
+        Path("folder").mkdir()
+        Path("folder/file.txt").write_text("data")
+        with patch('builtins.input', return_value='y'):
+            rm_with_history("folder")
+
+        self.assertEqual([entry["path"].parent for entry in list_trash()], [self.trash])
+
+    def test_backend_command(self):
+        """Тест: trash backend переключает способ хранения"""
+        trash_realisation(trash_args_parse(["backend", "move"]))
+        self._remove("a.txt", b"data")
+        self.assertEqual(list_trash()[0]["path"].parent, self.trash)
+
+
+if __name__ == '__main__':
+    unittest.main()